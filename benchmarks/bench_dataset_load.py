@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the dataset load: time and memory to load the indented JSON file into a list
+of dicts, against memory-mapping the columnar file, on synthetic coin lists.
+
+Each measurement runs in a fresh process. Memory is reported as the growth of the
+process's private (anonymous) RSS, which every uvicorn worker pays for separately,
+and of its file-backed RSS, which worker processes mapping the same file share.
+"+ indexes" also builds the lookup by id and the search indexes, as the server does.
+
+Usage:
+    python benchmarks/bench_dataset_load.py [--sizes 3000 30000 300000]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MODES = ['json', 'columnar', 'json+indexes', 'columnar+indexes']
+
+
+def make_coins(count, seed=42):
+    rng = random.Random(seed)
+    coins = []
+    for i in range(count):
+        name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).capitalize()
+        symbol = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5)))
+        coins.append({'id': f"{name.lower()}-{i}", 'name': name, 'symbol': symbol, 'is_tradable_on_binance_vs_usdc': i % 5 == 0})
+    return coins
+
+
+def rss_kb():
+    """Returns (anonymous, file-backed) resident memory of this process, in kB."""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('RssAnon', 'RssFile'):
+                values[key] = int(value.split()[0])
+    return values.get('RssAnon', 0), values.get('RssFile', 0)
+
+
+def child(mode, path):
+    # Imported up front (read_dataset_file imports it lazily), so that import time and module
+    # memory are not counted.
+    importlib.import_module('src.columnar')
+    from src.dataset import Dataset, read_dataset_file
+
+    anon_before, file_before = rss_kb()
+    start = time.perf_counter()
+    coins, timestamp_utc, source = read_dataset_file(path)
+    if mode.endswith('+indexes'):
+        Dataset(coins, 1, timestamp_utc, source).warm()
+    else:
+        coins[0], coins[len(coins) - 1]
+    elapsed = time.perf_counter() - start
+    anon_after, file_after = rss_kb()
+    print(json.dumps({'ms': elapsed * 1000, 'anon_mb': (anon_after - anon_before) / 1024, 'file_mb': (file_after - file_before) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3000, 30000, 300000])
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    from src.columnar import write_columnar
+
+    print(f"{'coins':>8} {'mode':>18} {'file kB':>9} {'load ms':>9} {'private MB':>11} {'shared MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            coins = make_coins(size)
+            json_path = os.path.join(tmp, f'coins-{size}.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({'timestamp_utc': None, 'count': size, 'coins': coins}, f, ensure_ascii=False, indent=4)
+            cols_path = os.path.join(tmp, f'coins-{size}.cols')
+            write_columnar(cols_path, coins)
+
+            for mode in MODES:
+                path = cols_path if mode.startswith('columnar') else json_path
+                output = subprocess.run(
+                    [sys.executable, __file__, '--child', mode, path], check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output)
+                print(f"{size:>8} {mode:>18} {os.path.getsize(path) / 1024:>9.0f} {result['ms']:>9.1f}"
+                      f" {result['anon_mb']:>11.1f} {result['file_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
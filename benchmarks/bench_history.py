@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of /api/history's OHLC aggregation: a 30-day chart of 100 coins, from price
+histories filled at the default resolution (one point every 10 seconds per coin).
+
+Usage:
+    python benchmarks/bench_history.py [--coins 100] [--days 30] [--candles 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.price_history import PriceHistory, PriceSeries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--coins', type=int, default=100)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--candles', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    history = PriceHistory(db_path=None)
+    end = time.time()
+    start = end - args.days * 86400
+    points = int((end - start) / history.resolution)
+    rng = np.random.default_rng(42)
+    for i in range(args.coins):
+        # Filled directly rather than point by point, which would only measure the loop.
+        series = PriceSeries(max(points, 1))
+        series.timestamps = np.linspace(start, end, points, endpoint=False)
+        series.prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, points)))
+        series.sources = np.zeros(points, dtype=np.uint8)
+        series.length = series.appended = points
+        history.series[f"coin-{i}"] = series
+
+    interval = (end - start) / args.candles
+    timings = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        for coin_id in history.series:
+            history.ohlc(coin_id, start, end, interval)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(f"{args.coins} coins x {points} points, {args.candles} candles: "
+          f"p50 {timings[len(timings) // 2] * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Offline load test of the API: the server runs in a subprocess against local stubs of
+Binance, CoinGecko and Jupiter Lend (see tests/stubs.py), with configurable latency and
+error rate, and a pool of concurrent clients drives it for a fixed duration per scenario:
+
+    pairs    GET /api/pairs with random name and symbol prefixes
+    price    GET /api/price for random coins (tradable ones first go to Binance)
+    mixed    both of the above, while POST /api/refresh-data?mode=incremental keeps
+             restarting a refresh (a 409 while one is running is expected)
+
+Throughput and p50/p95/p99 latencies are printed per scenario and endpoint, and saved as
+JSON (with the commit they were measured on) to compare runs between commits:
+
+    python benchmarks/bench_load.py --output before.json
+    git checkout my-branch
+    python benchmarks/bench_load.py --baseline before.json
+
+With --baseline, the run fails when a p95 latency or a throughput is worse than the
+baseline by more than --tolerance. --input compares an existing result file instead
+of running the benchmark.
+
+Usage:
+    python benchmarks/bench_load.py [--scenarios pairs price mixed] [--duration 10]
+        [--concurrency 32] [--latency-ms 20] [--error-rate 0.0] [--workers 1] [--coins 3000]
+        [--output FILE] [--baseline FILE] [--input FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from tests.stubs import BinanceRestStub, CoinGeckoStub, JupiterLendStub, synthetic_market
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+SCENARIOS = ('pairs', 'price', 'mixed')
+# Statuses that are the expected answer to a request, rather than a failure.
+EXPECTED_STATUSES = {'/api/refresh-data': {200, 409}, '/api/price': {200, 404}}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies, statuses, elapsed, endpoint):
+    latencies = sorted(latencies)
+    expected = EXPECTED_STATUSES.get(endpoint, {200})
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status not in expected),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]) if latencies else None,
+        },
+    }
+
+
+class StubServers:
+    """The upstream stubs, served from their own thread and event loop so they do not compete with the load generator."""
+
+    def __init__(self, market, latency, error_rate, seed=0):
+        self.stubs = {
+            'binance': BinanceRestStub(market, delay=latency, jitter=latency / 2, error_rate=error_rate, seed=seed),
+            'coingecko': CoinGeckoStub(market, delay=latency, jitter=latency / 2, error_rate=error_rate, seed=seed + 1),
+            'jupiter': JupiterLendStub(delay=latency, jitter=latency / 2, error_rate=error_rate, seed=seed + 2),
+        }
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._error = None
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            for stub in self.stubs.values():
+                await stub.__aenter__()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        await self._stop.wait()
+        for stub in self.stubs.values():
+            await stub.__aexit__(None, None, None)
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def __exit__(self, *exc_info):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(timeout=10)
+
+    def urls(self):
+        return {name: stub.url for name, stub in self.stubs.items()}
+
+    def counts(self):
+        return {name: {'requests': stub.request_count, 'errors': stub.error_count} for name, stub in self.stubs.items()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed_data_dir(data_dir, market, binance_prices):
+    """Writes the dataset the server starts from, so that it does not run an initial refresh."""
+    os.environ['DATA_DIR'] = data_dir
+    from src import data_updater
+    data_updater.DATA_DIR = data_dir
+    data_updater.save_coins(data_updater.build_records(market, set(binance_prices)))
+
+
+class AppServer:
+    """The API, served by uvicorn in a subprocess configured to talk to the stubs only."""
+
+    def __init__(self, upstream_urls, data_dir, pages, workers=1, extra_env=()):
+        self.port = free_port()
+        self.workers = workers
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ)
+        self.env.update({
+            'PYTHONPATH': PROJECT_ROOT,
+            'DATA_DIR': data_dir,
+            'BINANCE_API_URL': upstream_urls['binance'],
+            'COINGECKO_API_URL': upstream_urls['coingecko'],
+            'JUPITER_API_URL': upstream_urls['jupiter'],
+            'BINANCE_STREAM_ENABLED': '0',
+            'PRICE_HISTORY_DB': '',
+            'ALERT_WALLETS': '',
+            'COINGECKO_PAGES': str(pages),
+            # The stubs have no rate limit: only their latency paces a refresh.
+            'COINGECKO_CALLS_PER_MINUTE': '6000',
+            'COINGECKO_BURST': '50',
+            'LOG_LEVEL': 'WARNING',
+        })
+        if workers > 1:
+            # The production mode of run.py: the workers share their state through SQLite.
+            self.env['SHARED_STATE_DB'] = os.path.join(data_dir, 'shared-state.sqlite3')
+        self.env.update(extra_env)
+        self.process = None
+
+    def __enter__(self):
+        command = [sys.executable, '-m', 'uvicorn', 'src.main:app', '--host', '127.0.0.1',
+                   '--port', str(self.port), '--workers', str(self.workers), '--log-level', 'warning', '--no-access-log']
+        self.process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=self.env)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"The server exited with status {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/readyz", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("The server did not load its dataset within 60 seconds")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def pairs_request(rng, market):
+    coin = rng.choice(market)
+    word = rng.choice([coin['name'], coin['symbol']])
+    return 'GET', '/api/pairs', {'search': word[:rng.randint(1, 4)], 'limit': 50}
+
+
+def price_request(rng, market, tradable_ids):
+    coin = rng.choice(market)
+    params = {'symbol': coin['symbol'], 'coin_id': coin['id'], 'is_tradable': str(coin['id'] in tradable_ids).lower()}
+    return 'GET', '/api/price', params
+
+
+async def run_scenario(name, base_url, market, tradable_ids, concurrency, duration, seed):
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    refreshes = []
+    rng = random.Random(seed)
+    makers = {
+        'pairs': [lambda: pairs_request(rng, market)],
+        'price': [lambda: price_request(rng, market, tradable_ids)],
+        'mixed': [lambda: pairs_request(rng, market), lambda: price_request(rng, market, tradable_ids)],
+    }[name]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def timed(method, path, params):
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[path].append(time.perf_counter() - start)
+            statuses[path][status] += 1
+            return status
+
+        async def worker(deadline):
+            while time.perf_counter() < deadline:
+                await timed(*rng.choice(makers)())
+
+        async def refresher(deadline):
+            # Starts a refresh, waits for it to finish, and starts the next one.
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                if await timed('POST', '/api/refresh-data', {'mode': 'incremental'}) == 200:
+                    while time.perf_counter() < deadline + 60:
+                        await asyncio.sleep(0.1)
+                        if (await client.get('/api/refresh-status')).json().get('status') != 'running':
+                            refreshes.append(time.perf_counter() - started)
+                            break
+                else:
+                    await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        deadline = start + duration
+        tasks = [worker(deadline) for _ in range(concurrency)]
+        if name == 'mixed':
+            tasks.append(refresher(deadline))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    result = {
+        'elapsed_s': round(elapsed, 3),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1),
+        'endpoints': {path: summarize_latencies(latencies[path], statuses[path], elapsed, path) for path in sorted(latencies)},
+    }
+    if name == 'mixed':
+        refreshes.sort()
+        result['refreshes'] = {
+            'completed': len(refreshes),
+            'duration_s_p50': round(percentile(refreshes, 50), 3) if refreshes else None,
+            'duration_s_max': round(refreshes[-1], 3) if refreshes else None,
+        }
+    return result
+
+
+def git_revision():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    # The results file itself is left out of the dirty check.
+    dirty = git('status', '--porcelain', '--untracked-files=no')
+    return {'commit': git('rev-parse', '--short', 'HEAD'), 'dirty': bool(dirty)}
+
+
+def run_benchmark(args):
+    market = synthetic_market(args.coins, seed=args.seed)
+    with tempfile.TemporaryDirectory() as data_dir, StubServers(market, args.latency_ms / 1000, args.error_rate, args.seed) as stubs:
+        binance_prices = stubs.stubs['binance'].prices
+        tradable_ids = {coin['id'] for coin in market if f"{coin['symbol'].upper()}USDC" in binance_prices}
+        seed_data_dir(data_dir, market, binance_prices)
+        pages = math.ceil(args.coins / 250)
+        extra_env = dict(item.split('=', 1) for item in args.app_env)
+        with AppServer(stubs.urls(), data_dir, pages, args.workers, extra_env) as app:
+            results = {}
+            for i, name in enumerate(args.scenarios):
+                print(f"Running {name} for {args.duration:g}s with {args.concurrency} clients...", file=sys.stderr)
+                results[name] = asyncio.run(run_scenario(
+                    name, app.url, market, tradable_ids, args.concurrency, args.duration, args.seed + i))
+        upstream_counts = stubs.counts()
+
+    return {
+        'benchmark': 'load',
+        **git_revision(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'duration_s': args.duration, 'concurrency': args.concurrency, 'coins': args.coins,
+            'upstream_latency_ms': args.latency_ms, 'upstream_error_rate': args.error_rate,
+            'seed': args.seed, 'workers': args.workers, 'app_env': extra_env,
+        },
+        'upstream_requests': upstream_counts,
+        'scenarios': results,
+    }
+
+
+def print_results(results):
+    print(f"commit {results['commit']}{' (dirty)' if results['dirty'] else ''}, {results['config']}")
+    print(f"{'scenario':<8} {'endpoint':<18} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, scenario in results['scenarios'].items():
+        for path, endpoint in scenario['endpoints'].items():
+            latency = endpoint['latency_ms']
+            print(f"{name:<8} {path:<18} {endpoint['requests']:>9} {endpoint['errors']:>7} {endpoint['throughput_rps']:>8.1f} "
+                  f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} {latency['max']:>8.2f}")
+        if 'refreshes' in scenario:
+            print(f"{name:<8} refreshes: {scenario['refreshes']}")
+
+
+def compare(baseline, results, tolerance):
+    """Prints the change of every endpoint against the baseline, and returns the regressions."""
+    regressions = []
+    print(f"\nAgainst commit {baseline.get('commit')} (tolerance {tolerance:.0%}):")
+    print(f"{'scenario':<8} {'endpoint':<18} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}")
+    for name, scenario in results['scenarios'].items():
+        for path, endpoint in scenario['endpoints'].items():
+            before = baseline.get('scenarios', {}).get(name, {}).get('endpoints', {}).get(path)
+            if before is None:
+                continue
+            cells = []
+            for key in ('throughput_rps', 'p50', 'p95', 'p99'):
+                old = before[key] if key == 'throughput_rps' else before['latency_ms'][key]
+                new = endpoint[key] if key == 'throughput_rps' else endpoint['latency_ms'][key]
+                change = (new - old) / old if old else 0.0
+                cells.append(f"{new:>8.1f} {change:>+7.0%}")
+                # Lower throughput and higher tail latency are regressions.
+                if (key == 'throughput_rps' and change < -tolerance) or (key == 'p95' and change > tolerance):
+                    regressions.append(f"{name} {path} {key}: {old} -> {new}")
+            print(f"{name:<8} {path:<18} {' '.join(cells)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--latency-ms', type=float, default=20, help='upstream stub latency (plus up to half of it as jitter)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of upstream requests failing with a 503')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes (more than one shares state)')
+    parser.add_argument('--coins', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--app-env', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='extra environment variables of the server, e.g. PRICE_CACHE_TTL_BINANCE=0')
+    parser.add_argument('--output', help=f'results file (default {os.path.relpath(RESULTS_DIR)}/load-<commit>.json)')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95/throughput regression')
+    parser.add_argument('--input', help='compare this results file instead of running the benchmark')
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = run_benchmark(args)
+        output = args.output or os.path.join(RESULTS_DIR, f"load-{results['commit'] or 'unknown'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {output}", file=sys.stderr)
+    print_results(results)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
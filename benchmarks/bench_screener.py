@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of the /api/screener query: per-query latency of a Python loop over the
+coin dicts against the NumPy market table (plain dicts and memory-mapped columnar file),
+on synthetic coin lists of 3k, 30k and 300k coins.
+
+Usage:
+    python benchmarks/bench_screener.py [--sizes 3000 30000 300000] [--repeat 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.columnar import ColumnarCoins, write_columnar
+from src.screener import OPERATORS, MarketTable, parse_filter
+
+# "Tradable coins with some volume, biggest 24h gainers first", and a wider variant.
+QUERIES = [
+    (['total_volume>=1e6'], True, 'price_change_percentage_24h'),
+    (['market_cap>=1e7', 'price_change_percentage_24h<0'], None, 'total_volume'),
+]
+
+
+def make_coins(count, seed=42):
+    rng = random.Random(seed)
+    coins = []
+    for i in range(count):
+        market_cap = 1e12 / (i + 1)
+        coin = {'id': f"coin-{i}", 'name': f"Coin {i}", 'symbol': f"C{i}", 'is_tradable_on_binance_vs_usdc': i % 3 == 0,
+                'current_price': rng.lognormvariate(0, 3), 'market_cap': market_cap, 'market_cap_rank': i + 1,
+                'total_volume': market_cap * rng.uniform(0.001, 0.3)}
+        if rng.random() > 0.02:
+            coin['price_change_percentage_24h'] = rng.gauss(0, 5)
+        coins.append(coin)
+    return coins
+
+
+def python_loop(coins, filters, tradable, sort, limit):
+    """The same query as a loop over the dicts, as a handler would write it without the table."""
+    matches = []
+    for coin in coins:
+        if tradable is not None and coin['is_tradable_on_binance_vs_usdc'] != tradable:
+            continue
+        if all(coin.get(field) is not None and OPERATORS[op](coin[field], value) for field, op, value in filters):
+            matches.append(coin)
+    matches.sort(key=lambda coin: -coin[sort] if coin.get(sort) is not None else float('inf'))
+    return matches[:limit], len(matches)
+
+
+def per_query_us(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        for filters, tradable, sort in QUERIES:
+            parsed = [parse_filter(expression) for expression in filters]
+            start = time.perf_counter()
+            func(parsed, tradable, sort)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3000, 30000, 300000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'coins':>8} {'loop p50 us':>12} {'loop p99 us':>12} {'table p50 us':>13} {'table p99 us':>13}"
+          f" {'mmap p50 us':>12} {'mmap p99 us':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            coins = make_coins(size)
+            path = os.path.join(directory, f"coins-{size}.cols")
+            write_columnar(path, coins)
+            table = MarketTable(coins)
+            mapped = MarketTable(ColumnarCoins(path))
+
+            # The loop gets fewer rounds at large sizes to keep the run short.
+            loop_repeat = max(1, args.repeat * 3000 // size)
+            loop = per_query_us(lambda f, t, s: python_loop(coins, f, t, s, args.limit), loop_repeat)
+            vectorized = per_query_us(lambda f, t, s: table.screen(f, t, s, True, args.limit), args.repeat)
+            mmap = per_query_us(lambda f, t, s: mapped.screen(f, t, s, True, args.limit), args.repeat)
+            print(f"{size:>8} {loop[0]:>12.1f} {loop[1]:>12.1f} {vectorized[0]:>13.1f} {vectorized[1]:>13.1f}"
+                  f" {mmap[0]:>12.1f} {mmap[1]:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of the /api/pairs search: per-query latency of the previous linear
+scan against the prefix index, and of the fuzzy (mode=fuzzy) index, on synthetic
+coin lists of 3k, 30k and 300k coins.
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 3000 30000 300000] [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.search_index import FuzzyIndex, PrefixIndex
+
+QUERIES = ['b', 'bi', 'bit', 'eth', 'sol', 'x', 'do', 'pepe', 'zzzz']
+
+
+def misspell(word, rng):
+    """Deletes, swaps or replaces one letter, like a user typing quickly."""
+    i = rng.randrange(len(word))
+    edit = rng.choice(['delete', 'replace', 'swap'])
+    if edit == 'delete' and len(word) > 3:
+        return word[:i] + word[i + 1:]
+    if edit == 'swap' and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def make_coins(count, seed=42):
+    rng = random.Random(seed)
+    coins = []
+    for i in range(count):
+        name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).capitalize()
+        symbol = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5)))
+        coins.append({'id': f"{name.lower()}-{i}", 'name': name, 'symbol': symbol, 'is_tradable_on_binance_vs_usdc': i % 5 == 0})
+    return coins
+
+
+def linear_scan(coins, search):
+    search_lower = search.lower()
+    return [
+        coin for coin in coins
+        if coin['name'].lower().startswith(search_lower) or coin['symbol'].lower().startswith(search_lower)
+    ]
+
+
+def per_query_us(func, repeat, queries=QUERIES):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99) - 1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3000, 30000, 300000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'coins':>8} {'build ms':>9} {'scan p50 us':>12} {'scan p99 us':>12} {'index p50 us':>13} {'index p99 us':>13}"
+          f" {'fuzzy build ms':>15} {'fuzzy p50 us':>13} {'fuzzy p99 us':>13}")
+    for size in args.sizes:
+        coins = make_coins(size)
+        start = time.perf_counter()
+        index = PrefixIndex(coins)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # The linear scan gets fewer rounds at large sizes to keep the run short.
+        scan_repeat = max(1, args.repeat * 3000 // size)
+        scan_p50, scan_p99 = per_query_us(lambda q: linear_scan(coins, q), scan_repeat)
+        index_p50, index_p99 = per_query_us(lambda q: index.search(q, limit=args.limit), args.repeat)
+
+        start = time.perf_counter()
+        fuzzy = FuzzyIndex(coins)
+        fuzzy_build_ms = (time.perf_counter() - start) * 1000
+        rng = random.Random(size)
+        typos = [misspell(coins[rng.randrange(size)]['name'].lower(), rng) for _ in range(20)]
+        fuzzy_p50, fuzzy_p99 = per_query_us(lambda q: fuzzy.search(q, limit=10), args.repeat, typos)
+        print(f"{size:>8} {build_ms:>9.1f} {scan_p50:>12.1f} {scan_p99:>12.1f} {index_p50:>13.1f} {index_p99:>13.1f}"
+              f" {fuzzy_build_ms:>15.1f} {fuzzy_p50:>13.1f} {fuzzy_p99:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
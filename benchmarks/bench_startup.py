@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Startup benchmark of the API: import time of the application, and time to first response of
+a uvicorn server started in a subprocess on a synthetic dataset, with the dataset warmed
+during startup (STARTUP_WARM=1, the default) and loaded by the first request (STARTUP_WARM=0).
+
+For each run it reports, from the launch of the process:
+    live     first 200 from /healthz (the process serves requests)
+    ready    first 200 from /readyz (startup finished, dataset and indexes built)
+    first    end of the first GET /api/pairs, and that request's own latency
+and the phases of the startup report of /readyz. The import time of python-binance, which
+the server now only imports when a refresh runs, is measured separately.
+
+Usage:
+    python benchmarks/bench_startup.py [--coins 3000 30000] [--runs 3]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_load import free_port, seed_data_dir
+from tests.stubs import synthetic_market
+
+IMPORT_CODE = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+
+
+def import_seconds(module, runs):
+    """Median import time of `module` in fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', IMPORT_CODE.format(module=module)], cwd=PROJECT_ROOT,
+                                env={**os.environ, 'PYTHONPATH': PROJECT_ROOT}, capture_output=True, text=True, check=True)
+        timings.append(float(result.stdout.split()[-1]))
+    return statistics.median(timings)
+
+
+def wait_for(url, started, process, timeout=60):
+    """Seconds from `started` until `url` answers 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer within {timeout} seconds")
+
+
+def measure_startup(data_dir, warm):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        'PYTHONPATH': PROJECT_ROOT,
+        'DATA_DIR': data_dir,
+        'STARTUP_WARM': '1' if warm else '0',
+        'BINANCE_STREAM_ENABLED': '0',
+        'PRICE_HISTORY_DB': '',
+        'ALERT_WALLETS': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    command = [sys.executable, '-m', 'uvicorn', 'src.main:app', '--host', '127.0.0.1', '--port', str(port),
+               '--log-level', 'warning', '--no-access-log']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+    try:
+        live = wait_for(f"{url}/healthz", started, process)
+        ready = wait_for(f"{url}/readyz", started, process)
+        request_started = time.perf_counter()
+        httpx.get(f"{url}/api/pairs", timeout=60).raise_for_status()
+        first_latency = time.perf_counter() - request_started
+        first = time.perf_counter() - started
+        report = httpx.get(f"{url}/readyz", timeout=5).json()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {'live': live, 'ready': ready, 'first': first, 'first_latency': first_latency,
+            'import': report['import_seconds'], **report['phases']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--coins', type=int, nargs='+', default=[3000, 30000])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"import src.main: {import_seconds('src.main', args.runs) * 1000:.0f} ms"
+          f" (python-binance, deferred to the first refresh: {import_seconds('binance.client', args.runs) * 1000:.0f} ms)")
+    columns = ['live', 'ready', 'first', 'first_latency', 'import', 'dataset']
+    print(f"{'coins':>7} {'warm':>5} " + ' '.join(f"{column + ' ms':>16}" for column in columns))
+    for count in args.coins:
+        with tempfile.TemporaryDirectory() as data_dir:
+            market = synthetic_market(count)
+            seed_data_dir(data_dir, market, {})
+            for warm in (True, False):
+                runs = [measure_startup(data_dir, warm) for _ in range(args.runs)]
+                medians = [statistics.median(run.get(column, 0.0) for run in runs) * 1000 for column in columns]
+                print(f"{count:>7} {str(warm):>5} " + ' '.join(f"{value:>16.1f}" for value in medians))
+
+
+if __name__ == '__main__':
+    main()
@@ -44,7 +44,12 @@ function App() {
         throw new Error('Erreur serveur lors de la recherche.');
       }
       if (!response.ok) throw new Error('Network response was not ok.');
-      const data = await response.json();
+      let data = await response.json();
+      if (data.length === 0) {
+        // Aucun nom ne commence par la recherche : on tente une recherche tolérante aux fautes de frappe.
+        const fuzzyResponse = await fetch(`http://localhost:8000/api/pairs?search=${searchTerm}&mode=fuzzy&limit=10`);
+        if (fuzzyResponse.ok) data = await fuzzyResponse.json();
+      }
       setSuggestions(data);
     } catch (error) {
       console.error("Erreur lors de la récupération des suggestions:", error);
@@ -59,26 +64,26 @@ function App() {
     debouncedFetch(search);
   }, [search, debouncedFetch]);
 
-  // Check for data on startup and handle connection to backend
+  // Check for data on startup and handle connection to backend.
+  // The refresh-status stream reconnects by itself until the backend is available,
+  // and its first event tells whether a refresh is already running.
   useEffect(() => {
-    // Set an interval to poll the backend until it's available.
-    const startupInterval = setInterval(async () => {
-      try {
-        const statusResponse = await fetch('http://localhost:8000/api/refresh-status');
+    const startupSource = new EventSource('http://localhost:8000/api/stream/refresh-status');
 
-        // If we get a successful response, the backend is up.
-        // Stop polling.
-        clearInterval(startupInterval);
-        setRefreshMessage(''); // Clear the "Connecting..." message.
+    startupSource.addEventListener('refresh-status', async (event) => {
+      // The backend is up: we only needed the first event.
+      startupSource.close();
+      setRefreshMessage(''); // Clear the "Connecting..." message.
 
-        const statusData = await statusResponse.json();
+      const statusData = JSON.parse(event.data);
 
-        if (statusData.status === 'in_progress') {
-          // A refresh is already running (e.g., initial data generation).
-          console.log("Un rafraîchissement est déjà en cours au démarrage, surveillance en cours.");
-          startRefreshPolling();
-        } else {
-          // If no refresh is running, check if the data file exists.
+      if (statusData.status === 'running') {
+        // A refresh is already running (e.g., initial data generation).
+        console.log("Un rafraîchissement est déjà en cours au démarrage, surveillance en cours.");
+        startRefreshStream();
+      } else {
+        // If no refresh is running, check if the data file exists.
+        try {
           const pairsResponse = await fetch(`http://localhost:8000/api/pairs?search=b`);
           if (pairsResponse.status === 500) {
             const errorData = await pairsResponse.json();
@@ -87,19 +92,35 @@ function App() {
               handleRefresh();
             }
           }
+        } catch (error) {
+          console.error("Erreur lors de la vérification des données:", error);
         }
-      } catch (error) {
-        // This catch block runs if the fetch fails, meaning the server is likely down.
-        console.log("Backend non disponible, nouvelle tentative...");
-        setRefreshMessage("Connexion au serveur en cours...");
       }
-    }, 2000); // Poll every 2 seconds.
+    });
 
-    // Cleanup interval on component unmount.
-    return () => clearInterval(startupInterval);
+    startupSource.onerror = () => {
+      // EventSource retries on its own, meaning the server is likely down for now.
+      console.log("Backend non disponible, nouvelle tentative...");
+      setRefreshMessage("Connexion au serveur en cours...");
+    };
+
+    // Close the stream on component unmount.
+    return () => startupSource.close();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  // Live price updates for the selected coin, pushed by the server.
+  useEffect(() => {
+    if (!selectedCoin || !priceInfo) return undefined;
+    const priceSource = new EventSource(`http://localhost:8000/api/stream/prices?coin_ids=${encodeURIComponent(selectedCoin.id)}`);
+    priceSource.addEventListener('price', (event) => {
+      setPriceInfo(JSON.parse(event.data));
+    });
+    return () => priceSource.close();
+    // Only (re)subscribe when the selected coin changes or its first price arrives.
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [selectedCoin, priceInfo !== null]);
+
   const handleSelectCoin = async (coin) => {
     setSearch('');
     setSelectedCoin(coin);
@@ -133,39 +154,40 @@ function App() {
     }
   };
 
-  const startRefreshPolling = () => {
+  const startRefreshStream = () => {
     setShowProgressBar(true);
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch('http://localhost:8000/api/refresh-status');
-        const progress = await response.json();
+    const refreshSource = new EventSource('http://localhost:8000/api/stream/refresh-status');
 
-        setRefreshProgress({
-          current: progress.current,
-          total: progress.total,
-          stage: progress.stage,
-        });
+    refreshSource.addEventListener('refresh-status', (event) => {
+      const progress = JSON.parse(event.data);
 
-        if (progress.status === 'complete' || progress.status === 'error') {
-          clearInterval(interval);
-          setShowProgressBar(false);
-          setRefreshMessage(progress.status === 'complete' ? 'Rafraîchissement terminé avec succès.' : `Erreur: ${progress.error_message}`);
-          setTimeout(() => setRefreshMessage(''), 5000);
-        }
-      } catch (error) {
-        console.error("Erreur lors de la récupération du statut de rafraîchissement:", error);
-        clearInterval(interval);
+      setRefreshProgress({
+        current: progress.current,
+        total: progress.total,
+        stage: progress.stage,
+      });
+
+      if (progress.status === 'complete' || progress.status === 'error') {
+        refreshSource.close();
         setShowProgressBar(false);
-        setRefreshMessage('Erreur de connexion au serveur.');
+        setRefreshMessage(progress.status === 'complete' ? 'Rafraîchissement terminé avec succès.' : `Erreur: ${progress.error_message}`);
         setTimeout(() => setRefreshMessage(''), 5000);
       }
-    }, 1000);
+    });
+
+    refreshSource.onerror = () => {
+      console.error("Erreur de connexion au flux de statut de rafraîchissement.");
+      refreshSource.close();
+      setShowProgressBar(false);
+      setRefreshMessage('Erreur de connexion au serveur.');
+      setTimeout(() => setRefreshMessage(''), 5000);
+    };
   };
 
   const handleRefresh = async () => {
     setRefreshMessage('Lancement du rafraîchissement...');
     try {
-      const response = await fetch('http://localhost:8000/api/refresh-data', {
+      const response = await fetch('http://localhost:8000/api/refresh-data?mode=incremental', {
         method: 'POST',
       });
       const data = await response.json();
@@ -173,9 +195,9 @@ function App() {
       if (!response.ok) {
         if (response.status === 409) {
           // A refresh is already in progress, this is not an error.
-          // Start polling to monitor the existing refresh.
+          // Follow the refresh stream to monitor the existing refresh.
           setRefreshMessage(data.detail || 'Un rafraîchissement est déjà en cours, suivi de la progression.');
-          startRefreshPolling();
+          startRefreshStream();
         } else {
           // For other errors, throw to be caught by the catch block.
           throw new Error(data.detail || 'Une erreur est survenue.');
@@ -183,7 +205,7 @@ function App() {
       } else {
         // This is the success case (e.g., 200 OK)
         setRefreshMessage(data.message);
-        startRefreshPolling();
+        startRefreshStream();
       }
     } catch (error) {
       setRefreshMessage(`Erreur: ${error.message}`);
@@ -265,6 +287,7 @@ function App() {
                     <h2>Prix pour {selectedCoin.name} ({priceInfo.symbol})</h2>
                     <p className="price">${formatPrice(priceInfo.price)}</p>
                     <p className="source">Source: {priceInfo.source}</p>
+                    {priceInfo.cached && <p className="source">En cache depuis {Math.round(priceInfo.age_seconds)} s</p>}
                   </div>
                 )}
               </div>
@@ -59,13 +59,22 @@ const LendingPage = () => {
         setError(null);
 
         try {
-            const response = await fetch(`http://localhost:8000/api/jupiter-lend-positions/${walletAddress}`);
-            const data = await response.json();
+            // The risk engine revalues the positions with our own prices and recomputes their health factor.
+            const response = await fetch('http://localhost:8000/api/lending/risk', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ wallets: [walletAddress] }),
+            });
+            const result = await response.json();
 
             if (!response.ok) {
-                throw new Error(data.detail || 'Erreur lors de la récupération des positions.');
+                throw new Error(result.detail || 'Erreur lors de la récupération des positions.');
+            }
+            if (result.errors.length > 0) {
+                throw new Error(result.errors[0].detail || 'Erreur lors de la récupération des positions.');
             }
 
+            const data = result.positions;
             if (data.length === 0) {
                 setError('Aucune position de prêt trouvée pour cette adresse.');
             }
@@ -318,7 +327,7 @@ const LendingPage = () => {
                                 <div>
                                     <div className="flex justify-between text-sm mb-2">
                                         <span className="text-gray-400">Health Factor</span>
-                                        <span className={position.healthFactor < 1.2 ? 'text-red-400 font-bold' : position.healthFactor < 1.5 ? 'text-yellow-400' : 'text-green-400'}>{position.healthFactor > 100 ? '∞' : position.healthFactor?.toFixed(3)}</span>
+                                        <span className={position.healthFactor == null ? 'text-green-400' : position.healthFactor < 1.2 ? 'text-red-400 font-bold' : position.healthFactor < 1.5 ? 'text-yellow-400' : 'text-green-400'}>{position.healthFactor == null || position.healthFactor > 100 ? '∞' : position.healthFactor.toFixed(3)}</span>
                                     </div>
                                 </div>
                             </div>
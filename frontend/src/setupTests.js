@@ -3,3 +3,17 @@
 // expect(element).toHaveTextContent(/react/i)
 // learn more: https://github.com/testing-library/jest-dom
 import '@testing-library/jest-dom';
+
+// jsdom does not implement EventSource, which the app uses for server-pushed updates.
+if (typeof window.EventSource === 'undefined') {
+  class EventSourceStub {
+    constructor(url) {
+      this.url = url;
+      this.onerror = null;
+    }
+    addEventListener() {}
+    close() {}
+  }
+  window.EventSource = EventSourceStub;
+  globalThis.EventSource = EventSourceStub;
+}
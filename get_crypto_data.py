@@ -7,8 +7,10 @@ It imports and runs the main data update logic from the 'data_updater' module.
 """
 
 from src.data_updater import run_update
+from src.logging_setup import configure_logging
 
 if __name__ == "__main__":
+    configure_logging()
     print("Starting manual data refresh...")
     run_update()
     print("Manual data refresh complete.")
\ No newline at end of file
@@ -1,8 +1,30 @@
+import argparse
+import os
+import tempfile
 import uvicorn
 import sys
 import asyncio
 
+
+def shared_state_path(port):
+    """SQLite file shared by the workers of one server, cleared of a previous run's state at every launch."""
+    from src.shared_state import SharedState
+
+    path = os.environ.get("SHARED_STATE_DB") or os.path.join(tempfile.gettempdir(), f"cryptotrack-shared-{port}.sqlite3")
+    # Leases and progress left by a previous run are stale; the file itself is left in place.
+    SharedState(path).reset()
+    return path
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                        help="worker processes; more than one starts the production mode (no reload, shared state)")
+    parser.add_argument("--no-reload", action="store_true", help="do not reload on code changes with a single worker")
+    args = parser.parse_args()
+
     # On Windows, the default asyncio event loop (ProactorEventLoop) can cause
     # a ConnectionResetError. Switching to the SelectorEventLoop, which is
     # the default on other platforms, resolves this issue.
@@ -13,4 +35,11 @@ if __name__ == "__main__":
     # We run the server programmatically to ensure the event loop policy is
     # applied before the server starts. The application is specified as a
     # string 'src.main:app' to allow Uvicorn to import it correctly.
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if args.workers > 1:
+        # Production mode: the workers share the refresh lock and progress and the price
+        # cache through a SQLite file (see src/shared_state.py). They inherit the variable.
+        os.environ["SHARED_STATE_DB"] = shared_state_path(args.port)
+        print(f"Starting {args.workers} workers sharing their state in {os.environ['SHARED_STATE_DB']}.")
+        uvicorn.run("src.main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("src.main:app", host=args.host, port=args.port, reload=not args.no_reload)
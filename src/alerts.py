@@ -0,0 +1,325 @@
+"""
+Liquidation-risk alerts for registered wallets, evaluated in the background.
+
+The scheduler checks each registered wallet's Jupiter Lend positions when it is due.
+All wallets due in the same tick are evaluated together: their positions are fetched
+through the cached batch path (`get_lend_positions_batch`), their tokens are priced
+with a single `resolve_symbol_prices` call, and their health factors are computed in
+one `PositionBook` pass (see `src/risk_engine.py`).
+
+A position's alert level (safe, risky, critical) escalates as soon as its health
+factor crosses a threshold, but only goes back down once the health factor is
+`hysteresis` above it, so a position hovering around a threshold does not flap.
+Every level change is published on the `alert:<wallet>` and `alert:*` topics of the
+broadcaster, and posted to `ALERT_WEBHOOK_URL` when it is set. In a multi-worker deployment
+only the leader runs the scheduler: `on_alert` shares its alerts, which the other workers
+publish to their own subscribers with `relay`, and `sync_wallets` keeps every worker's
+wallets in line with the shared registrations (see `src/shared_state.py`).
+
+Each wallet is re-checked after an interval that depends on its lowest health factor:
+`min_interval` at a health factor of 1 and below, growing linearly up to
+`max_interval` at `relaxed_health_factor` and above (or without any borrow), so the
+upstream load follows the risk rather than the number of wallets.
+
+Configuration through environment variables:
+    ALERT_WALLETS                 comma-separated wallets registered at startup
+    ALERT_WEBHOOK_URL             URL receiving each alert as a JSON POST (default: none)
+    ALERT_TICK_INTERVAL           seconds between two looks for due wallets (default 5)
+    ALERT_MIN_INTERVAL            seconds between two checks of a wallet close to liquidation (default 30)
+    ALERT_MAX_INTERVAL            seconds between two checks of a healthy wallet (default 900)
+    ALERT_RELAXED_HEALTH_FACTOR   health factor from which a wallet is checked every max interval, above 1 (default 3)
+    ALERT_HYSTERESIS              health factor margin needed to lower an alert level (default 0.05)
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+import httpx
+import numpy as np
+
+from src.event_stream import Broadcaster
+from src.jupiter_client import get_lend_positions_batch
+from src.risk_engine import RISK_LEVELS, PositionBook, resolve_symbol_prices, risk_codes
+
+logger = logging.getLogger(__name__)
+
+INITIAL_WALLETS = [wallet.strip() for wallet in os.environ.get("ALERT_WALLETS", "").split(",") if wallet.strip()]
+WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL") or None
+TICK_INTERVAL = float(os.environ.get("ALERT_TICK_INTERVAL", 5))
+MIN_INTERVAL = float(os.environ.get("ALERT_MIN_INTERVAL", 30))
+MAX_INTERVAL = float(os.environ.get("ALERT_MAX_INTERVAL", 900))
+RELAXED_HEALTH_FACTOR = float(os.environ.get("ALERT_RELAXED_HEALTH_FACTOR", 3))
+HYSTERESIS = float(os.environ.get("ALERT_HYSTERESIS", 0.05))
+
+WEBHOOK_TIMEOUT = 5
+RECENT_ALERTS = 100
+
+
+def alert_topic(wallet: str) -> str:
+    return f"alert:{wallet}"
+
+
+ALL_ALERTS_TOPIC = alert_topic("*")
+
+
+def next_levels(current: np.ndarray, health_factor: np.ndarray, hysteresis: float) -> np.ndarray:
+    """
+    Alert level codes (see `RISK_LEVELS`) following `current` for the given health factors:
+    a higher level is taken right away, a lower one only with a `hysteresis` margin.
+    """
+    raw = risk_codes(health_factor)
+    buffered = risk_codes(health_factor - hysteresis)
+    return np.where(raw > current, raw, np.where(buffered < current, buffered, current))
+
+
+def position_keys(wallet: str, positions: Iterable[Dict[str, Any]]) -> List[str]:
+    """Stable keys of a wallet's positions, e.g. 'wallet:SOL/USDC' ('wallet:SOL/USDC#2' for a second one)."""
+    keys = []
+    seen: Dict[str, int] = {}
+    for position in positions:
+        key = f"{wallet}:{position.get('collateral')}/{position.get('borrowed')}"
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+class WatchedWallet:
+    """Scheduling and alert state of a registered wallet."""
+
+    def __init__(self, wallet: str, next_check: float):
+        self.wallet = wallet
+        self.next_check = next_check
+        self.interval: Optional[float] = None
+        self.min_health_factor: Optional[float] = None
+        self.levels: Dict[str, int] = {}
+        self.checks = 0
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def status(self, now: float) -> Dict[str, Any]:
+        return {
+            "wallet": self.wallet,
+            "positions": len(self.levels),
+            "levels": {key: str(RISK_LEVELS[code]) for key, code in self.levels.items()},
+            "min_health_factor": self.min_health_factor,
+            "interval_seconds": self.interval,
+            "next_check_in": round(max(self.next_check - now, 0.0), 3),
+            "checks": self.checks,
+            "last_error": self.last_error,
+        }
+
+
+class AlertScheduler:
+    """Evaluates the registered wallets when they are due and publishes alert level changes."""
+
+    def __init__(
+        self,
+        broadcaster: Broadcaster,
+        coins_by_symbol: Callable[[], Mapping[str, Dict[str, Any]]],
+        webhook_url: Optional[str] = WEBHOOK_URL,
+        tick_interval: float = TICK_INTERVAL,
+        min_interval: float = MIN_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        relaxed_health_factor: float = RELAXED_HEALTH_FACTOR,
+        hysteresis: float = HYSTERESIS,
+        clock: Callable[[], float] = time.monotonic,
+        on_alert: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        if not relaxed_health_factor > 1:
+            # `interval_for` scales the interval over the health factor range (1, relaxed].
+            raise ValueError(f"The relaxed health factor must be above 1, got {relaxed_health_factor}")
+        self.broadcaster = broadcaster
+        self.coins_by_symbol = coins_by_symbol
+        self.webhook_url = webhook_url
+        self.tick_interval = tick_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.relaxed_health_factor = relaxed_health_factor
+        self.hysteresis = hysteresis
+        self.clock = clock
+        self.on_alert = on_alert
+        self.wallets: Dict[str, WatchedWallet] = {}
+        self.recent: collections.deque = collections.deque(maxlen=RECENT_ALERTS)
+        self.rounds = 0
+        self.alerts = 0
+        self.webhooks_sent = 0
+        self.webhook_failures = 0
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+        self._webhook_tasks = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, wallets: Iterable[str]) -> List[str]:
+        """Registers wallets, due right away. Returns the ones that were not registered yet."""
+        added = []
+        for wallet in wallets:
+            if wallet not in self.wallets:
+                self.wallets[wallet] = WatchedWallet(wallet, self.clock())
+                added.append(wallet)
+        return added
+
+    def unwatch(self, wallet: str) -> bool:
+        return self.wallets.pop(wallet, None) is not None
+
+    def sync_wallets(self, wallets: Iterable[str]):
+        """Watches exactly `wallets`, keeping the state of the ones already watched."""
+        wallets = set(wallets)
+        for wallet in [wallet for wallet in self.wallets if wallet not in wallets]:
+            self.unwatch(wallet)
+        self.watch(sorted(wallets))
+
+    def interval_for(self, health_factor: float) -> float:
+        """Seconds until the next check of a wallet whose lowest health factor is `health_factor`."""
+        if not np.isfinite(health_factor):
+            return self.max_interval
+        closeness = min(max((health_factor - 1) / (self.relaxed_health_factor - 1), 0.0), 1.0)
+        return self.min_interval + (self.max_interval - self.min_interval) * closeness
+
+    async def check_due(self) -> int:
+        """Checks every wallet that is due. Returns the number of wallets checked."""
+        now = self.clock()
+        due = [watched for watched in self.wallets.values() if watched.next_check <= now]
+        if due:
+            await self.check(due)
+        return len(due)
+
+    async def check(self, due: List[WatchedWallet]):
+        """Evaluates the positions of `due` wallets together and schedules their next check."""
+        results = await get_lend_positions_batch([watched.wallet for watched in due])
+
+        checked: List[WatchedWallet] = []
+        positions: List[Dict[str, Any]] = []
+        keys: List[str] = []
+        owners: List[int] = []
+        for watched, result in zip(due, results):
+            if result["error"] is not None:
+                self._retry_later(watched, result["error"]["detail"])
+                continue
+            owners.extend([len(checked)] * len(result["positions"]))
+            keys.extend(position_keys(watched.wallet, result["positions"]))
+            positions.extend(result["positions"])
+            checked.append(watched)
+        if not checked:
+            self.rounds += 1
+            return
+
+        try:
+            book = PositionBook(positions)
+        except ValueError as e:
+            for watched in checked:
+                self._retry_later(watched, str(e))
+            self.rounds += 1
+            return
+        prices = await resolve_symbol_prices(book.symbols, self.coins_by_symbol())
+        health_factor = book.health_factors({symbol: price['price'] for symbol, price in prices.items()})
+
+        current = np.array([checked[owner].levels.get(key, 0) for owner, key in zip(owners, keys)], dtype=np.int64)
+        levels = next_levels(current, health_factor, self.hysteresis)
+        owners_array = np.array(owners, dtype=np.intp)
+        min_health = np.full(len(checked), np.inf)
+        np.minimum.at(min_health, owners_array, health_factor)
+
+        for index in np.flatnonzero(levels != current).tolist():
+            self._emit(checked[owners[index]].wallet, keys[index], positions[index],
+                       int(current[index]), int(levels[index]), float(health_factor[index]))
+
+        now = self.clock()
+        new_levels: List[Dict[str, int]] = [{} for _ in checked]
+        for owner, key, level in zip(owners, keys, levels.tolist()):
+            new_levels[owner][key] = level
+        for owner, watched in enumerate(checked):
+            watched.levels = new_levels[owner]
+            lowest = float(min_health[owner])
+            watched.min_health_factor = round(lowest, 3) if np.isfinite(lowest) else None
+            watched.interval = self.interval_for(lowest)
+            watched.next_check = now + watched.interval
+            watched.checks += 1
+            watched.last_checked = time.time()
+            watched.last_error = None
+        self.rounds += 1
+
+    def _retry_later(self, watched: WatchedWallet, error: str):
+        """Retries a wallet that could not be evaluated after `min_interval`, doubling on each failure."""
+        failing = watched.last_error is not None and watched.interval is not None
+        watched.interval = min(watched.interval * 2, self.max_interval) if failing else self.min_interval
+        watched.last_error = error
+        watched.next_check = self.clock() + watched.interval
+
+    def _emit(self, wallet: str, key: str, position: Dict[str, Any], previous: int, level: int, health_factor: float):
+        event = {
+            "type": "alert" if level > previous else "recovered",
+            "wallet": wallet,
+            "position": key,
+            "collateral": position.get("collateral"),
+            "borrowed": position.get("borrowed"),
+            "level": str(RISK_LEVELS[level]),
+            "previous_level": str(RISK_LEVELS[previous]),
+            "healthFactor": round(health_factor, 3) if np.isfinite(health_factor) else None,
+            "time": time.time(),
+        }
+        self.relay(event)
+        if self.on_alert is not None:
+            self.on_alert(event)
+        if self.webhook_url:
+            task = asyncio.create_task(self._post_webhook(event))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+
+    def relay(self, event: Dict[str, Any]):
+        """Records an alert and publishes it to the subscribers of this process."""
+        self.alerts += 1
+        self.recent.append(event)
+        self.broadcaster.publish(alert_topic(event["wallet"]), event)
+        self.broadcaster.publish(ALL_ALERTS_TOPIC, event)
+
+    async def _post_webhook(self, event: Dict[str, Any]):
+        if self._webhook_client is None:
+            self._webhook_client = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT)
+        try:
+            response = await self._webhook_client.post(self.webhook_url, json=event)
+            response.raise_for_status()
+            self.webhooks_sent += 1
+        except httpx.HTTPError as e:
+            self.webhook_failures += 1
+            logger.warning("Error while posting an alert to the webhook: %s", e)
+
+    async def run(self):
+        while True:
+            try:
+                await self.check_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error while checking the watched wallets: %s", e)
+            await asyncio.sleep(self.tick_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._webhook_tasks:
+            await asyncio.gather(*self._webhook_tasks, return_exceptions=True)
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+            self._webhook_client = None
+
+    def status(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "rounds": self.rounds,
+            "alerts": self.alerts,
+            "webhook": {"enabled": bool(self.webhook_url), "sent": self.webhooks_sent, "failures": self.webhook_failures},
+            "wallets": [watched.status(now) for watched in self.wallets.values()],
+        }
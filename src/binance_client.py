@@ -1,5 +1,12 @@
+import asyncio
+import json
+import logging
+import time
 import httpx
-from typing import Optional
+from typing import Dict, Iterable, Optional, Tuple
+from src.http_clients import upstream_client
+
+logger = logging.getLogger(__name__)
 
 async def get_price_from_binance(symbol: str) -> Optional[float]:
     """
@@ -7,19 +14,103 @@ async def get_price_from_binance(symbol: str) -> Optional[float]:
     The symbol must be in the API format, e.g., 'BTCUSDC'.
     """
     # Use the public, non-authenticated ticker endpoint
-    url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-
-    async with httpx.AsyncClient() as client:
+    async with upstream_client("binance") as client:
         try:
-            response = await client.get(url, timeout=10)
+            response = await client.get("/api/v3/ticker/price", params={"symbol": symbol})
             response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
             data = response.json()
             return float(data['price'])
         except httpx.HTTPStatusError as e:
             # This handles cases where the symbol doesn't exist (404) or other API errors
-            print(f"HTTP error fetching {symbol} from Binance: {e.response.status_code} - {e.response.text}")
+            logger.warning("HTTP error fetching %s from Binance: %s - %s", symbol, e.response.status_code, e.response.text)
             return None
         except (httpx.RequestError, ValueError, KeyError) as e:
             # Catches network errors, JSON parsing issues, or missing 'price' key
-            print(f"Failed to get price for {symbol} from Binance: {e}")
-            return None
\ No newline at end of file
+            logger.warning("Failed to get price for %s from Binance: %s", symbol, e)
+            return None
+
+# Above this many symbols, a single full ticker snapshot (same request weight as a
+# `symbols=[...]` call) is cheaper than building a long query string.
+SNAPSHOT_SYMBOL_THRESHOLD = 100
+# How long a full ticker snapshot can be reused by subsequent batch lookups.
+SNAPSHOT_TTL_SECONDS = 2.0
+
+_ticker_snapshot: Tuple[float, Dict[str, float]] = (0.0, {})
+_snapshot_lock: Optional[asyncio.Lock] = None
+
+
+def _parse_tickers(data) -> Dict[str, float]:
+    prices = {}
+    for ticker in data:
+        try:
+            prices[ticker['symbol']] = float(ticker['price'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return prices
+
+
+async def get_ticker_snapshot() -> Dict[str, float]:
+    """
+    Returns the latest prices of every Binance pair, from a single `ticker/price` call.
+    The snapshot is shared by all callers for SNAPSHOT_TTL_SECONDS, and concurrent
+    callers wait for the same request instead of issuing their own.
+    """
+    global _ticker_snapshot, _snapshot_lock
+    if _snapshot_lock is None:
+        _snapshot_lock = asyncio.Lock()
+
+    async with _snapshot_lock:
+        fetched_at, prices = _ticker_snapshot
+        if prices and time.monotonic() - fetched_at < SNAPSHOT_TTL_SECONDS:
+            return prices
+
+        async with upstream_client("binance") as client:
+            try:
+                response = await client.get("/api/v3/ticker/price")
+                response.raise_for_status()
+                prices = _parse_tickers(response.json())
+            except httpx.HTTPStatusError as e:
+                logger.warning("HTTP error fetching the Binance ticker snapshot: %s", e.response.status_code)
+                return {}
+            except (httpx.RequestError, ValueError) as e:
+                logger.warning("Failed to get the Binance ticker snapshot: %s", e)
+                return {}
+
+        _ticker_snapshot = (time.monotonic(), prices)
+        return prices
+
+
+async def get_prices_from_binance(symbols: Iterable[str]) -> Dict[str, float]:
+    """
+    Asynchronously fetches the latest prices for many pairs from Binance in one request.
+    Symbols must be in the API format, e.g., 'BTCUSDC'.
+    Returns a mapping of symbol to price; symbols without a price are left out.
+    """
+    wanted = set(symbols)
+    if not wanted:
+        return {}
+
+    if len(wanted) > SNAPSHOT_SYMBOL_THRESHOLD:
+        snapshot = await get_ticker_snapshot()
+        return {symbol: snapshot[symbol] for symbol in wanted if symbol in snapshot}
+
+    async with upstream_client("binance") as client:
+        try:
+            response = await client.get(
+                "/api/v3/ticker/price",
+                params={"symbols": json.dumps(sorted(wanted), separators=(",", ":"))},
+            )
+            response.raise_for_status()
+            return {symbol: price for symbol, price in _parse_tickers(response.json()).items() if symbol in wanted}
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 400:
+                logger.warning("HTTP error fetching %d symbols from Binance: %s", len(wanted), e.response.status_code)
+                return {}
+            # Binance rejects the whole `symbols` request when any one of them is
+            # unknown, so fall back to the full snapshot and pick what exists.
+        except (httpx.RequestError, ValueError) as e:
+            logger.warning("Failed to get prices for %d symbols from Binance: %s", len(wanted), e)
+            return {}
+
+    snapshot = await get_ticker_snapshot()
+    return {symbol: snapshot[symbol] for symbol in wanted if symbol in snapshot}
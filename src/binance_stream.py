@@ -0,0 +1,185 @@
+"""
+Live Binance prices from the public websocket ticker feed.
+
+A background task subscribes to Binance's `!miniTicker@arr` stream, which pushes
+the latest close price of every pair about once a second, and keeps the prices of
+the pairs we track in an in-memory price book. `get_price` reads the book without
+any network I/O; when the stream is down or a pair has gone quiet, the regular
+REST lookup is used instead.
+
+Configuration through environment variables:
+    BINANCE_STREAM_ENABLED    "1" to start the stream with the application (default 0)
+    BINANCE_WS_URL            websocket URL of the feed (a local stub in tests)
+    PRICE_STREAM_MAX_AGE      seconds after which a streamed price is considered stale (default 10)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WS_URL = "wss://stream.binance.com:9443/ws/!miniTicker@arr"
+
+STREAM_ENABLED = os.environ.get("BINANCE_STREAM_ENABLED", "0") == "1"
+WS_URL = os.environ.get("BINANCE_WS_URL", DEFAULT_WS_URL)
+MAX_PRICE_AGE = float(os.environ.get("PRICE_STREAM_MAX_AGE", 10))
+
+
+class PriceBook:
+    """
+    Latest streamed price per Binance pair.
+    The stream task is the only writer and replaces whole `(price, timestamp)`
+    tuples, so readers never need a lock and never see a half-written entry.
+    """
+
+    def __init__(self):
+        self._prices: Dict[str, Tuple[float, float]] = {}
+
+    def update(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        self._prices[symbol] = (price, time.time() if timestamp is None else timestamp)
+
+    def get(self, symbol: str, max_age: float = MAX_PRICE_AGE) -> Optional[Tuple[float, float]]:
+        """Returns `(price, age_in_seconds)` for a pair, or None if unknown or stale."""
+        entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        price, timestamp = entry
+        age = max(time.time() - timestamp, 0.0)
+        if age > max_age:
+            return None
+        return price, age
+
+    def __len__(self):
+        return len(self._prices)
+
+    def clear(self):
+        self._prices = {}
+
+
+class BinanceTickerStream:
+    """
+    Keeps a PriceBook up to date from a Binance mini-ticker websocket, reconnecting
+    with exponential backoff (and jitter) whenever the connection drops.
+    `symbols_provider` returns the pairs to track; it is re-read on every
+    (re)connection and every `symbols_refresh_seconds`.
+    """
+
+    def __init__(
+        self,
+        price_book: PriceBook,
+        symbols_provider: Callable[[], Iterable[str]],
+        url: str = WS_URL,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        symbols_refresh_seconds: float = 60.0,
+    ):
+        self.price_book = price_book
+        self.symbols_provider = symbols_provider
+        self.url = url
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.symbols_refresh_seconds = symbols_refresh_seconds
+        self.symbols: Set[str] = set()
+        self._symbols_loaded_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.connections = 0
+        self.messages = 0
+        self.last_message_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _refresh_symbols(self):
+        try:
+            self.symbols = set(self.symbols_provider())
+        except Exception as e:
+            logger.warning("Could not load the Binance pairs to stream: %s", e)
+        self._symbols_loaded_at = time.monotonic()
+
+    def handle_message(self, raw: Any):
+        """Applies one websocket message (a mini-ticker array, or a combined-stream wrapper) to the book."""
+        payload = json.loads(raw)
+        if isinstance(payload, dict) and "data" in payload:
+            payload = payload["data"]
+        tickers = payload if isinstance(payload, list) else [payload]
+
+        if time.monotonic() - self._symbols_loaded_at > self.symbols_refresh_seconds:
+            self._refresh_symbols()
+
+        for ticker in tickers:
+            symbol = ticker.get("s")
+            if symbol not in self.symbols:
+                continue
+            try:
+                price = float(ticker["c"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            # Timestamped on receipt rather than with the event time, so that clock
+            # skew with Binance cannot make fresh prices look stale.
+            self.price_book.update(symbol, price)
+
+        self.messages += 1
+        self.last_message_at = time.time()
+
+    async def run(self):
+        """Connects to the feed and consumes it until cancelled, reconnecting on any failure."""
+        import websockets  # Only needed when the stream is enabled.
+
+        backoff = self.min_backoff
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20) as websocket:
+                    self.connected = True
+                    self.connections += 1
+                    self._refresh_symbols()
+                    logger.info("Connected to the Binance ticker stream, tracking %d pairs.", len(self.symbols))
+                    async for message in websocket:
+                        self.handle_message(message)
+                        backoff = self.min_backoff
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Binance ticker stream error: %s", e)
+            finally:
+                self.connected = False
+
+            # Full jitter keeps many workers from reconnecting in lockstep.
+            delay = random.uniform(self.min_backoff, backoff)
+            logger.info("Reconnecting to the Binance ticker stream in %.1fs...", delay)
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "connected": self.connected,
+            "url": self.url,
+            "tracked_pairs": len(self.symbols),
+            "priced_pairs": len(self.price_book),
+            "connections": self.connections,
+            "messages": self.messages,
+            "last_message_at": self.last_message_at,
+            "last_error": self.last_error,
+        }
+
+
+price_book = PriceBook()
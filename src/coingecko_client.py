@@ -1,5 +1,10 @@
+import asyncio
+import logging
 import httpx
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
+from src.http_clients import upstream_client
+
+logger = logging.getLogger(__name__)
 
 async def get_price_from_coingecko(coin_id: str) -> Optional[float]:
     """
@@ -10,12 +15,9 @@ async def get_price_from_coingecko(coin_id: str) -> Optional[float]:
         Optional[float]: The price in USD, or None if not found.
     """
     # Public API endpoint for simple price lookup
-    url = f"https://api.coingecko.com/api/v3/simple/price?ids={coin_id}&vs_currencies=usd"
-
-    async with httpx.AsyncClient() as client:
+    async with upstream_client("coingecko") as client:
         try:
-            # CoinGecko has a rate limit, so a slightly longer timeout is reasonable.
-            response = await client.get(url, timeout=15)
+            response = await client.get("/api/v3/simple/price", params={"ids": coin_id, "vs_currencies": "usd"})
             response.raise_for_status()
             data = response.json()
 
@@ -25,12 +27,52 @@ async def get_price_from_coingecko(coin_id: str) -> Optional[float]:
                 return data[coin_id]['usd']
             else:
                 # This case handles a valid response that doesn't contain the expected price data.
-                print(f"Price data for '{coin_id}' not found in CoinGecko response.")
+                logger.info("Price data for '%s' not found in CoinGecko response.", coin_id)
                 return None
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error fetching {coin_id} from CoinGecko: {e.response.status_code}")
+            logger.warning("HTTP error fetching %s from CoinGecko: %s", coin_id, e.response.status_code)
             return None
         except (httpx.RequestError, ValueError, KeyError) as e:
             # Catches network errors, JSON parsing issues, or unexpected response structure.
-            print(f"Failed to get price for {coin_id} from CoinGecko: {e}")
-            return None
\ No newline at end of file
+            logger.warning("Failed to get price for %s from CoinGecko: %s", coin_id, e)
+            return None
+
+# Maximum number of ids sent in a single `simple/price` request, which keeps the
+# query string well under the URL length limits of the public API.
+IDS_PER_REQUEST = 100
+
+
+async def _get_price_chunk(client: httpx.AsyncClient, coin_ids: List[str]) -> Dict[str, float]:
+    try:
+        response = await client.get("/api/v3/simple/price", params={"ids": ",".join(coin_ids), "vs_currencies": "usd"})
+        response.raise_for_status()
+        data = response.json()
+        return {
+            coin_id: data[coin_id]['usd']
+            for coin_id in coin_ids
+            if isinstance(data.get(coin_id), dict) and 'usd' in data[coin_id]
+        }
+    except httpx.HTTPStatusError as e:
+        logger.warning("HTTP error fetching %d ids from CoinGecko: %s", len(coin_ids), e.response.status_code)
+        return {}
+    except (httpx.RequestError, ValueError, AttributeError) as e:
+        logger.warning("Failed to get prices for %d ids from CoinGecko: %s", len(coin_ids), e)
+        return {}
+
+
+async def get_prices_from_coingecko(coin_ids: Iterable[str]) -> Dict[str, float]:
+    """
+    Asynchronously fetches the latest prices for many cryptocurrencies from CoinGecko,
+    using one multi-id `simple/price` request per chunk of IDS_PER_REQUEST ids.
+    Returns a mapping of coin_id to USD price; ids without a price are left out.
+    """
+    unique_ids = sorted(set(coin_ids))
+    if not unique_ids:
+        return {}
+
+    chunks = [unique_ids[i:i + IDS_PER_REQUEST] for i in range(0, len(unique_ids), IDS_PER_REQUEST)]
+    prices: Dict[str, float] = {}
+    async with upstream_client("coingecko") as client:
+        for chunk_prices in await asyncio.gather(*(_get_price_chunk(client, chunk) for chunk in chunks)):
+            prices.update(chunk_prices)
+    return prices
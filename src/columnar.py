@@ -0,0 +1,163 @@
+"""
+Compact columnar storage of the coin list, loaded by memory-mapping the file.
+
+Instead of one JSON object per coin, every field is stored as one array: the string
+fields (`id`, `name`, `symbol`) as a UTF-8 byte blob plus an array of offsets, the
+tradability flags as a byte array, and the market data (`MARKET_FIELDS`) as float64
+arrays, with NaN for a coin without the field. Files written before the market data was
+kept have no market arrays. Opening the file maps it into memory without
+parsing it, and the pages are shared between every process that maps the same file
+(e.g. several uvicorn workers). Rows are materialised as dicts only when accessed.
+
+File layout:
+    8 bytes     magic, b"CTCOL1\\0\\0"
+    8 bytes     header length, little-endian uint64
+    header      JSON: count, timestamp_utc, and `{name: [dtype, offset, length]}` per array
+    arrays      each aligned on 64 bytes, offsets relative to the start of the file
+"""
+
+import json
+import math
+import mmap
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from src.dataset import atomic_write
+from src.dataset_diff import MARKET_FIELDS
+
+MAGIC = b"CTCOL1\0\0"
+ALIGNMENT = 64
+STRING_FIELDS = ("id", "name", "symbol")
+FLAG_FIELDS = ("is_tradable_on_binance_vs_usdc",)
+NUMERIC_FIELDS = tuple(MARKET_FIELDS)
+
+
+def _pad(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+def encode_columnar(coins: Sequence[Dict[str, Any]], timestamp_utc: Optional[str] = None) -> bytes:
+    """Serialises coin records to the columnar format."""
+    arrays: Dict[str, np.ndarray] = {}
+    for field in STRING_FIELDS:
+        encoded = [str(coin[field]).encode('utf-8') for coin in coins]
+        offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        arrays[f"{field}.offsets"] = offsets
+        arrays[f"{field}.data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    for field in FLAG_FIELDS:
+        arrays[field] = np.fromiter((bool(coin[field]) for coin in coins), dtype=np.uint8, count=len(coins))
+    for field in NUMERIC_FIELDS:
+        values = (coin.get(field) for coin in coins)
+        arrays[field] = np.fromiter((math.nan if value is None else value for value in values), dtype='<f8', count=len(coins))
+
+    # The header holds the array offsets, which depend on the header length: grow the
+    # reserved header size until the header fits in it.
+    header_length = 0
+    while True:
+        layout: Dict[str, List[Any]] = {}
+        position = len(MAGIC) + 8 + header_length
+        for name, array in arrays.items():
+            position += _pad(position)
+            layout[name] = [array.dtype.str, position, int(array.size)]
+            position += array.nbytes
+        header = json.dumps({"count": len(coins), "timestamp_utc": timestamp_utc, "arrays": layout}).encode()
+        if len(header) <= header_length:
+            header += b" " * (header_length - len(header))
+            break
+        header_length = len(header) + _pad(len(MAGIC) + 8 + len(header))
+
+    chunks = [MAGIC, struct.pack("<Q", len(header)), header]
+    size = sum(len(chunk) for chunk in chunks)
+    for name, array in arrays.items():
+        offset = layout[name][1]
+        chunks.append(b"\0" * (offset - size))
+        chunks.append(array.tobytes())
+        size = offset + array.nbytes
+    return b"".join(chunks)
+
+
+def write_columnar(path: str, coins: Sequence[Dict[str, Any]], timestamp_utc: Optional[str] = None):
+    """Writes coin records to a columnar file, atomically."""
+    with atomic_write(path, 'wb') as f:
+        f.write(encode_columnar(coins, timestamp_utc))
+
+
+class ColumnarCoins(Sequence):
+    """
+    Read-only sequence of coin dicts backed by a memory-mapped columnar file.
+    Each access builds a new dict, so callers must not rely on identity or mutate rows.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a columnar coin file")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(self._mmap[start:start + header_length]))
+        self.count: int = header['count']
+        self.timestamp_utc: Optional[str] = header['timestamp_utc']
+        self._arrays = {
+            name: np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=length, offset=offset)
+            for name, (dtype, offset, length) in header['arrays'].items()
+        }
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, field: str, index: int) -> str:
+        offsets = self._arrays[f"{field}.offsets"]
+        data = self._arrays[f"{field}.data"]
+        return data[offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+
+    def strings(self, field: str) -> List[str]:
+        """Decodes a whole string column at once (much faster than row by row)."""
+        offsets = self._arrays[f"{field}.offsets"].tolist()
+        blob = self._arrays[f"{field}.data"].tobytes()
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.count)]
+
+    def flags(self, field: str) -> np.ndarray:
+        return self._arrays[field].view(np.bool_)
+
+    def numbers(self, field: str) -> Optional[np.ndarray]:
+        """A numeric column, without any copy, or None when the file predates it."""
+        return self._arrays.get(field)
+
+    def _numeric_fields(self) -> List[str]:
+        return [field for field in NUMERIC_FIELDS if field in self._arrays]
+
+    def _row(self, index: int) -> Dict[str, Any]:
+        row: Dict[str, Any] = {field: self._string(field, index) for field in STRING_FIELDS}
+        for field in FLAG_FIELDS:
+            row[field] = bool(self._arrays[field][index])
+        for field in self._numeric_fields():
+            value = float(self._arrays[field][index])
+            if not math.isnan(value):
+                row[field] = MARKET_FIELDS[field](value)
+        return row
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self._row(index)
+
+    def __iter__(self) -> Iterable[Dict[str, Any]]:
+        columns = [self.strings(field) for field in STRING_FIELDS]
+        flags = [self._arrays[field].tolist() for field in FLAG_FIELDS]
+        numbers = [(field, MARKET_FIELDS[field], self._arrays[field].tolist()) for field in self._numeric_fields()]
+        for i in range(self.count):
+            row: Dict[str, Any] = {field: column[i] for field, column in zip(STRING_FIELDS, columns)}
+            for field, column in zip(FLAG_FIELDS, flags):
+                row[field] = bool(column[i])
+            for field, cast, column in numbers:
+                if not math.isnan(column[i]):
+                    row[field] = cast(column[i])
+            yield row
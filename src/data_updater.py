@@ -5,24 +5,79 @@ This module contains the logic for fetching cryptocurrency data from CoinGecko,
 checking its tradability on Binance, and saving it to a JSON file.
 """
 
+import asyncio
+import hashlib
 import json
+import logging
 import os
+import time
 from datetime import datetime, timezone
-from ratelimit import limits
-from pycoingecko import CoinGeckoAPI
-from binance.client import Client
+
+from src.dataset import columnar_path, file_id, write_json_atomic
+from src.dataset_diff import MARKET_FIELDS, apply_diff, compute_diff, is_empty, summarize
+from src.fetch_scheduler import TokenBucket, fetch_pages, get_with_retry
+from src.http_clients import build_client
+from src.metrics import updater_runs, updater_stage_duration
+from src.upstream_cache import replaying, upstream_cache
+
+logger = logging.getLogger(__name__)
+
+class ProgressState(dict):
+    """
+    A dict that calls its listeners with a snapshot after every change,
+    so progress can be pushed to clients instead of being polled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listeners = []
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        snapshot = dict(self)
+        for listener in self.listeners:
+            listener(snapshot)
 
 # Shared state for tracking progress of the update
-update_progress = {
+update_progress = ProgressState({
     "status": "idle",  # Can be: idle, running, complete, error
     "stage": "",       # e.g., "Fetching Binance symbols", "Fetching CoinGecko page"
     "current": 0,      # Current item being processed
     "total": 0,        # Total items to process
+    "pages_fetched": 0,  # CoinGecko pages fetched so far, including resumed ones
+    "pages_resumed": 0,  # CoinGecko pages reused from an interrupted refresh
     "error_message": None
-}
+})
+
+DATA_FILENAME = "top_3000_cryptos_tradability.json"
+# Directory of the data files (the project root by default), e.g. a scratch directory for benchmarks.
+DATA_DIR = os.environ.get('DATA_DIR') or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pairs assumed tradable when Binance cannot be reached (e.g., geo-blocking).
+MOCK_BINANCE_SYMBOLS = frozenset({
+    'BTCUSDC', 'ETHUSDC', 'BNBUSDC', 'SOLUSDC', 'XRPUSDC', 'ADAUSDC',
+    'AVAXUSDC', 'LINKUSDC', 'DOTUSDC', 'DOGEUSDC', 'MATICUSDC', 'LTCUSDC',
+    'WBTCUSDC', 'BCHUSDC', 'TRXUSDC', 'SHIBUSDC', 'UNIUSDC'
+})
+
+# Binance request weight: exchangeInfo costs 20, out of 6000 per minute and per IP.
+EXCHANGE_INFO_WEIGHT = 20
+BINANCE_WEIGHT_LIMIT = int(os.environ.get('BINANCE_WEIGHT_LIMIT', 6000))
+# Keep this share of the weight limit for the price endpoints.
+BINANCE_WEIGHT_RESERVE = 0.2
+
+# Last exchange info seen: ETag, hash of the payload, symbols, weight used and when.
+_exchange_info_cache = {}
+
+# Diff applied by the last incremental refresh.
+last_diff = None
 
 def get_binance_client():
     """Initialise and return the Binance API client."""
+    # python-binance (with aiohttp and dateparser) takes longer to import than the rest of the
+    # server; only a refresh needs it, so it is imported on the first one rather than at startup.
+    from binance.client import Client
+
     api_key = os.environ.get('BINANCE_API_KEY')
     api_secret = os.environ.get('BINANCE_API_SECRET')
     return Client(api_key, api_secret)
@@ -32,76 +87,188 @@ def get_binance_tradable_symbols(client):
     Fetch the set of all tradable symbols from Binance.
     In case of an error (e.g., geo-blocking), it returns a mocked set of common pairs.
     """
-    print("Fetching tradable pairs from Binance...")
+    logger.info("Fetching tradable pairs from Binance...")
     try:
         exchange_info = client.get_exchange_info()
         symbols = {s['symbol'] for s in exchange_info['symbols']}
-        print(f"Found {len(symbols)} tradable pairs on Binance.")
+        logger.info("Found %d tradable pairs on Binance.", len(symbols))
         return symbols
     except Exception as e:
-        print(f"Could not fetch symbols from Binance: {e}")
-        print("Falling back to a mocked list of tradable symbols for testing.")
-        mock_symbols = {
-            'BTCUSDC', 'ETHUSDC', 'BNBUSDC', 'SOLUSDC', 'XRPUSDC', 'ADAUSDC',
-            'AVAXUSDC', 'LINKUSDC', 'DOTUSDC', 'DOGEUSDC', 'MATICUSDC', 'LTCUSDC',
-            'WBTCUSDC', 'BCHUSDC', 'TRXUSDC', 'SHIBUSDC', 'UNIUSDC'
-        }
-        return mock_symbols
+        logger.warning("Could not fetch symbols from Binance: %s", e)
+        return fallback_binance_symbols()
+
+def recorded_binance_symbols():
+    """Symbols of the last exchangeInfo stored in the upstream response cache, or None."""
+    if upstream_cache is None:
+        return None
+    entry = upstream_cache.lookup("binance", "GET", "/api/v3/exchangeInfo")
+    body = None if entry is None else upstream_cache.servable_body(entry)
+    if body is None:
+        return None
+    try:
+        symbols = {s['symbol'] for s in json.loads(body)['symbols']}
+    except (ValueError, KeyError, TypeError):
+        return None
+    logger.warning("Using the exchange info recorded %.0f s ago (%d pairs).", upstream_cache.age(entry), len(symbols))
+    return symbols
+
+def fallback_binance_symbols():
+    """The symbols to use when Binance cannot be reached: the last recorded ones, else a mocked list."""
+    symbols = recorded_binance_symbols()
+    if symbols:
+        return symbols
+    logger.warning("Falling back to a mocked list of %d tradable symbols.", len(MOCK_BINANCE_SYMBOLS))
+    return set(MOCK_BINANCE_SYMBOLS)
+
+async def fetch_binance_symbols_conditionally(client=None):
+    """
+    Fetch the set of Binance symbols, downloading exchangeInfo only when it may have changed.
+    The last payload's ETag is sent as If-None-Match and its hash is compared, so an unchanged
+    payload is not parsed again; while the IP's request weight of the current minute is close
+    to the limit, the previous symbols are reused without any request.
+    """
+    cache = _exchange_info_cache
+    if cache.get('symbols') is not None and time.time() - cache.get('fetched_at', 0) < 60:
+        budget = BINANCE_WEIGHT_LIMIT * (1 - BINANCE_WEIGHT_RESERVE)
+        if cache.get('used_weight', 0) + EXCHANGE_INFO_WEIGHT > budget:
+            logger.info("Binance request weight at %d, reusing the previous exchange info.", cache['used_weight'])
+            return cache['symbols']
+
+    owns_client = client is None
+    if owns_client:
+        client = build_client("binance")
+    try:
+        headers = {'If-None-Match': cache['etag']} if cache.get('etag') else {}
+        logger.info("Fetching tradable pairs from Binance (conditional)...")
+        response = await client.get("/api/v3/exchangeInfo", headers=headers)
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    cache['fetched_at'] = time.time()
+    used_weight = response.headers.get('x-mbx-used-weight-1m')
+    if used_weight and used_weight.isdigit():
+        cache['used_weight'] = int(used_weight)
+    if response.status_code == 304 and cache.get('symbols') is not None:
+        logger.info("Binance exchange info not modified.")
+        return cache['symbols']
+    response.raise_for_status()
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    cache['etag'] = response.headers.get('etag')
+    if digest == cache.get('hash') and cache.get('symbols') is not None:
+        logger.info("Binance exchange info unchanged.")
+        return cache['symbols']
+    cache['hash'] = digest
+    cache['symbols'] = {s['symbol'] for s in response.json()['symbols']}
+    logger.info("Found %d tradable pairs on Binance.", len(cache['symbols']))
+    return cache['symbols']
 
 # CoinGecko's public API rate limit is around 10-30 calls per minute.
-# We'll set a conservative limit of 10 calls per minute.
-TEN_CALLS_PER_MINUTE = 10
-ONE_MINUTE = 60
+# We'll set a conservative default of 10 calls per minute, in bursts of up to 5.
+COINGECKO_CALLS_PER_MINUTE = float(os.environ.get('COINGECKO_CALLS_PER_MINUTE', 10))
+COINGECKO_BURST = float(os.environ.get('COINGECKO_BURST', 5))
+COINGECKO_CONCURRENCY = int(os.environ.get('COINGECKO_CONCURRENCY', 4))
+COINGECKO_MAX_RETRIES = int(os.environ.get('COINGECKO_MAX_RETRIES', 5))
+# 12 pages * 250 results per page = 3000
+COINGECKO_PAGES = int(os.environ.get('COINGECKO_PAGES', 12))
+COINGECKO_PER_PAGE = 250
+# Pages fetched by a failed refresh are reused by the next one if it starts within this delay.
+RESUME_MAX_AGE = 15 * 60
+
+# Pages fetched by the last unfinished refresh, by page number, and when it started.
+_resume_pages = {}
+_resume_started_at = 0.0
 
-@limits(calls=TEN_CALLS_PER_MINUTE, period=ONE_MINUTE)
-def get_coins_markets_with_rate_limit(cg_client, **kwargs):
+async def fetch_coingecko_pages(total_pages, done, client=None):
     """
-    A rate-limited wrapper for the PyCoinGecko get_coins_markets method.
+    Fetch `total_pages` pages of CoinGecko market data concurrently, within the rate limit.
+    Pages already in `done` are skipped and every fetched page is added to it.
     """
-    return cg_client.get_coins_markets(**kwargs)
+    bucket = TokenBucket(COINGECKO_CALLS_PER_MINUTE / 60, COINGECKO_BURST, name="coingecko")
+    max_retries = COINGECKO_MAX_RETRIES
+    if replaying():
+        # Pages are read from the recordings: no request reaches CoinGecko, so neither its
+        # rate limit applies nor is a page that was not recorded worth retrying.
+        bucket = TokenBucket(1e9, 1e9, name="coingecko")
+        max_retries = 0
+    owns_client = client is None
+    if owns_client:
+        client = build_client("coingecko")
+
+    async def fetch_page(page):
+        logger.info("Fetching page %d/%d of crypto data (coins %d-%d)...",
+                    page, total_pages, (page - 1) * COINGECKO_PER_PAGE + 1, page * COINGECKO_PER_PAGE)
+        response = await get_with_retry(
+            client, "/api/v3/coins/markets", bucket,
+            params={'vs_currency': 'usd', 'order': 'market_cap_desc', 'per_page': COINGECKO_PER_PAGE, 'page': page},
+            max_retries=max_retries,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def on_page(page, items):
+        update_progress['pages_fetched'] = len(done)
+        update_progress['current'] = len(done)
+        update_progress['stage'] = f"Fetching CoinGecko pages ({len(done)}/{total_pages})"
 
-def get_top_3000_crypto_data():
-    """Fetch market data for the top 3000 cryptocurrencies from CoinGecko."""
-    global update_progress
-    print("Initializing CoinGecko client...")
     try:
-        cg = CoinGeckoAPI()
-        all_coins = []
-        total_pages = 12
-        update_progress['total'] = total_pages
-
-        # 12 pages * 250 results per page = 3000
-        for i in range(1, total_pages + 1):
-            update_progress['stage'] = f"Fetching CoinGecko page {i}/{total_pages}"
-            update_progress['current'] = i
-            print(f"Fetching page {i}/{total_pages} of crypto data (coins {(i-1)*250+1}-{i*250})...")
-            coins_page = get_coins_markets_with_rate_limit(
-                cg, vs_currency='usd', order='market_cap_desc', per_page=250, page=i
-            )
-            if not coins_page:
-                print(f"No more data from CoinGecko on page {i}. Stopping.")
-                break
-            all_coins.extend(coins_page)
-
-        print(f"Total of {len(all_coins)} cryptocurrencies fetched from CoinGecko.")
+        return await fetch_pages(
+            fetch_page, range(1, total_pages + 1), concurrency=COINGECKO_CONCURRENCY, done=done, on_page=on_page,
+            key=lambda coin: coin['id'],
+        )
+    finally:
+        if owns_client:
+            await client.aclose()
+
+def get_top_3000_crypto_data(total_pages=None):
+    """
+    Fetch market data for the top cryptocurrencies from CoinGecko
+    (COINGECKO_PAGES pages of 250 coins, the top 3000 by default).
+    """
+    global update_progress, _resume_pages, _resume_started_at
+    total_pages = total_pages or COINGECKO_PAGES
+    if time.time() - _resume_started_at > RESUME_MAX_AGE:
+        _resume_pages = {}
+        _resume_started_at = time.time()
+    resumed = sum(1 for page in _resume_pages if page <= total_pages)
+    if resumed:
+        logger.info("Resuming the previous refresh: %d page(s) already fetched.", resumed)
+
+    update_progress['total'] = total_pages
+    update_progress['current'] = resumed
+    update_progress['pages_fetched'] = resumed
+    update_progress['pages_resumed'] = resumed
+    update_progress['stage'] = f"Fetching CoinGecko pages ({resumed}/{total_pages})"
+    try:
+        with updater_stage_duration.time("coingecko_pages"):
+            all_coins = asyncio.run(fetch_coingecko_pages(total_pages, _resume_pages))
+        _resume_pages = {}
+        _resume_started_at = 0.0
+        logger.info("Total of %d cryptocurrencies fetched from CoinGecko.", len(all_coins))
         return all_coins
     except Exception as e:
-        print(f"An error occurred while communicating with the CoinGecko API: {e}")
+        logger.error("An error occurred while communicating with the CoinGecko API: %s", e)
         update_progress['status'] = 'error'
         update_progress['error_message'] = str(e)
         return None
 
-def process_and_save_data(coins_data, binance_symbols, filename="top_3000_cryptos_tradability.json"):
-    """Process crypto data and save the result to a JSON file."""
-    global update_progress
-    if not coins_data:
-        print("No data from CoinGecko to process.")
-        return
+def data_file_path(filename=DATA_FILENAME):
+    """Absolute path of a data file in DATA_DIR (the project root by default)."""
+    return os.path.join(DATA_DIR, filename)
 
-    project_root = os.path.dirname(os.path.dirname(__file__))
-    output_path = os.path.join(project_root, filename)
+def load_saved_coins(filename=DATA_FILENAME):
+    """Return the coins of the saved dataset, or None if there is none."""
+    try:
+        with open(data_file_path(filename), 'r', encoding='utf-8') as f:
+            return json.load(f).get('coins', [])
+    except (IOError, ValueError):
+        return None
 
-    print("Processing data: checking tradability on Binance vs USDC...")
+def build_records(coins_data, binance_symbols):
+    """Turn CoinGecko market data into the dataset's coin records."""
+    global update_progress
+    logger.info("Processing data: checking tradability on Binance vs USDC...")
     processed_data = []
     total_coins = len(coins_data)
     update_progress['stage'] = "Processing and saving data"
@@ -109,7 +276,7 @@ def process_and_save_data(coins_data, binance_symbols, filename="top_3000_crypto
 
     for i, coin in enumerate(coins_data):
         update_progress['current'] = i + 1
-        symbol = coin.get('symbol', '').upper()
+        symbol = (coin.get('symbol') or '').upper()
         name = coin.get('name')
         coin_id = coin.get('id')
 
@@ -118,62 +285,142 @@ def process_and_save_data(coins_data, binance_symbols, filename="top_3000_crypto
 
         is_tradable = f"{symbol}USDC" in binance_symbols
         coin_details = {'id': coin_id, 'name': name, 'symbol': symbol, 'is_tradable_on_binance_vs_usdc': is_tradable}
+        # Market data is kept for the screener; fields CoinGecko has no value for are left out.
+        for field, cast in MARKET_FIELDS.items():
+            value = coin.get(field)
+            if value is not None:
+                try:
+                    coin_details[field] = cast(value)
+                except (TypeError, ValueError):
+                    pass
         processed_data.append(coin_details)
+    return processed_data
+
+def save_coins(processed_data, filename=DATA_FILENAME):
+    """
+    Save coin records to the JSON data file, and to its columnar copy
+    (same name with a .cols extension) which the server memory-maps.
+    """
+    global update_progress
+    from src.columnar import write_columnar  # Needs numpy.
 
+    output_path = data_file_path(filename)
+    timestamp_utc = datetime.now(timezone.utc).isoformat()
     data_to_save = {
-        'timestamp_utc': datetime.now(timezone.utc).isoformat(),
+        'timestamp_utc': timestamp_utc,
         'count': len(processed_data),
         'coins': processed_data
     }
 
-    print(f"Saving data to '{output_path}'...")
+    logger.info("Saving data to '%s'...", output_path)
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-        print(f"Data has been successfully saved to '{output_path}'.")
+        # Written to temp files and renamed, so the server never reads a partially written file.
+        with updater_stage_duration.time("save"):
+            write_json_atomic(output_path, data_to_save, ensure_ascii=False, indent=4)
+            write_columnar(columnar_path(output_path), processed_data, timestamp_utc)
+        logger.info("Data has been successfully saved to '%s'.", output_path)
     except IOError as e:
-        print(f"Error writing to file '{output_path}': {e}")
+        logger.error("Error writing to file '%s': %s", output_path, e)
         update_progress['status'] = 'error'
         update_progress['error_message'] = str(e)
 
-def run_update():
-    """Main function to orchestrate the data update process."""
+def process_and_save_data(coins_data, binance_symbols, filename=DATA_FILENAME):
+    """Process crypto data and save the result to a JSON file."""
+    if not coins_data:
+        logger.warning("No data from CoinGecko to process.")
+        return
+    with updater_stage_duration.time("build_records"):
+        records = build_records(coins_data, binance_symbols)
+    save_coins(records, filename)
+
+def apply_incremental_update(coins_data, binance_symbols, filename=DATA_FILENAME):
+    """
+    Diff freshly fetched data against the saved dataset and save the result only if something changed.
+    Returns the diff, or None when there was no previous dataset to diff against
+    (the data is then saved in full). The diff's "base" lists the file ids of the saved
+    dataset it was computed against (the JSON file and its columnar copy), so that the
+    server only applies it to that version.
+    """
+    global update_progress, last_diff
+    if not coins_data:
+        logger.warning("No data from CoinGecko to process.")
+        return None
+
+    with updater_stage_duration.time("build_records"):
+        new_coins = build_records(coins_data, binance_symbols)
+    output_path = data_file_path(filename)
+    base = [file_id(output_path), file_id(columnar_path(output_path))]
+    old_coins = load_saved_coins(filename)
+    if old_coins is None:
+        logger.info("No previous dataset to diff against, saving the full dataset.")
+        save_coins(new_coins, filename)
+        return None
+
+    with updater_stage_duration.time("diff"):
+        diff = compute_diff(old_coins, new_coins)
+    summary = summarize(diff)
+    logger.info("Dataset diff: %d added, %d removed, %d changed, reordered: %s, market data updated: %s.",
+                summary['added'], summary['removed'], summary['changed'], summary['reordered'],
+                summary['market_updated'], extra=summary)
+    if is_empty(diff) and diff['market'] is None:
+        logger.info("The dataset is unchanged, nothing to save.")
+    else:
+        save_coins(apply_diff(old_coins, diff), filename)
+    diff['timestamp_utc'] = datetime.now(timezone.utc).isoformat()
+    diff['base'] = [list(base_id) for base_id in base if base_id is not None]
+    last_diff = diff
+    return diff
+
+def run_update(mode="full", on_diff=None):
+    """
+    Main function to orchestrate the data update process.
+    In "incremental" mode, Binance's exchange info is only downloaded when it may have changed,
+    and only the differences with the saved dataset are applied; `on_diff` is then called with the diff.
+    """
     global update_progress
     update_progress['status'] = 'running'
     update_progress['error_message'] = None
     update_progress['current'] = 0
     update_progress['total'] = 0
+    update_progress['pages_fetched'] = 0
+    update_progress['pages_resumed'] = 0
 
     binance_symbols = set()
     try:
         update_progress['stage'] = "Fetching Binance symbols"
-        print("Initializing Binance client...")
-        binance_client = get_binance_client()
-        binance_symbols = get_binance_tradable_symbols(binance_client)
-        print("Binance symbol fetch complete.")
+        with updater_stage_duration.time("binance_symbols"):
+            if mode == "incremental" or upstream_cache is not None:
+                # With the upstream cache, exchangeInfo goes through httpx to be recorded or replayed.
+                binance_symbols = asyncio.run(fetch_binance_symbols_conditionally())
+            else:
+                logger.info("Initializing Binance client...")
+                binance_client = get_binance_client()
+                binance_symbols = get_binance_tradable_symbols(binance_client)
+        logger.info("Binance symbol fetch complete.")
     except Exception as e:
-        print(f"\nA Binance-related error occurred: {e}")
-        print("Continuing with a mocked list of Binance symbols.")
-        binance_symbols = {
-            'BTCUSDC', 'ETHUSDC', 'BNBUSDC', 'SOLUSDC', 'XRPUSDC', 'ADAUSDC',
-            'AVAXUSDC', 'LINKUSDC', 'DOTUSDC', 'DOGEUSDC', 'MATICUSDC', 'LTCUSDC',
-            'WBTCUSDC', 'BCHUSDC', 'TRXUSDC', 'SHIBUSDC', 'UNIUSDC'
-        }
+        logger.warning("A Binance-related error occurred: %s", e)
+        binance_symbols = fallback_binance_symbols()
 
     try:
         top_3000_data = get_top_3000_crypto_data()
         if top_3000_data:
-            process_and_save_data(top_3000_data, binance_symbols)
+            if mode == "incremental":
+                diff = apply_incremental_update(top_3000_data, binance_symbols)
+                if diff is not None and on_diff is not None and update_progress['status'] != 'error':
+                    on_diff(diff)
+            else:
+                process_and_save_data(top_3000_data, binance_symbols)
             if update_progress['status'] != 'error':
                 update_progress['status'] = 'complete'
                 update_progress['stage'] = 'Done'
         else:
-            print("Script finished early as no data could be fetched from CoinGecko.")
+            logger.warning("Script finished early as no data could be fetched from CoinGecko.")
             if update_progress['status'] != 'error':
                  update_progress['status'] = 'complete'
                  update_progress['stage'] = 'No data fetched'
 
     except Exception as e:
-        print(f"\nAn unexpected critical error occurred: {e}")
+        logger.exception("An unexpected critical error occurred: %s", e)
         update_progress['status'] = 'error'
-        update_progress['error_message'] = str(e)
\ No newline at end of file
+        update_progress['error_message'] = str(e)
+    updater_runs.inc(mode, update_progress['status'])
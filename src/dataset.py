@@ -0,0 +1,342 @@
+"""
+Versioned, immutable in-memory datasets of the coin list, and their hot reload.
+
+A `Dataset` holds the coins of one version of the data file together with everything
+derived from them (lookup by id, search indexes), and is never modified once built.
+`DatasetStore` keeps a reference to the current one: a new version is built in a
+worker thread, while requests keep being served from the old one, and is then
+published with a single reference assignment. Requests that fetched the dataset once
+see a consistent version for their whole duration.
+
+The data file (JSON, or the memory-mapped columnar format of `src/columnar.py`) is
+written atomically (temp file + `os.replace`, see `atomic_write`), and the store reloads
+it whenever its inode, mtime or size changes.
+
+Configuration through environment variables:
+    DATASET_WATCH_INTERVAL    seconds between two checks of the data file (default 2)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import struct
+from collections.abc import Mapping
+from contextlib import contextmanager
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.dataset_diff import apply_diff
+from src.fast_json import EncodedBody
+from src.metrics import dataset_load_duration
+from src.search_index import FuzzyIndex, PrefixIndex
+
+if TYPE_CHECKING:
+    from src.screener import MarketTable
+
+logger = logging.getLogger(__name__)
+
+WATCH_INTERVAL = float(os.environ.get("DATASET_WATCH_INTERVAL", 2))
+COLUMNAR_SUFFIX = ".cols"
+
+FileId = Tuple[int, int, int]
+
+
+class DatasetError(Exception):
+    """The data file is missing (`kind="missing"`), unreadable (`"corrupt"`) or has no coins (`"empty"`)."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+def columnar_path(path: str) -> str:
+    """Path of the columnar copy of a JSON data file."""
+    return os.path.splitext(path)[0] + COLUMNAR_SUFFIX
+
+
+def file_id(path: str) -> Optional[FileId]:
+    """Identifies a version of a file by inode, mtime and size; None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', **open_kwargs):
+    """
+    Opens a temp file next to `path` for writing, and renames it over `path` once the
+    block completes, so readers see either the previous file or the complete new one,
+    never a partial write.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, **open_kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs):
+    """Writes `data` as JSON to `path`, atomically."""
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_kwargs)
+
+
+def read_dataset_file(path: str) -> Tuple[Sequence[Dict[str, Any]], Optional[str], Optional[FileId]]:
+    """
+    Returns `(coins, timestamp_utc, file_id)` of a data file: a JSON file, or a columnar
+    file (`.cols`, see `src/columnar.py`) which is memory-mapped rather than parsed.
+    """
+    if path.endswith(COLUMNAR_SUFFIX):
+        return _read_columnar_file(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            # Identify the file through the open descriptor, in case it is replaced meanwhile.
+            stat = os.fstat(f.fileno())
+            data = json.load(f)
+    except FileNotFoundError:
+        raise DatasetError("missing", f"{path} not found")
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise DatasetError("corrupt", str(e))
+    coins = data.get('coins', [])
+    if not coins:
+        raise DatasetError("empty", f"{path} has no coins")
+    return coins, data.get('timestamp_utc'), (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _read_columnar_file(path: str):
+    from src.columnar import ColumnarCoins  # Needs numpy, only imported for columnar files.
+
+    try:
+        source = file_id(path)
+        coins = ColumnarCoins(path)
+    except FileNotFoundError:
+        raise DatasetError("missing", f"{path} not found")
+    except (ValueError, KeyError, struct.error) as e:
+        raise DatasetError("corrupt", str(e))
+    if not len(coins):
+        raise DatasetError("empty", f"{path} has no coins")
+    return coins, coins.timestamp_utc, source
+
+
+class CoinLookup(Mapping):
+    """
+    Coins by key (CoinGecko id, symbol), storing positions rather than the records
+    themselves. When several coins share a key, the first one (best ranked) wins.
+    """
+
+    def __init__(self, coins: Sequence[Dict[str, Any]], ids: Iterable[str]):
+        self._coins = coins
+        ids = list(ids)
+        self._positions = dict(zip(reversed(ids), range(len(ids) - 1, -1, -1)))
+
+    def __getitem__(self, coin_id: str) -> Dict[str, Any]:
+        return self._coins[self._positions[coin_id]]
+
+    def __contains__(self, coin_id) -> bool:
+        return coin_id in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class Dataset:
+    """
+    One version of the coin list and its derived indexes.
+    The derived structures are built on first use; `warm` builds them all up front,
+    which the store does in a worker thread before publishing a new version.
+    """
+
+    def __init__(
+        self,
+        coins: Sequence[Dict[str, Any]],
+        version: int = 1,
+        timestamp_utc: Optional[str] = None,
+        source: Optional[FileId] = None,
+    ):
+        self.coins = coins
+        self.version = version
+        self.timestamp_utc = timestamp_utc
+        self.source = source
+        self.loaded_at = time.time()
+
+    def _column(self, field: str) -> List[Any]:
+        if hasattr(self.coins, 'strings'):
+            return self.coins.strings(field)
+        return [coin[field] for coin in self.coins]
+
+    @cached_property
+    def coins_by_id(self) -> CoinLookup:
+        return CoinLookup(self.coins, self._column('id'))
+
+    @cached_property
+    def coins_by_symbol(self) -> CoinLookup:
+        """Coins by lower-case symbol, e.g. to price lending positions which only name their tokens."""
+        return CoinLookup(self.coins, [symbol.lower() for symbol in self._column('symbol')])
+
+    @cached_property
+    def search_index(self) -> PrefixIndex:
+        return PrefixIndex(self.coins)
+
+    @cached_property
+    def fuzzy_index(self) -> FuzzyIndex:
+        return FuzzyIndex(self.coins)
+
+    @cached_property
+    def tradable_pairs(self) -> List[str]:
+        return [f"{coin['symbol'].upper()}USDC" for coin in self.coins if coin['is_tradable_on_binance_vs_usdc']]
+
+    @cached_property
+    def encoded_coins(self) -> EncodedBody:
+        """The full coin list, JSON-encoded and compressed once for this version."""
+        return EncodedBody(list(self.coins))
+
+    @cached_property
+    def market_table(self) -> "MarketTable":
+        from src.screener import MarketTable  # Needs numpy, and imports this module.
+
+        return MarketTable(self.coins)
+
+    def warm(self) -> "Dataset":
+        self.coins_by_id, self.coins_by_symbol, self.search_index, self.fuzzy_index, self.tradable_pairs, self.encoded_coins
+        self.market_table
+        return self
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "count": len(self.coins),
+            "timestamp_utc": self.timestamp_utc,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class DatasetStore:
+    """Holds the current Dataset of a data file and swaps in new versions as they are built."""
+
+    def __init__(self, path: str, watch_interval: float = WATCH_INTERVAL):
+        self.path = path
+        self.watch_interval = watch_interval
+        self.current: Optional[Dataset] = None
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._version = 0
+        self._build_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _build_from_file(self, warm: bool = True) -> Dataset:
+        with dataset_load_duration.time("file"):
+            coins, timestamp_utc, source = read_dataset_file(self.path)
+            dataset = Dataset(coins, self._next_version(), timestamp_utc, source)
+            return dataset.warm() if warm else dataset
+
+    def get(self) -> Dataset:
+        """
+        Returns the current dataset. Only the very first call, before anything was loaded,
+        reads the file synchronously (its indexes are then built on first use); it raises
+        DatasetError if that fails.
+        """
+        dataset = self.current
+        if dataset is None:
+            dataset = self.current = self._build_from_file(warm=False)
+        return dataset
+
+    async def reload_if_changed(self) -> bool:
+        """Builds and swaps in a new dataset if the data file changed. Returns True if it did."""
+        async with self._build_lock:
+            current = self.current
+            source = file_id(self.path)
+            if source is None or (current is not None and current.source == source):
+                return False
+            try:
+                dataset = await asyncio.to_thread(self._build_from_file)
+            except DatasetError as e:
+                # Keep serving the current version; a complete file will trigger a new attempt.
+                self.last_error = str(e)
+                return False
+            self.current = dataset
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    async def apply_diff(self, diff: Dict[str, Any]) -> bool:
+        """
+        Builds the next version from the current one and a refresh diff, without reading the
+        data file (which the refresh already saved). The diff only applies to the version it
+        was computed against (its "base" file ids): from any other version, the saved file is
+        reloaded instead. Returns False if nothing was loaded yet or the saved file was
+        already reloaded.
+        """
+        async with self._build_lock:
+            current = self.current
+            source = file_id(self.path)
+            if current is None or current.source == source:
+                return False
+            base = {tuple(base_id) for base_id in diff.get('base') or ()}
+            if current.source in base:
+
+                def build():
+                    with dataset_load_duration.time("diff"):
+                        coins = apply_diff(current.coins, diff)
+                        return Dataset(coins, self._next_version(), diff.get('timestamp_utc'), source).warm()
+
+                self.current = await asyncio.to_thread(build)
+                self.reloads += 1
+                return True
+        logger.warning("The diff was computed against another version of the dataset: reloading the data file.")
+        return await self.reload_if_changed()
+
+    async def watch(self):
+        while True:
+            try:
+                await self.reload_if_changed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Error while reloading the dataset: %s", e)
+            await asyncio.sleep(self.watch_interval)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.watch())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        current = self.current
+        return {
+            "loaded": current is not None,
+            **(current.info() if current is not None else {}),
+            "watching": self._task is not None and not self._task.done(),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
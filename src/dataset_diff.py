@@ -0,0 +1,113 @@
+"""
+Diffs between two versions of the coin list, so that a refresh can ship and apply only
+what changed (new and delisted coins, renamed coins, tradability flips, new ranking)
+instead of replacing the whole dataset.
+
+A diff is a JSON-serialisable dict:
+    added     coins that are new, as full records
+    removed   ids of the coins that are gone
+    changed   `{"id", "changes": {field: [old, new]}}` for coins whose fields changed
+    order     the full list of ids in market-cap order, or None if the order is unchanged
+    market    the market data (`MARKET_FIELDS`) of every coin, one list per field in the
+              order of the new list, or None if no value changed
+
+Market data moves on every refresh, so it is left out of `changed` (and of `is_empty`):
+otherwise nearly every coin would be listed as changed. It is shipped as one column
+snapshot instead, which `apply_diff` writes back into the records.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+# Market data kept from CoinGecko's `coins/markets` in every coin record, with the type of each field
+# (a coin without a value has no such key). Served by /api/screener, see `src/screener.py`.
+MARKET_FIELDS = {
+    "current_price": float,
+    "market_cap": float,
+    "market_cap_rank": int,
+    "total_volume": float,
+    "price_change_percentage_24h": float,
+}
+
+
+def compute_diff(old_coins: Sequence[Dict[str, Any]], new_coins: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    old_by_id = {coin['id']: coin for coin in old_coins}
+    new_by_id = {coin['id']: coin for coin in new_coins}
+
+    added = [coin for coin in new_coins if coin['id'] not in old_by_id]
+    removed = [coin['id'] for coin in old_coins if coin['id'] not in new_by_id]
+    changed = []
+    for coin in new_coins:
+        old = old_by_id.get(coin['id'])
+        if old is None or old == coin:
+            continue
+        changes = {
+            field: [old.get(field), coin.get(field)]
+            for field in old.keys() | coin.keys()
+            if field not in MARKET_FIELDS and old.get(field) != coin.get(field)
+        }
+        if changes:
+            changed.append({"id": coin['id'], "changes": changes})
+
+    old_order = [coin['id'] for coin in old_coins]
+    new_order = [coin['id'] for coin in new_coins]
+    market_changed = any(
+        old_by_id.get(coin['id'], {}).get(field) != coin.get(field)
+        for coin in new_coins for field in MARKET_FIELDS
+    )
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "order": new_order if new_order != old_order else None,
+        "market": {field: [coin.get(field) for coin in new_coins] for field in MARKET_FIELDS} if market_changed else None,
+    }
+
+
+def is_empty(diff: Dict[str, Any]) -> bool:
+    """True if the coin list itself is unchanged (market data may still have moved, see `diff['market']`)."""
+    return not (diff['added'] or diff['removed'] or diff['changed'] or diff['order'])
+
+
+def summarize(diff: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts of a diff, for logs and progress messages."""
+    return {
+        "added": len(diff['added']),
+        "removed": len(diff['removed']),
+        "changed": len(diff['changed']),
+        "reordered": diff['order'] is not None,
+        "market_updated": diff.get('market') is not None,
+    }
+
+
+def apply_diff(coins: Sequence[Dict[str, Any]], diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Returns the coin list `diff` was computed to, from the list it was computed from.
+    Records of unchanged coins are reused as is.
+    """
+    removed = set(diff['removed'])
+    by_id: Dict[str, Dict[str, Any]] = {coin['id']: coin for coin in coins if coin['id'] not in removed}
+    for change in diff['changed']:
+        coin = dict(by_id[change['id']])
+        for field, (_, new_value) in change['changes'].items():
+            if new_value is None:
+                coin.pop(field, None)
+            else:
+                coin[field] = new_value
+        by_id[change['id']] = coin
+    for coin in diff['added']:
+        by_id[coin['id']] = coin
+
+    order: Optional[List[str]] = diff['order']
+    if order is None:
+        order = [coin['id'] for coin in coins if coin['id'] not in removed]
+    result = [by_id[coin_id] for coin_id in order]
+
+    market = diff.get('market')
+    if market:
+        for position, coin in enumerate(result):
+            values = {field: column[position] for field, column in market.items()}
+            if any(coin.get(field) != value for field, value in values.items()):
+                coin = {key: value for key, value in coin.items() if key not in values}
+                coin.update((field, value) for field, value in values.items() if value is not None)
+                result[position] = coin
+    return result
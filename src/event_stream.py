@@ -0,0 +1,154 @@
+"""
+In-process publish/subscribe used by the server-push (Server-Sent Events) endpoints.
+
+Each subscriber gets a bounded queue. Published events are state snapshots (refresh
+progress, latest price of a coin), so when a slow consumer's queue is full the oldest
+pending event is dropped to make room for the newest one: a lagging client skips
+intermediate states instead of making the server buffer without limit. A subscriber
+that loses more than `max_drops` events without ever catching up (emptying its queue) is
+disconnected.
+
+Threads publish through `publish_threadsafe`; with `min_interval`, a topic is published at
+most that often, each publication carrying the latest event, so a thread changing a state
+thousands of times (the refresh progress) does not schedule thousands of callbacks.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+
+class Subscription:
+    """A subscriber's bounded queue of `(topic, event)` pairs."""
+
+    def __init__(self, broadcaster: "Broadcaster", topics: Iterable[str], maxsize: int, max_drops: int):
+        self.broadcaster = broadcaster
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.max_drops = max_drops
+        self.dropped = 0            # Events lost since the queue was last emptied.
+        self.dropped_total = 0
+        self.closed = False
+
+    def offer(self, topic: str, event: Any):
+        if self.closed:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.dropped_total += 1
+            if self.dropped > self.max_drops:
+                self.close()
+                return
+        self.queue.put_nowait((topic, event))
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Any]]:
+        """Returns the next `(topic, event)`, or None on timeout or once the subscription is closed."""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            item = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.queue.empty():
+            # Caught up: only losses without catching up again count towards `max_drops`.
+            self.dropped = 0
+        return item
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+    """Fans every published event out to the subscribers of its topic."""
+
+    def __init__(self, queue_size: int = 32, max_drops: int = 1000):
+        self.queue_size = queue_size
+        self.max_drops = max_drops
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._latest: Dict[str, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Throttled topics: the event waiting to be published, and when each was last published.
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Any] = {}
+        self._published_at: Dict[str, float] = {}
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Binds the broadcaster to the server's event loop, for `publish_threadsafe`."""
+        self._loop = loop
+        with self._lock:
+            # Events left waiting by a previous loop would never be published.
+            self._pending.clear()
+
+    def subscribe(self, topics: Iterable[str], replay_latest: bool = True) -> Subscription:
+        """Subscribes to `topics`; the last event of each topic is queued right away when `replay_latest`."""
+        subscription = Subscription(self, topics, self.queue_size, self.max_drops)
+        for topic in subscription.topics:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            if replay_latest and topic in self._latest:
+                subscription.offer(topic, self._latest[topic])
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic: str, event: Any):
+        """Publishes an event. Must be called from the event loop thread."""
+        self._latest[topic] = event
+        for subscription in list(self._subscribers.get(topic, ())):
+            subscription.offer(topic, event)
+
+    def publish_threadsafe(self, topic: str, event: Any, min_interval: float = 0.0):
+        """
+        Publishes an event from another thread (e.g. the data updater). With `min_interval`,
+        the topic is published at most every `min_interval` seconds: an event arriving sooner
+        replaces the one waiting, so the latest event is always published, only later.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        if min_interval <= 0:
+            self._loop.call_soon_threadsafe(self.publish, topic, event)
+            return
+        with self._lock:
+            waiting = topic in self._pending
+            self._pending[topic] = event
+            if waiting:
+                return
+            delay = max(self._published_at.get(topic, 0.0) + min_interval - time.monotonic(), 0.0)
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, self._publish_pending, topic)
+
+    def _publish_pending(self, topic: str):
+        with self._lock:
+            event = self._pending.pop(topic, None)
+            if event is None:
+                return
+            self._published_at[topic] = time.monotonic()
+        self.publish(topic, event)
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = {s for subscribers in self._subscribers.values() for s in subscribers}
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": len(subscriptions),
+            "dropped_events": sum(s.dropped_total for s in subscriptions),
+        }
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+broadcaster = Broadcaster()
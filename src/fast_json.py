@@ -0,0 +1,93 @@
+"""
+Fast JSON responses: orjson encoding, bodies pre-encoded and pre-compressed once per
+dataset version, and conditional requests (`ETag` / `If-None-Match` -> 304).
+
+orjson and brotli are optional: without orjson, the standard `json` module is used;
+without brotli, bodies are only pre-compressed with gzip.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Encodes `obj` to compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with `dumps`, without FastAPI's response model validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class EncodedBody:
+    """A JSON body encoded once, with its ETag and compressed variants."""
+
+    def __init__(self, content: Any):
+        self.identity = dumps(content)
+        self.etag = make_etag(self.identity)
+        self.gzip = gzip.compress(self.identity, compresslevel=9, mtime=0)
+        self.br = brotli.compress(self.identity) if brotli is not None else None
+
+    def variant(self, accept_encoding: str):
+        """Returns `(body, content_encoding)` for the client's Accept-Encoding."""
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.identity, None
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header matches `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def json_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encodes `content` and answers 304 if the client already has this exact body."""
+    body = dumps(content)
+    etag = make_etag(body)
+    headers = {**(headers or {}), "ETag": etag}
+    if if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def encoded_response(request: Request, encoded: EncodedBody, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serves a pre-encoded body, compressed as the client accepts, or 304 if unchanged."""
+    headers = {**(headers or {}), "ETag": encoded.etag, "Vary": "Accept-Encoding"}
+    if if_none_match(request, encoded.etag):
+        return Response(status_code=304, headers=headers)
+    body, content_encoding = encoded.variant(request.headers.get("accept-encoding", ""))
+    if content_encoding is not None:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
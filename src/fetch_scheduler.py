@@ -0,0 +1,190 @@
+"""
+Rate-limited, concurrent fetching of paginated upstream data (the CoinGecko market pages).
+
+- `TokenBucket` paces requests: `acquire()` waits for a token instead of failing when
+  the limit is reached, and allows short bursts up to the bucket's capacity.
+- `get_with_retry` retries 429s, 5xx responses and transport errors with jittered
+  exponential backoff, and waits for `Retry-After` when the upstream sends one.
+- `fetch_pages` fetches many pages with bounded concurrency, skipping pages that were
+  already fetched (so an interrupted refresh resumes where it stopped) and stopping
+  at the first empty page.
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+import httpx
+
+from src.metrics import rate_limited_responses, rate_limiter_wait
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, and bursts of up to `capacity`.
+    The time each acquisition waited is recorded in the rate limiter metrics, under `name`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic, name: str = ""):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        # The lock makes waiters take tokens in arrival order.
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= 1
+        self.waited += waited
+        rate_limiter_wait.observe(waited, self.name)
+
+    def penalize(self, seconds: float):
+        """Empties the bucket for `seconds`, e.g. after the upstream answered 429."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parses a `Retry-After` header given either in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Full-jitter exponential backoff for the given (zero-based) retry attempt."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+async def get_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    bucket: TokenBucket,
+    params: Optional[Dict[str, Any]] = None,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> httpx.Response:
+    """
+    GETs `url` once a token is available, retrying retryable failures.
+    Returns the last response (or raises the last transport error) once retries are exhausted.
+    """
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            response = await client.get(url, params=params)
+        except httpx.TransportError:
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+        else:
+            if response.status_code == 429:
+                rate_limited_responses.inc(bucket.name)
+            if response.status_code not in RETRYABLE_STATUSES or attempt >= max_retries:
+                return response
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                delay = min(retry_after, max_delay)
+                if response.status_code == 429:
+                    # Every concurrent worker shares the limit, so the whole bucket holds
+                    # off, and the next `acquire` does the waiting.
+                    bucket.penalize(delay)
+                    delay = 0
+            else:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def fetch_pages(
+    fetch_page: Callable[[int], Awaitable[List[Any]]],
+    pages: Iterable[int],
+    concurrency: int = 4,
+    done: Optional[Dict[int, List[Any]]] = None,
+    on_page: Optional[Callable[[int, List[Any]], None]] = None,
+    key: Optional[Callable[[Any], Hashable]] = None,
+) -> List[Any]:
+    """
+    Fetches `pages` with at most `concurrency` requests in flight and returns their items
+    concatenated in page order, up to the first empty page.
+    Pages already present in `done` are not fetched again; every fetched page is added
+    to it (and reported to `on_page`) as soon as it arrives, so a failed run can be
+    resumed by passing the same dict again. The first error is raised once the
+    in-flight pages have finished.
+    With `key`, an item whose key was already seen in an earlier page is left out: a resumed
+    page was fetched earlier than the others, and an item that moved between pages
+    meanwhile would otherwise appear twice.
+    """
+    done = {} if done is None else done
+    pages = sorted(set(pages))
+    pending = [page for page in pages if page not in done]
+    queue: asyncio.Queue = asyncio.Queue()
+    for page in pending:
+        queue.put_nowait(page)
+    last_page: List[Optional[int]] = [min((p for p in pages if p in done and not done[p]), default=None)]
+    errors: List[BaseException] = []
+
+    async def worker():
+        while not queue.empty() and not errors:
+            page = queue.get_nowait()
+            if last_page[0] is not None and page > last_page[0]:
+                continue
+            try:
+                items = await fetch_page(page)
+            except Exception as e:
+                errors.append(e)
+                return
+            done[page] = items
+            if not items and (last_page[0] is None or page < last_page[0]):
+                last_page[0] = page
+            if on_page is not None:
+                on_page(page, items)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(pending) or 1)))))
+    if errors:
+        raise errors[0]
+
+    results: List[Any] = []
+    seen: Set[Hashable] = set()
+    for page in pages:
+        items = done.get(page)
+        if not items:
+            break
+        if key is None:
+            results.extend(items)
+            continue
+        for item in items:
+            item_key = key(item)
+            if item_key not in seen:
+                seen.add(item_key)
+                results.append(item)
+    return results
@@ -0,0 +1,268 @@
+"""
+Shared, app-lifetime HTTP clients for the upstream APIs (Binance, CoinGecko, Jupiter Lend).
+
+Opening a new httpx.AsyncClient per request means a new TCP+TLS handshake on
+every call. Instead, one pooled client is kept per upstream host for the whole
+lifetime of the FastAPI application, so connections are kept alive and reused.
+The clients are created in the application lifespan (see `start_upstream_clients`)
+and every call site obtains one through `upstream_client(name)`.
+
+Pool sizing, keep-alive and timeouts are configured through environment variables:
+    UPSTREAM_MAX_CONNECTIONS   maximum open connections per host (default 100)
+    UPSTREAM_MAX_KEEPALIVE     maximum idle keep-alive connections per host (default 20)
+    UPSTREAM_KEEPALIVE_EXPIRY  seconds an idle connection is kept open (default 30)
+    UPSTREAM_HTTP2             "1" to negotiate HTTP/2 when the `h2` package is installed (default 1)
+    <NAME>_API_URL             base URL of an upstream, e.g. BINANCE_API_URL (useful for local stubs)
+    <NAME>_TIMEOUT             request timeout in seconds for an upstream, e.g. COINGECKO_TIMEOUT
+
+With UPSTREAM_CACHE_MODE set, every client also goes through the on-disk cache of upstream
+responses (see `src/upstream_cache.py`).
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from src.metrics import status_class, upstream_request_duration, upstream_requests
+from src.upstream_cache import CachingTransport, upstream_cache
+from src.upstream_health import CircuitOpenError, is_failure, upstream_health
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    """Connection settings for a single upstream host."""
+    name: str
+    base_url: str
+    timeout: float
+
+
+def _upstream(name: str, default_url: str, default_timeout: float) -> UpstreamConfig:
+    prefix = name.upper()
+    return UpstreamConfig(
+        name=name,
+        base_url=os.environ.get(f"{prefix}_API_URL", default_url).rstrip("/"),
+        timeout=_env_float(f"{prefix}_TIMEOUT", default_timeout),
+    )
+
+
+UPSTREAMS: Dict[str, UpstreamConfig] = {
+    "binance": _upstream("binance", "https://api.binance.com", 10),
+    # CoinGecko has a rate limit, so a slightly longer timeout is reasonable.
+    "coingecko": _upstream("coingecko", "https://api.coingecko.com", 15),
+    "jupiter": _upstream("jupiter", "https://lite-api.jup.ag", 5),
+}
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("UPSTREAM_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("UPSTREAM_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def _http2_enabled() -> bool:
+    if os.environ.get("UPSTREAM_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401  (optional dependency, needed by httpx for HTTP/2)
+    except ImportError:
+        return False
+    return True
+
+
+class PoolStats:
+    """Counters describing how well a connection pool is being reused."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, started: float, marks: Dict[str, float]):
+        self.requests += 1
+        if "connection.connect_tcp.started" in marks:
+            self.new_connections += 1
+        # The wait is the time spent before the request got a connection, either
+        # a freshly opened one or an idle one taken from the pool.
+        if not marks:
+            return
+        wait = max(min(marks.values()) - started, 0.0)
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> Dict[str, Any]:
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+            "avg_wait_ms": round(self.total_wait / self.requests * 1000, 3) if self.requests else None,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    An AsyncHTTPTransport that records pool statistics for every request,
+    using httpcore's `trace` extension to see whether a new connection was opened.
+    For a named upstream, it also goes through the upstream's circuit breaker, applies its
+    adaptive timeout and records the outcome in its health (see `src/upstream_health.py`).
+    """
+
+    _ACQUIRE_EVENTS = (
+        "connection.connect_tcp.started",
+        "http11.send_request_headers.started",
+        "http2.send_request_headers.started",
+    )
+
+    def __init__(self, upstream: str = "", **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+        self.stats = PoolStats()
+        self.health = upstream_health(upstream) if upstream else None
+
+    def _apply_health(self, request: httpx.Request):
+        if not self.health.allow():
+            upstream_requests.inc(self.upstream, "rejected")
+            raise CircuitOpenError(f"Circuit breaker open for {self.upstream}", request=request)
+        timeouts = request.extensions.get("timeout")
+        if timeouts and timeouts.get("read") is not None:
+            timeout = self.health.timeout(timeouts["read"])
+            request.extensions = {
+                **request.extensions,
+                "timeout": {key: min(value, timeout) if key != "pool" and value is not None else value
+                            for key, value in timeouts.items()},
+            }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        health = self.health
+        if health is not None:
+            self._apply_health(request)
+        started = time.perf_counter()
+        marks: Dict[str, float] = {}
+        parent_trace = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            if event_name in self._ACQUIRE_EVENTS and event_name not in marks:
+                marks[event_name] = time.perf_counter()
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        status = "error"
+        try:
+            response = await super().handle_async_request(request)
+            status = status_class(response.status_code)
+            if health is not None:
+                if is_failure(response.status_code):
+                    health.record_failure(f"HTTP {response.status_code}")
+                else:
+                    health.record_success(time.perf_counter() - started)
+            return response
+        except httpx.TransportError as e:
+            if health is not None:
+                timed_out_after = time.perf_counter() - started if isinstance(e, httpx.TimeoutException) else None
+                health.record_failure(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__, timed_out_after)
+            raise
+        except asyncio.CancelledError:
+            if health is not None:
+                health.release_probe()
+            raise
+        finally:
+            self.stats.record(started, marks)
+            # Until the response headers: the body is read by the caller.
+            upstream_request_duration.observe(time.perf_counter() - started, self.upstream)
+            upstream_requests.inc(self.upstream, status)
+
+    def connection_counts(self) -> Dict[str, int]:
+        pool = getattr(self, "_pool", None)
+        connections = [c for c in getattr(pool, "connections", []) if not c.is_closed()]
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, InstrumentedTransport] = {}
+
+
+def build_client(name: str, transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Create a new pooled client for the given upstream. The caller owns (and must close) it."""
+    config = UPSTREAMS[name]
+    if transport is None:
+        transport = InstrumentedTransport(name, limits=_pool_limits(), http2=_http2_enabled())
+    return httpx.AsyncClient(base_url=config.base_url, timeout=config.timeout, transport=_cached(name, transport))
+
+
+def _cached(name: str, transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Wraps a transport in the upstream response cache, when it is enabled."""
+    return CachingTransport(transport, name, upstream_cache) if upstream_cache is not None else transport
+
+
+async def start_upstream_clients():
+    """Create one shared client per upstream host. Called from the FastAPI lifespan."""
+    for name in UPSTREAMS:
+        if name in _clients:
+            continue
+        transport = InstrumentedTransport(name, limits=_pool_limits(), http2=_http2_enabled())
+        _transports[name] = transport
+        _clients[name] = build_client(name, transport=transport)
+
+
+async def close_upstream_clients():
+    """Close every shared client, releasing their pooled connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    _transports.clear()
+    for client in clients:
+        await client.aclose()
+
+
+@asynccontextmanager
+async def upstream_client(name: str) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Yield the shared client for an upstream.
+    Outside of the application lifespan (scripts, unit tests), a short-lived
+    client is created for the duration of the call instead.
+    """
+    client = _clients.get(name)
+    if client is not None:
+        yield client
+        return
+
+    config = UPSTREAMS[name]
+    transport = _cached(name, httpx.AsyncHTTPTransport()) if upstream_cache is not None else None
+    async with httpx.AsyncClient(base_url=config.base_url, timeout=config.timeout, transport=transport) as client:
+        yield client
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Return connection pool statistics for every shared upstream client."""
+    stats = {}
+    for name, transport in _transports.items():
+        stats[name] = {
+            "base_url": UPSTREAMS[name].base_url,
+            **transport.connection_counts(),
+            **transport.stats.as_dict(),
+        }
+    return stats
@@ -0,0 +1,116 @@
+"""
+Client for Jupiter Lend positions (`lite-api.jup.ag`), with caching and batch fetching.
+
+Positions are cached per wallet for `JUPITER_POSITIONS_TTL` seconds, and concurrent
+requests for the same wallet share a single upstream call, so many open tabs polling
+the same wallet cost one request per TTL. `get_lend_positions_batch` fetches many
+wallets with bounded concurrency and reports failures per wallet.
+
+Configuration through environment variables:
+    JUPITER_API_URL              base URL of the API (a local stub in tests, see `tests/stubs.py`)
+    JUPITER_POSITIONS_TTL        seconds positions stay fresh (default 30)
+    JUPITER_BATCH_CONCURRENCY    maximum concurrent upstream calls of a batch (default 8)
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, List
+
+import httpx
+
+from src.http_clients import upstream_client
+from src.price_cache import AsyncTTLCache, CacheResult
+
+POSITIONS_TTL = float(os.environ.get("JUPITER_POSITIONS_TTL", 30))
+BATCH_CONCURRENCY = int(os.environ.get("JUPITER_BATCH_CONCURRENCY", 8))
+
+DEMO_WALLET = "DEMO"
+
+# Demo positions returned for the "DEMO" wallet, without any upstream call.
+DEMO_POSITIONS = [
+    {
+        "collateral": "SOL",
+        "collateralAmount": 10.0,
+        "collateralValue": 1500.50,
+        "borrowed": "USDC",
+        "borrowAmount": 750.25,
+        "borrowValue": 750.25,
+        "ratio": 50.00,
+        "healthFactor": 1.7,
+        "riskLevel": "safe"
+    },
+    {
+        "collateral": "JitoSOL",
+        "collateralAmount": 14.0,
+        "collateralValue": 2500.00,
+        "borrowed": "USDT",
+        "borrowAmount": 1800.0,
+        "borrowValue": 1800.00,
+        "ratio": 72.00,
+        "healthFactor": 1.2,
+        "riskLevel": "risky"
+    }
+]
+
+
+class JupiterLendError(Exception):
+    """A failed positions lookup, with the HTTP status the API should answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+positions_cache = AsyncTTLCache(ttls={"jupiter": POSITIONS_TTL}, max_entries=10000)
+
+
+async def fetch_lend_positions(wallet_address: str) -> List[Dict[str, Any]]:
+    """Fetches a wallet's positions from the API. Raises JupiterLendError on failure."""
+    async with upstream_client("jupiter") as client:
+        try:
+            response = await client.get(f"/lend/v1/positions/{wallet_address}")
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPStatusError as e:
+            raise JupiterLendError(e.response.status_code, f"Erreur de l'API Jupiter Lend: {e.response.text}")
+        except httpx.RequestError as e:
+            raise JupiterLendError(503, f"Impossible de contacter l'API Jupiter Lend: {e}")
+        except json.JSONDecodeError:
+            raise JupiterLendError(500, "Réponse invalide de l'API Jupiter Lend (format JSON attendu).")
+    # The API may return an empty object {} when the wallet has no position.
+    if not data or not isinstance(data, list):
+        return []
+    return data
+
+
+async def get_lend_positions(wallet_address: str) -> CacheResult:
+    """Returns a wallet's positions from the cache, or from a (shared) upstream call."""
+    if wallet_address.upper() == DEMO_WALLET:
+        return CacheResult(DEMO_POSITIONS, False, 0.0)
+    return await positions_cache.get_or_fetch("jupiter", wallet_address, lambda: fetch_lend_positions(wallet_address))
+
+
+async def get_lend_positions_batch(wallet_addresses: Iterable[str], concurrency: int = BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Returns one result per distinct wallet, in request order: its positions, or the error
+    that prevented fetching them. At most `concurrency` upstream calls run at once.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(wallet_address: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await get_lend_positions(wallet_address)
+            except JupiterLendError as e:
+                return {"wallet": wallet_address, "positions": None, "error": {"status_code": e.status_code, "detail": e.detail}}
+        return {
+            "wallet": wallet_address,
+            "positions": result.value,
+            "cached": result.cached,
+            "age_seconds": round(result.age, 3),
+            "error": None,
+        }
+
+    return await asyncio.gather(*(fetch(wallet_address) for wallet_address in dict.fromkeys(wallet_addresses)))
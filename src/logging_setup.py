@@ -0,0 +1,55 @@
+"""
+Logging of the `src.*` modules: level-gated, as text or as one JSON object per line.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments, so a message
+below the configured level is dropped before being formatted. Fields passed with
+`extra={...}` are kept as separate keys by the JSON format.
+
+Configuration through environment variables:
+    LOG_LEVEL     minimum level of the application logs (default INFO)
+    LOG_FORMAT    "text" (default) or "json"
+"""
+
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+
+# Attributes every LogRecord has; anything else on a record came from `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object, with its `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> logging.Logger:
+    """Configures the `src` logger once (uvicorn's loggers and the root logger are left alone)."""
+    logger = logging.getLogger("src")
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        if fmt == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
@@ -1,17 +1,45 @@
+import time
+
+# Début de l'import de l'application, pour le rapport de démarrage de /readyz.
+IMPORT_STARTED = time.perf_counter()
+
+import math
 import os
 import sys
 import asyncio
-import json
-from functools import lru_cache
-from fastapi import FastAPI, HTTPException, Query
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 
+import logging
 import threading
-import httpx
+from src.alerts import INITIAL_WALLETS, RECENT_ALERTS, AlertScheduler, alert_topic
 from src.binance_client import get_price_from_binance
+from src.binance_stream import STREAM_ENABLED, BinanceTickerStream, price_book
 from src.coingecko_client import get_price_from_coingecko
+from src import data_updater
 from src.data_updater import run_update, update_progress
+from src.columnar import write_columnar
+from src.dataset import Dataset, DatasetError, DatasetStore, columnar_path, read_dataset_file
+from src.dataset_diff import summarize
+from src.event_stream import Subscription, broadcaster, format_sse
+from src.fast_json import FastJSONResponse, encoded_response, json_response
+from src.http_clients import UPSTREAMS, close_upstream_clients, get_pool_stats, start_upstream_clients
+from src.jupiter_client import JupiterLendError, get_lend_positions, get_lend_positions_batch, positions_cache
+from src.logging_setup import configure_logging
+from src.metrics import MetricsMiddleware, price_fallbacks, price_hedges, registry
+from src.price_cache import price_cache
+from src.price_feed import PriceFeed, price_topic
+from src.price_history import price_history
+from src.prices import resolve_prices
+from src.risk_engine import PositionBook, resolve_symbol_prices
+from src.screener import ScreenerError, parse_filter
+from src.upstream_cache import replaying, upstream_cache
+from src.upstream_health import HEDGING_ENABLED, all_upstream_health, hedged, upstream_health
+from src.shared_state import PROCESS_ID, REFRESH_LOCK, PROGRESS_KEY, SharedStateSync, progress_writer, shared_state
 
 # On Windows, the default asyncio event loop (ProactorEventLoop) can cause
 # ConnectionResetError. This is a known issue with libraries like aiohttp/uvicorn.
@@ -20,7 +48,69 @@ from src.data_updater import run_update, update_progress
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-app = FastAPI()
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Charge le jeu de données et ses index au démarrage, avant d'être prêt ("0" : à la première requête).
+STARTUP_WARM = os.environ.get("STARTUP_WARM", "1") == "1"
+
+# Durées de l'import et des étapes du démarrage, servies par /readyz.
+startup_report: Dict[str, Any] = {"started": False, "import_seconds": None, "startup_seconds": None, "phases": {}}
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_report["phases"][name] = round(time.perf_counter() - started, 4)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Cycle de vie de l'application : ouvre les clients HTTP partagés vers les
+    API amont au démarrage et les ferme proprement à l'arrêt.
+    Avec STARTUP_WARM (par défaut), le jeu de données, ses index et la liste encodée sont
+    construits avant de servir la première requête ; chaque étape est chronométrée dans
+    `startup_report` (voir /readyz).
+    """
+    with startup_phase("upstream_clients"):
+        await start_upstream_clients()
+        broadcaster.attach(asyncio.get_running_loop())
+    with startup_phase("data_file"):
+        await startup_event()
+    if STARTUP_WARM:
+        with startup_phase("dataset"):
+            await dataset_store.reload_if_changed()
+    dataset_store.start()
+    with startup_phase("price_history"):
+        await price_history.load()
+    price_history.start()
+    if shared_sync is None:
+        alert_scheduler.start()
+    else:
+        # En mode multi-workers, seul le worker élu exécute le planificateur d'alertes.
+        shared_sync.start()
+    if STREAM_ENABLED and not replaying():
+        # En mode replay, les prix viennent uniquement des réponses enregistrées.
+        ticker_stream.start()
+    startup_report["startup_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 4)
+    startup_report["started"] = True
+    logger.info("Démarrage terminé en %.2f s (import : %.2f s).", startup_report["startup_seconds"], startup_report["import_seconds"])
+    try:
+        yield
+    finally:
+        startup_report["started"] = False
+        await price_feed.stop()
+        if shared_sync is not None:
+            await shared_sync.stop()
+        await alert_scheduler.stop()
+        await ticker_stream.stop()
+        await dataset_store.stop()
+        await price_history.stop()
+        await close_upstream_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuration CORS
 origins = [
@@ -37,95 +127,499 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@lru_cache(maxsize=1)
-def load_crypto_data() -> List[Dict[str, Any]]:
+# Ajouté en dernier, donc exécuté en premier : mesure la latence de chaque requête, CORS compris.
+app.add_middleware(MetricsMiddleware)
+
+# Diffuse chaque changement de progression du rafraîchissement aux clients abonnés.
+# Au plus 4 publications par seconde : la progression change à chaque crypto traitée.
+update_progress.listeners.append(lambda snapshot: broadcaster.publish_threadsafe("refresh-status", snapshot, min_interval=0.25))
+# En mode multi-workers, la progression est aussi partagée avec les autres workers.
+if shared_state is not None:
+    update_progress.listeners.append(progress_writer(shared_state))
+
+# Interrogation partagée des prix pour les clients abonnés au flux de prix.
+price_feed = PriceFeed(broadcaster)
+
+# Intervalle (en secondes) entre deux commentaires keep-alive sur un flux SSE inactif.
+SSE_KEEPALIVE_SECONDS = 15
+# Nombre maximal de cryptomonnaies suivies par un même flux de prix.
+MAX_STREAMED_COINS = 100
+# Nombre de résultats renvoyés par défaut pour une recherche, et maximum autorisé pour 'limit'.
+DEFAULT_SEARCH_LIMIT = 50
+MAX_PAIRS_LIMIT = 5000
+# Nombre de résultats renvoyés par défaut par le screener, et maximum autorisé pour 'limit'.
+DEFAULT_SCREENER_LIMIT = 50
+MAX_SCREENER_LIMIT = 1000
+
+# Format du fichier servi : "columnar" (copie colonnaire projetée en mémoire, partagée entre
+# les workers) ou "json" (fichier d'origine, analysé entièrement à chaque chargement).
+DATASET_FORMAT = os.environ.get("DATASET_FORMAT", "columnar")
+
+# Jeu de données courant, rechargé en arrière-plan dès que le fichier change.
+if DATASET_FORMAT == "json":
+    dataset_store = DatasetStore(data_updater.data_file_path())
+else:
+    dataset_store = DatasetStore(columnar_path(data_updater.data_file_path()))
+
+def current_dataset() -> Dataset:
     """
-    Charge les données des cryptomonnaies depuis le fichier JSON.
-    La mise en cache avec lru_cache évite de lire le fichier à chaque appel.
+    Retourne la version courante du jeu de données (cryptomonnaies et index).
+    Une nouvelle version est construite en arrière-plan puis publiée d'un coup : les requêtes
+    continuent d'utiliser l'ancienne version en attendant, sans jamais lire un fichier à moitié écrit.
     """
     try:
-        # Build an absolute path to the JSON file, relative to this script's location.
-        # This makes the data loading independent of the current working directory.
-        script_dir = os.path.dirname(__file__)  # The directory this script is in (src/)
-        project_root = os.path.dirname(script_dir) # The parent directory (project root)
-        json_path = os.path.join(project_root, 'top_3000_cryptos_tradability.json')
+        return dataset_store.get()
+    except DatasetError as e:
+        if e.kind == "missing":
+            raise HTTPException(status_code=500, detail="Le fichier de données 'top_3000_cryptos_tradability.json' est introuvable.")
+        if e.kind == "empty":
+            raise HTTPException(status_code=404, detail="Aucune cryptomonnaie trouvée dans le fichier de données.")
+        raise HTTPException(status_code=500, detail="Erreur de décodage du fichier JSON. Le fichier est peut-être corrompu.")
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+def load_crypto_data() -> List[Dict[str, Any]]:
+    """
+    Retourne les cryptomonnaies de la version courante du jeu de données.
+    """
+    return current_dataset().coins
 
-        coins = data.get('coins', [])
-        if not coins:
-            raise HTTPException(status_code=404, detail="Aucune cryptomonnaie trouvée dans le fichier de données.")
-        return coins
+def load_coins_by_id() -> Dict[str, Dict[str, Any]]:
+    """
+    Index des cryptomonnaies par identifiant CoinGecko.
+    """
+    return current_dataset().coins_by_id
 
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Le fichier de données 'top_3000_cryptos_tradability.json' est introuvable.")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Erreur de décodage du fichier JSON. Le fichier est peut-être corrompu.")
+def tradable_binance_pairs() -> List[str]:
+    """
+    Retourne les paires Binance (ex: 'BTCUSDC') des cryptomonnaies échangeables contre l'USDC.
+    """
+    return current_dataset().tradable_pairs
 
-@app.get("/api/pairs", response_model=List[Dict[str, Any]])
-async def read_pairs(search: Optional[str] = Query(None, min_length=1)):
+def coins_by_symbol() -> Dict[str, Dict[str, Any]]:
+    """
+    Index des cryptomonnaies par symbole (en minuscules), pour valoriser les positions d'emprunt.
+    Sans liste des cryptos, l'index est vide : les positions gardent les valeurs rapportées par Jupiter Lend.
+    """
+    try:
+        return dataset_store.get().coins_by_symbol
+    except DatasetError:
+        return {}
+
+# Alertes de risque de liquidation des portefeuilles enregistrés, évaluées en arrière-plan.
+# En mode multi-workers, les portefeuilles et les alertes émises sont partagés entre les workers.
+alert_scheduler = AlertScheduler(
+    broadcaster, coins_by_symbol,
+    on_alert=(lambda event: shared_state.submit(shared_state.add_alert, event, RECENT_ALERTS)) if shared_state is not None else None,
+)
+alert_scheduler.watch(INITIAL_WALLETS)
+if shared_state is not None:
+    shared_state.add_wallets(INITIAL_WALLETS)
+
+async def on_leadership(is_leader: bool):
+    if is_leader:
+        alert_scheduler.start()
+    else:
+        await alert_scheduler.stop()
+
+# En mode multi-workers : relais de la progression écrite par les autres workers, et élection du worker
+# qui exécute les tâches de fond uniques.
+shared_sync = None
+if shared_state is not None:
+    shared_sync = SharedStateSync(
+        shared_state, lambda progress: broadcaster.publish("refresh-status", progress), on_leadership,
+        on_wallets=alert_scheduler.sync_wallets, on_alert=alert_scheduler.relay)
+
+# Flux websocket des prix Binance, démarré avec l'application si BINANCE_STREAM_ENABLED=1.
+ticker_stream = BinanceTickerStream(price_book, tradable_binance_pairs)
+
+@app.get("/api/pairs", response_class=FastJSONResponse)
+async def read_pairs(
+    request: Request,
+    search: Optional[str] = Query(None, min_length=1),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAIRS_LIMIT),
+    offset: int = Query(0, ge=0),
+    mode: str = Query("prefix", pattern="^(prefix|fuzzy)$"),
+):
     """
     Retourne une liste de cryptomonnaies depuis le fichier JSON.
-    Si un paramètre 'search' est fourni, filtre les cryptos dont le nom ou le symbole commence par la recherche.
+    Si un paramètre 'search' est fourni, filtre les cryptos dont le nom ou le symbole commence par la recherche,
+    en utilisant l'index de préfixes : correspondance exacte du symbole d'abord, puis par capitalisation.
+    Les résultats d'une recherche sont limités à DEFAULT_SEARCH_LIMIT sauf si 'limit' est précisé.
+    Le nombre total de résultats est indiqué dans l'en-tête X-Total-Count.
+    Avec mode=fuzzy, la recherche tolère les fautes de frappe et retourne les résultats les plus proches
+    d'abord ('limit' s'applique, 'offset' est ignoré).
+    La liste complète est encodée et compressée une seule fois par version du jeu de données ; toutes les
+    réponses portent un ETag, et une requête If-None-Match correspondante reçoit une réponse 304 sans corps.
     """
-    all_coins = load_crypto_data()
+    dataset = current_dataset()
+    all_coins = dataset.coins
+    headers = {"X-Dataset-Version": str(dataset.version)}
 
     if not search:
-        return all_coins
-
-    search_lower = search.lower()
-    filtered_coins = [
-        coin for coin in all_coins
-        if coin['name'].lower().startswith(search_lower) or coin['symbol'].lower().startswith(search_lower)
-    ]
-
-    return filtered_coins
+        headers["X-Total-Count"] = str(len(all_coins))
+        if limit is None and offset == 0:
+            return encoded_response(request, dataset.encoded_coins, headers)
+        end = None if limit is None else offset + limit
+        return json_response(request, all_coins[offset:end], headers)
+
+    if mode == "fuzzy":
+        matches = dataset.fuzzy_index.search(search, limit=limit or DEFAULT_SEARCH_LIMIT)
+        headers["X-Total-Count"] = str(len(matches))
+        return json_response(request, matches, headers)
+
+    matches, total = dataset.search_index.search(search, limit=limit or DEFAULT_SEARCH_LIMIT, offset=offset)
+    headers["X-Total-Count"] = str(total)
+    return json_response(request, matches, headers)
+
+@app.get("/api/screener", response_class=FastJSONResponse)
+async def screen_market(
+    request: Request,
+    filters: List[str] = Query([], alias="filter"),
+    tradable: Optional[bool] = Query(None),
+    sort: Optional[str] = Query(None, min_length=1),
+    limit: int = Query(DEFAULT_SCREENER_LIMIT, ge=1, le=MAX_SCREENER_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Filtre et trie les cryptomonnaies selon leurs données de marché (prix, capitalisation, rang,
+    volume, variation sur 24h), par exemple `?tradable=true&filter=total_volume>=1e6&sort=-price_change_percentage_24h`.
+    Chaque paramètre 'filter' est de la forme champ<op>valeur (op parmi > >= < <= == !=) ; une crypto
+    sans valeur pour un champ filtré est exclue. 'sort' trie par un champ, décroissant avec le préfixe '-'
+    (les valeurs manquantes en dernier) ; sans 'sort', l'ordre est celui de la capitalisation.
+    Les filtres et le tri sont évalués sur des colonnes NumPy de tout l'univers (voir src/screener.py).
+    Le nombre total de résultats est indiqué dans l'en-tête X-Total-Count.
+    """
+    descending = bool(sort) and sort.startswith("-")
+    try:
+        parsed = [parse_filter(expression) for expression in filters]
+        dataset = current_dataset()
+        matches, total = dataset.market_table.screen(
+            parsed, tradable=tradable, sort=sort.lstrip("-") if sort else None,
+            descending=descending, limit=limit, offset=offset,
+        )
+    except ScreenerError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre du screener invalide : {e}")
+    headers = {"X-Dataset-Version": str(dataset.version), "X-Total-Count": str(total)}
+    return json_response(request, matches, headers)
 
-@app.on_event("startup")
 async def startup_event():
     """
     Vérifie l'existence du fichier de données au démarrage.
     S'il n'existe pas, lance une mise à jour initiale en arrière-plan.
     """
-    script_dir = os.path.dirname(__file__)
-    project_root = os.path.dirname(script_dir)
-    json_path = os.path.join(project_root, 'top_3000_cryptos_tradability.json')
+    json_path = data_updater.data_file_path()
 
     if not os.path.exists(json_path):
-        print("Le fichier de données n'existe pas. Lancement de la mise à jour initiale en arrière-plan.")
-        thread = threading.Thread(target=run_update)
-        thread.start()
+        # En mode multi-workers, un seul worker obtient le verrou et lance la mise à jour initiale.
+        if await start_refresh():
+            logger.info("Le fichier de données n'existe pas. Lancement de la mise à jour initiale en arrière-plan.")
+    elif DATASET_FORMAT != "json" and not os.path.exists(dataset_store.path):
+        # Fichier de données écrit par une version antérieure : on crée sa copie colonnaire.
+        logger.info("Création de la copie colonnaire du fichier de données...")
+        try:
+            coins, timestamp_utc, _ = read_dataset_file(json_path)
+            await asyncio.to_thread(write_columnar, dataset_store.path, coins, timestamp_utc)
+        except DatasetError as e:
+            logger.error("Impossible de créer la copie colonnaire : %s", e)
+
+async def apply_dataset_diff(diff: Dict[str, Any]):
+    """
+    Construit la nouvelle version du jeu de données à partir du diff d'un rafraîchissement incrémental,
+    sans relire le fichier, puis la publie.
+    """
+    if await dataset_store.apply_diff(diff):
+        logger.info("Diff du jeu de données appliqué en mémoire : %s", summarize(diff))
+
+def diff_applied(future, loop: asyncio.AbstractEventLoop):
+    """
+    Appelée à la fin de l'application d'un diff : en cas d'erreur, la journalise et recharge
+    le fichier de données complet, qui contient déjà le résultat du rafraîchissement.
+    """
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error("Erreur lors de l'application du diff du jeu de données : %s", future.exception())
+    asyncio.run_coroutine_threadsafe(dataset_store.reload_if_changed(), loop)
 
 @app.post("/api/refresh-data")
-async def refresh_data():
+async def refresh_data(mode: str = Query("full", pattern="^(full|incremental)$")):
     """
     Déclenche le processus de mise à jour du fichier de données JSON en arrière-plan.
+    Avec mode=incremental, seules les différences avec le jeu de données actuel sont enregistrées,
+    puis appliquées en mémoire à la fin du rafraîchissement (voir /api/dataset/diff).
     """
-    if update_progress['status'] == 'running':
-        raise HTTPException(status_code=409, detail="Un rafraîchissement est déjà en cours.")
-
     try:
-        print("Début de la mise à jour des données en arrière-plan via l'API...")
+        if mode == "incremental":
+            loop = asyncio.get_running_loop()
 
-        # Lancer `run_update` dans un thread séparé
-        thread = threading.Thread(target=run_update)
-        thread.start()
+            def on_diff(diff):
+                future = asyncio.run_coroutine_threadsafe(apply_dataset_diff(diff), loop)
+                future.add_done_callback(lambda future: diff_applied(future, loop))
 
-        # Vider le cache pour que les prochaines requêtes attendent potentiellement les nouvelles données
-        load_crypto_data.cache_clear()
-
-        return {"message": "Le rafraîchissement des données a été lancé en arrière-plan."}
+            started = await start_refresh(mode=mode, on_diff=on_diff)
+            message = "Le rafraîchissement incrémental des données a été lancé en arrière-plan."
+        else:
+            # Le fichier est remplacé atomiquement à la fin, et la nouvelle version est chargée
+            # en arrière-plan par `dataset_store`.
+            started = await start_refresh()
+            message = "Le rafraîchissement des données a été lancé en arrière-plan."
     except Exception as e:
-        print(f"Erreur lors du lancement du rafraîchissement des données : {e}")
+        logger.error("Erreur lors du lancement du rafraîchissement des données : %s", e)
         raise HTTPException(status_code=500, detail="Une erreur interne est survenue lors du lancement du rafraîchissement.")
 
+    if not started:
+        raise HTTPException(status_code=409, detail="Un rafraîchissement est déjà en cours.")
+    logger.info("Début de la mise à jour des données en arrière-plan via l'API (mode %s)...", mode)
+    return {"message": message}
+
+async def start_refresh(**kwargs) -> bool:
+    """
+    Lance `run_update` dans un thread séparé, sauf si un rafraîchissement est déjà en cours : dans ce
+    processus ou, en mode multi-workers, dans un autre worker (verrou partagé, libéré à la fin du
+    rafraîchissement ou à l'expiration de son bail si le worker s'arrête). Retourne False dans ce cas.
+    """
+    if update_progress['status'] == 'running':
+        return False
+    if shared_state is not None:
+        if not await shared_state.offload(shared_state.acquire, REFRESH_LOCK):
+            return False
+        # Une autre requête de ce processus a pu lancer un rafraîchissement pendant l'attente
+        # (le verrou, détenu par ce processus, est alors le sien).
+        if update_progress['status'] == 'running':
+            return False
+
+    # Marquer le rafraîchissement comme lancé avant le démarrage du thread, pour que les
+    # abonnés au flux de statut ne reçoivent pas l'état terminé du rafraîchissement précédent.
+    update_progress['status'] = 'running'
+
+    def target():
+        if shared_state is None:
+            run_update(**kwargs)
+            return
+        with shared_state.held(REFRESH_LOCK):
+            run_update(**kwargs)
+
+    threading.Thread(target=target).start()
+    return True
+
+async def refresh_progress() -> Dict[str, Any]:
+    """
+    Progression du rafraîchissement : celle de ce processus ou, en mode multi-workers, la dernière
+    progression partagée (le rafraîchissement a pu être lancé par un autre worker).
+    """
+    if shared_state is not None:
+        found = await shared_state.offload(shared_state.get_value, PROGRESS_KEY)
+        if found is not None:
+            return found[2]
+    return dict(update_progress)
+
+@app.get("/api/dataset")
+async def get_dataset_status():
+    """
+    Retourne la version du jeu de données servie actuellement et l'état de son rechargement.
+    """
+    return dataset_store.status()
+
+@app.get("/api/dataset/diff")
+async def get_dataset_diff():
+    """
+    Retourne le diff (cryptos ajoutées, supprimées, modifiées et nouvel ordre) du dernier rafraîchissement incrémental.
+    Les données de marché, qui changent à chaque rafraîchissement, n'y figurent pas : seul
+    'market_updated' indique si elles ont été mises à jour (voir /api/screener et /api/pairs).
+    """
+    diff = data_updater.last_diff
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Aucun rafraîchissement incrémental n'a encore été effectué.")
+    return {**{key: value for key, value in diff.items() if key not in ("market", "base")}, "market_updated": diff.get("market") is not None}
+
 @app.get("/api/refresh-status")
 async def get_refresh_status():
     """
     Retourne le statut actuel du processus de rafraîchissement des données.
     """
-    return update_progress
+    return await refresh_progress()
+
+@app.get("/api/shared-state")
+async def get_shared_state_status():
+    """
+    Retourne l'état partagé entre les workers en mode multi-workers (détenteurs du verrou de
+    rafraîchissement et du bail de leader), ou seulement l'identifiant du processus s'il est seul.
+    """
+    if shared_state is None:
+        return {"enabled": False, "owner": PROCESS_ID}
+    return {"enabled": True, "is_leader": shared_sync.is_leader, **await shared_state.offload(shared_state.status)}
+
+def sse_response(request: Request, subscription: Subscription, initial_events=(), on_close=None) -> StreamingResponse:
+    """
+    Construit une réponse Server-Sent Events qui relaie les événements d'un abonnement
+    jusqu'à la déconnexion du client. Le nom de l'événement est le préfixe du sujet
+    (ex: 'price' pour 'price:bitcoin').
+    """
+    async def events():
+        try:
+            for event, data in initial_events:
+                yield format_sse(event, data)
+            while not subscription.closed:
+                item = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if await request.is_disconnected():
+                    break
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                topic, data = item
+                yield format_sse(topic.split(":", 1)[0], data)
+        finally:
+            subscription.close()
+            if on_close is not None:
+                on_close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/stream/refresh-status")
+async def stream_refresh_status(request: Request):
+    """
+    Flux Server-Sent Events du statut de rafraîchissement : envoie l'état courant,
+    puis chaque changement de `update_progress` dès qu'il se produit.
+    """
+    subscription = broadcaster.subscribe(["refresh-status"], replay_latest=False)
+    return sse_response(request, subscription, initial_events=[("refresh-status", await refresh_progress())])
+
+@app.get("/api/stream/prices")
+async def stream_prices(request: Request, coin_ids: str = Query(..., min_length=1)):
+    """
+    Flux Server-Sent Events des prix des cryptomonnaies demandées (identifiants CoinGecko
+    séparés par des virgules). Un seul appel amont par intervalle est partagé entre
+    tous les abonnés d'une même crypto ; seuls les changements de prix sont envoyés.
+    """
+    requested = list(dict.fromkeys(coin_id.strip() for coin_id in coin_ids.split(",") if coin_id.strip()))
+    if len(requested) > MAX_STREAMED_COINS:
+        raise HTTPException(status_code=400, detail=f"Trop de cryptomonnaies demandées (maximum {MAX_STREAMED_COINS}).")
+
+    coins_by_id = load_coins_by_id()
+    unknown = [coin_id for coin_id in requested if coin_id not in coins_by_id]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Cryptomonnaies inconnues : {', '.join(unknown)}")
+
+    subscription = broadcaster.subscribe([price_topic(coin_id) for coin_id in requested])
+    price_feed.watch([
+        {
+            "symbol": coins_by_id[coin_id]['symbol'],
+            "coin_id": coin_id,
+            "is_tradable": coins_by_id[coin_id]['is_tradable_on_binance_vs_usdc'],
+        }
+        for coin_id in requested
+    ])
+    return sse_response(request, subscription, on_close=lambda: price_feed.unwatch(requested))
+
+@app.get("/api/stream/alerts")
+async def stream_alerts(request: Request, wallets: Optional[str] = Query(None)):
+    """
+    Flux Server-Sent Events des alertes de risque de liquidation : chaque changement de niveau
+    (safe, risky, critical) d'une position des portefeuilles enregistrés. Sans 'wallets'
+    (adresses séparées par des virgules), les alertes de tous les portefeuilles sont envoyées.
+    """
+    requested = [wallet.strip() for wallet in (wallets or "").split(",") if wallet.strip()]
+    topics = [alert_topic(wallet) for wallet in requested] or [alert_topic("*")]
+    subscription = broadcaster.subscribe(topics, replay_latest=False)
+    return sse_response(request, subscription)
+
+@app.get("/api/stream/stats")
+async def get_stream_stats():
+    """
+    Retourne l'état des flux poussés (abonnés, événements abandonnés pour les clients lents,
+    cryptos suivies par le flux de prix).
+    """
+    return {**broadcaster.stats(), "price_feed": price_feed.status()}
+
+@app.get("/api/upstream-health")
+async def get_upstream_health():
+    """
+    Retourne l'état de santé de chaque API amont : état du disjoncteur (closed, open, half_open),
+    échecs consécutifs, latences observées, délai d'expiration adaptatif et budget de couverture (hedging).
+    """
+    return {
+        "hedging": HEDGING_ENABLED,
+        "upstreams": {
+            name: upstream_health(name).status(config.timeout) for name, config in UPSTREAMS.items()
+        },
+    }
+
+@app.get("/api/upstream-cache")
+async def get_upstream_cache_status():
+    """
+    Retourne l'état du cache disque des réponses amont (UPSTREAM_CACHE_MODE) : mode, nombre de
+    réponses enregistrées, taille, évictions et résultats des recherches (hit, stale, replay, miss).
+    """
+    if upstream_cache is None:
+        return {"mode": "off"}
+    return await asyncio.to_thread(upstream_cache.status)
+
+@app.get("/api/upstream-stats")
+async def get_upstream_stats():
+    """
+    Retourne les statistiques des pools de connexions vers les API amont
+    (connexions ouvertes, taux de réutilisation, temps d'attente).
+    """
+    return get_pool_stats()
+
+def _cache_lookups():
+    values = {}
+    for name, cache in (("prices", price_cache), ("jupiter_positions", positions_cache)):
+        values[(name, "hit")] = cache.hits
+        values[(name, "miss")] = cache.misses
+        values[(name, "coalesced")] = cache.coalesced
+    return values
+
+# Métriques lues à chaque collecte dans l'état existant (caches, jeu de données, flux).
+registry.counter("cryptotrack_cache_lookups_total", "Cache lookups, by cache and result.", ("cache", "result"), _cache_lookups)
+registry.gauge("cryptotrack_cache_entries", "Entries in cache, by cache.", ("cache",),
+               lambda: {("prices",): price_cache.stats()["entries"], ("jupiter_positions",): positions_cache.stats()["entries"]})
+registry.gauge("cryptotrack_dataset_version", "Version of the dataset being served.", (),
+               lambda: {(): dataset_store.current.version} if dataset_store.current is not None else {})
+registry.gauge("cryptotrack_dataset_coins", "Coins in the dataset being served.", (),
+               lambda: {(): len(dataset_store.current.coins)} if dataset_store.current is not None else {})
+registry.gauge("cryptotrack_stream_subscribers", "Server-Sent Events subscribers.", (),
+               lambda: {(): broadcaster.stats()["subscribers"]})
+registry.gauge("cryptotrack_upstream_circuit_open", "1 while an upstream's circuit breaker rejects requests, by upstream.",
+               ("upstream",), lambda: {(name,): int(health.state != "closed") for name, health in all_upstream_health().items()})
+registry.gauge("cryptotrack_alert_wallets", "Wallets watched by the alert scheduler.", (),
+               lambda: {(): len(alert_scheduler.wallets)})
+
+@app.get("/healthz")
+async def get_health():
+    """
+    Vivacité : le processus répond. Ne dépend ni du jeu de données ni des API amont.
+    """
+    return {"status": "ok", "pid": os.getpid()}
+
+@app.get("/readyz")
+async def get_readiness():
+    """
+    Disponibilité : 200 une fois le démarrage terminé et le jeu de données chargé avec ses index
+    (ou, avec STARTUP_WARM=0, dès la fin du démarrage), 503 sinon, par exemple pendant la mise à jour
+    initiale quand le fichier de données n'existe pas encore. Inclut le rapport de démarrage :
+    durée de l'import, de chaque étape et totale.
+    """
+    dataset = dataset_store.current
+    ready = startup_report["started"] and (dataset is not None or not STARTUP_WARM)
+    content = {
+        "status": "ready" if ready else "starting",
+        "dataset": dataset.info() if dataset is not None else None,
+        "warm": STARTUP_WARM,
+        **startup_report,
+    }
+    return JSONResponse(content, status_code=200 if ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Métriques au format texte Prometheus : latence par route et par API amont, erreurs et replis
+    (Binance -> CoinGecko), attente du limiteur de débit, durée des étapes du rafraîchissement
+    et du chargement du jeu de données, état des caches.
+    """
+    return PlainTextResponse(registry.render(), media_type=registry.CONTENT_TYPE)
 
 @app.get("/api/price")
 async def get_price(symbol: str, coin_id: str, is_tradable: bool):
@@ -133,89 +627,317 @@ async def get_price(symbol: str, coin_id: str, is_tradable: bool):
     Asynchronously retrieves the price of a cryptocurrency.
     It first tries Binance if the coin is marked as tradable,
     and falls back to CoinGecko if the Binance lookup fails or is not applicable.
+    Tradable coins are first looked up in the live Binance websocket price book,
+    then prices are served from the in-process price cache while they are fresh;
+    the response tells whether the price was streamed or cached, and how old it is.
+    Binance is skipped while its circuit breaker is open, and with PRICE_HEDGING=1,
+    CoinGecko is also asked when Binance is slower than its latency budget.
+    The price is recorded in the price history (see /api/history).
     """
-    price = None
+    result = None
     source = None
+    coingecko_tried = False
     binance_symbol = f"{symbol.upper()}USDC"
+    fetch_binance = lambda: price_cache.get_or_fetch("binance", binance_symbol, lambda: get_price_from_binance(binance_symbol))
+    fetch_coingecko = lambda: price_cache.get_or_fetch("coingecko", coin_id, lambda: get_price_from_coingecko(coin_id))
 
-    # Log the initial attempt
-    print(f"Fetching price for {symbol} (CoinID: {coin_id}, Tradable: {is_tradable})")
+    # Debug-level logs are dropped before formatting unless LOG_LEVEL=DEBUG.
+    logger.debug("Fetching price for %s (CoinID: %s, Tradable: %s)", symbol, coin_id, is_tradable)
 
     if is_tradable:
-        print(f"Attempting to fetch price from Binance for {binance_symbol}...")
-        price = await get_price_from_binance(binance_symbol)
-        if price is not None:
-            source = "Binance"
-            print(f"Successfully fetched price from Binance: {price}")
-        else:
-            print(f"Failed to fetch price from Binance for {binance_symbol}. Falling back to CoinGecko.")
+        # The websocket price book answers without any network I/O when it has a fresh price.
+        streamed = price_book.get(binance_symbol)
+        if streamed is not None:
+            price_history.record(coin_id, streamed[0], "Binance", time.time() - streamed[1])
+            return {
+                "symbol": symbol,
+                "price": streamed[0],
+                "source": "Binance",
+                "cached": False,
+                "age_seconds": round(streamed[1], 3),
+                "streamed": True,
+            }
 
-    if price is None:
+        binance_health = upstream_health("binance")
+        if not binance_health.available():
+            # The circuit breaker is open: skip Binance instead of waiting for it to fail.
+            logger.debug("Binance circuit open, falling back to CoinGecko for %s.", binance_symbol)
+        elif HEDGING_ENABLED:
+            # Hedged mode: CoinGecko is also asked if Binance has not answered within its latency budget.
+            result, winner = await hedged(fetch_binance, fetch_coingecko, binance_health.hedge_delay(),
+                                          usable=lambda cached: cached.value is not None)
+            price_hedges.inc(winner)
+            # Without a usable answer ("none"), CoinGecko was asked too: it is not asked again below.
+            coingecko_tried = winner != "primary"
+            if result.value is not None:
+                source = "Binance" if winner == "primary" else "Binance (fallback CoinGecko)"
+        else:
+            logger.debug("Attempting to fetch price from Binance for %s...", binance_symbol)
+            result = await fetch_binance()
+            if result.value is not None:
+                source = "Binance"
+                logger.debug("Successfully fetched price from Binance: %s (cached: %s)", result.value, result.cached)
+            else:
+                logger.debug("Failed to fetch price from Binance for %s. Falling back to CoinGecko.", binance_symbol)
+
+    if (result is None or result.value is None) and not coingecko_tried:
         # This block runs if the coin is not tradable on Binance or if the Binance API call failed.
-        print(f"Attempting to fetch price from CoinGecko for coin_id: {coin_id}...")
-        price = await get_price_from_coingecko(coin_id)
-        if price is not None:
-            # If the initial source was None, it means we came directly here.
-            # Otherwise, it was a fallback.
-            source = "CoinGecko" if source is None else "Binance (fallback CoinGecko)"
-            print(f"Successfully fetched price from CoinGecko: {price}")
+        logger.debug("Attempting to fetch price from CoinGecko for coin_id: %s...", coin_id)
+        result = await fetch_coingecko()
+        if result.value is not None:
+            # A tradable coin only gets here when Binance could not price it (or was skipped).
+            source = "CoinGecko" if not is_tradable else "Binance (fallback CoinGecko)"
+            logger.debug("Successfully fetched price from CoinGecko: %s (cached: %s)", result.value, result.cached)
         else:
-            print(f"Failed to fetch price from CoinGecko for coin_id: {coin_id}.")
+            logger.debug("Failed to fetch price from CoinGecko for coin_id: %s.", coin_id)
+    if is_tradable and source != "Binance":
+        price_fallbacks.inc("binance", "coingecko" if result.value is not None else "none")
 
-    if price is None:
+    if result.value is None:
         # After trying all sources, if price is still None, raise an error.
         error_message = f"Could not retrieve price for {symbol} from any available source."
-        print(error_message)
+        logger.info(error_message)
         raise HTTPException(status_code=404, detail=error_message)
 
-    return {"symbol": symbol, "price": price, "source": source}
+    price_history.record(coin_id, result.value, source, time.time() - result.age)
+    return {
+        "symbol": symbol,
+        "price": result.value,
+        "source": source,
+        "cached": result.cached,
+        "age_seconds": round(result.age, 3),
+        "streamed": False,
+    }
+
+@app.get("/api/price-stream/status")
+async def get_price_stream_status():
+    """
+    Retourne l'état du flux websocket des prix Binance (connexion, paires suivies, messages reçus).
+    """
+    return ticker_stream.status()
+
+@app.get("/api/price-cache/stats")
+async def get_price_cache_stats():
+    """
+    Retourne les compteurs du cache de prix (succès, échecs, requêtes regroupées).
+    """
+    return price_cache.stats()
+
+# Nombre maximal de cryptomonnaies par requête d'historique, et de bougies par série.
+MAX_HISTORY_COINS = 100
+MAX_HISTORY_CANDLES = 2000
+
+@app.get("/api/history", response_class=FastJSONResponse)
+async def get_history(
+    coin_ids: str = Query(..., min_length=1),
+    start: Optional[float] = Query(None, description="Début (timestamp Unix, en secondes)"),
+    end: Optional[float] = Query(None, description="Fin (timestamp Unix, en secondes)"),
+    interval: Optional[float] = Query(None, gt=0, description="Durée d'une bougie, en secondes"),
+    candles: int = Query(300, ge=1, le=MAX_HISTORY_CANDLES),
+):
+    """
+    Retourne l'historique des prix enregistrés (identifiants CoinGecko séparés par des virgules),
+    agrégé en bougies OHLC, sans aucun appel amont. Par défaut, les dernières 24 heures
+    découpées en 'candles' bougies. Seules les bougies contenant au moins un prix sont renvoyées.
+    """
+    requested = list(dict.fromkeys(coin_id.strip() for coin_id in coin_ids.split(",") if coin_id.strip()))
+    if len(requested) > MAX_HISTORY_COINS:
+        raise HTTPException(status_code=400, detail=f"Trop de cryptomonnaies demandées (maximum {MAX_HISTORY_COINS}).")
+    if any(value is not None and not math.isfinite(value) for value in (start, end, interval)):
+        raise HTTPException(status_code=400, detail="'start', 'end' et 'interval' doivent être des nombres finis.")
+    end = time.time() if end is None else end
+    start = end - 86400 if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'start' doit précéder 'end'.")
+    if interval is None:
+        interval = (end - start) / candles
+    elif (end - start) / interval > MAX_HISTORY_CANDLES:
+        raise HTTPException(status_code=400, detail=f"Trop de bougies demandées (maximum {MAX_HISTORY_CANDLES}).")
+
+    return FastJSONResponse({
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "series": {coin_id: price_history.ohlc(coin_id, start, end, interval) for coin_id in requested},
+    })
+
+@app.get("/api/history/status")
+async def get_history_status():
+    """
+    Retourne l'état de l'historique des prix (cryptos suivies, points en mémoire, persistance).
+    """
+    return price_history.status()
+
+# Nombre maximal de cryptomonnaies acceptées par une requête de prix groupée.
+MAX_BATCH_PRICE_ITEMS = 1000
+
+class PriceRequestItem(BaseModel):
+    symbol: str
+    coin_id: str
+    is_tradable: bool
+
+@app.post("/api/prices")
+async def get_prices(items: List[PriceRequestItem]):
+    """
+    Retourne les prix de plusieurs cryptomonnaies en une seule requête.
+    Les cryptos échangeables sont résolues par un seul appel Binance, les autres (et celles
+    que Binance n'a pas pu résoudre) par des appels CoinGecko groupés, avec la même logique
+    de repli que /api/price. Chaque résultat indique sa source, ou un prix nul si aucune
+    source n'a répondu.
+    """
+    if len(items) > MAX_BATCH_PRICE_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Trop de cryptomonnaies demandées (maximum {MAX_BATCH_PRICE_ITEMS}).")
 
+    results = await resolve_prices([item.model_dump() for item in items])
+    return {"count": len(results), "prices": results}
+
+
+# Nombre maximal de portefeuilles acceptés par une requête groupée de positions Jupiter Lend.
+MAX_BATCH_WALLETS = 100
+
+class WalletBatchRequest(BaseModel):
+    wallets: List[str]
+
+@app.post("/api/jupiter-lend-positions/batch")
+async def get_jupiter_lend_positions_batch(request: WalletBatchRequest):
+    """
+    Récupère les positions d'emprunt de plusieurs portefeuilles en une seule requête.
+    Les appels amont sont faits en parallèle (avec une concurrence bornée) et mis en cache ;
+    un portefeuille en erreur n'empêche pas de renvoyer les autres : son résultat porte l'erreur.
+    """
+    if len(request.wallets) > MAX_BATCH_WALLETS:
+        raise HTTPException(status_code=413, detail=f"Trop de portefeuilles demandés (maximum {MAX_BATCH_WALLETS}).")
+
+    results = await get_lend_positions_batch(request.wallets)
+    return {
+        "count": len(results),
+        "failed": sum(1 for result in results if result["error"] is not None),
+        "results": results,
+    }
 
 @app.get("/api/jupiter-lend-positions/{wallet_address}")
 async def get_jupiter_lend_positions(wallet_address: str):
     """
     Récupère les positions d'emprunt d'un portefeuille sur Jupiter Lend.
+    Les positions sont mises en cache quelques secondes (JUPITER_POSITIONS_TTL), et les requêtes
+    simultanées pour un même portefeuille partagent un seul appel amont.
+    Le portefeuille "DEMO" renvoie des données de démonstration.
     """
-    url = f"https://lite-api.jup.ag/lend/v1/positions/{wallet_address}"
-    # Utilisation de données de démonstration si l'adresse est "DEMO"
-    if wallet_address.upper() == "DEMO":
-        return [
-            {
-                "collateral": "SOL",
-                "collateralValue": 1500.50,
-                "borrowed": "USDC",
-                "borrowValue": 750.25,
-                "ratio": 50.00,
-                "healthFactor": 1.7,
-                "riskLevel": "safe"
-            },
-            {
-                "collateral": "JitoSOL",
-                "collateralValue": 2500.00,
-                "borrowed": "USDT",
-                "borrowValue": 1800.00,
-                "ratio": 72.00,
-                "healthFactor": 1.2,
-                "riskLevel": "risky"
-            }
-        ]
+    try:
+        return (await get_lend_positions(wallet_address)).value
+    except JupiterLendError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url)
-            response.raise_for_status()  # Lève une exception pour les statuts 4xx/5xx
-
-            data = response.json()
-            # L'API peut retourner un objet vide {} si aucune position n'est trouvée.
-            if not data or not isinstance(data, list):
-                 return []
-            return data
-
-        except httpx.HTTPStatusError as e:
-            # Gérer les erreurs HTTP spécifiques (ex: 404, 500)
-            raise HTTPException(status_code=e.response.status_code, detail=f"Erreur de l'API Jupiter Lend: {e.response.text}")
-        except httpx.RequestError as e:
-            # Gérer les erreurs de connexion (ex: timeout, DNS)
-            raise HTTPException(status_code=503, detail=f"Impossible de contacter l'API Jupiter Lend: {e}")
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="Réponse invalide de l'API Jupiter Lend (format JSON attendu).")
+@app.get("/api/jupiter-lend-positions-cache/stats")
+async def get_jupiter_positions_cache_stats():
+    """
+    Retourne les compteurs du cache des positions Jupiter Lend.
+    """
+    return positions_cache.stats()
+
+# Nombre maximal de portefeuilles surveillés par le planificateur d'alertes.
+MAX_ALERT_WALLETS = 10000
+
+# Limites d'une requête d'analyse de risque.
+MAX_RISK_POSITIONS = 20000
+MAX_RISK_SCENARIOS = 50
+
+class PriceShockScenario(BaseModel):
+    name: Optional[str] = None
+    # Variations de prix en pourcentage, par symbole (ex. {"SOL": -20}).
+    shocks: Dict[str, float]
+
+class RiskRequest(BaseModel):
+    wallets: List[str] = []
+    positions: List[Dict[str, Any]] = []
+    scenarios: List[PriceShockScenario] = []
+
+@app.post("/api/lending/risk", response_class=FastJSONResponse)
+async def get_lending_risk(request: RiskRequest):
+    """
+    Analyse le risque de positions d'emprunt : celles des portefeuilles Jupiter Lend demandés
+    et/ou celles fournies directement. Les positions sont revalorisées avec nos propres prix
+    (flux Binance, cache, Binance, CoinGecko) quand elles indiquent leurs quantités, puis
+    LTV, health factor et niveau de risque sont recalculés en une passe vectorisée.
+    Chaque scénario applique des chocs de prix (ex. SOL -20 %) à toutes les positions.
+    """
+    if len(request.wallets) > MAX_BATCH_WALLETS:
+        raise HTTPException(status_code=413, detail=f"Trop de portefeuilles demandés (maximum {MAX_BATCH_WALLETS}).")
+    if len(request.scenarios) > MAX_RISK_SCENARIOS:
+        raise HTTPException(status_code=413, detail=f"Trop de scénarios demandés (maximum {MAX_RISK_SCENARIOS}).")
+    if any(percent < -100 for scenario in request.scenarios for percent in scenario.shocks.values()):
+        raise HTTPException(status_code=400, detail="Un choc de prix ne peut pas être inférieur à -100 %.")
+
+    positions = list(request.positions)
+    errors = []
+    if request.wallets:
+        for result in await get_lend_positions_batch(request.wallets):
+            if result["error"] is not None:
+                errors.append({"wallet": result["wallet"], **result["error"]})
+            else:
+                positions.extend({**position, "wallet": result["wallet"]} for position in result["positions"])
+    if len(positions) > MAX_RISK_POSITIONS:
+        raise HTTPException(status_code=413, detail=f"Trop de positions à analyser (maximum {MAX_RISK_POSITIONS}).")
+
+    try:
+        book = PositionBook(positions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Position invalide : {e}")
+
+    prices = await resolve_symbol_prices(book.symbols, coins_by_symbol())
+
+    result = book.evaluate(
+        {symbol: price['price'] for symbol, price in prices.items()},
+        [scenario.shocks for scenario in request.scenarios],
+    )
+    for scenario, evaluated in zip(request.scenarios, result["scenarios"]):
+        evaluated["name"] = scenario.name
+    return FastJSONResponse({
+        "count": len(positions),
+        "prices": {symbol: {"price": price['price'], "source": price['source']} for symbol, price in prices.items()},
+        "errors": errors,
+        **result,
+    })
+
+class AlertWalletsRequest(BaseModel):
+    wallets: List[str]
+
+@app.post("/api/alerts/wallets")
+async def watch_alert_wallets(request: AlertWalletsRequest):
+    """
+    Enregistre des portefeuilles à surveiller : leurs positions sont évaluées en arrière-plan,
+    d'autant plus souvent qu'elles sont proches de la liquidation, et chaque changement de
+    niveau de risque déclenche une alerte (webhook ALERT_WEBHOOK_URL et /api/stream/alerts).
+    """
+    shared_wallets = await shared_state.offload(shared_state.wallets) if shared_state is not None else None
+    if shared_wallets is not None:
+        # Portefeuilles partagés : le worker élu reprend les nouveaux à sa prochaine synchronisation.
+        alert_scheduler.sync_wallets(shared_wallets)
+    if len(alert_scheduler.wallets) + len(request.wallets) > MAX_ALERT_WALLETS:
+        raise HTTPException(status_code=413, detail=f"Trop de portefeuilles surveillés (maximum {MAX_ALERT_WALLETS}).")
+    added = alert_scheduler.watch(request.wallets)
+    if shared_state is not None:
+        await shared_state.offload(shared_state.add_wallets, added)
+    return {"added": added, "count": len(alert_scheduler.wallets)}
+
+@app.delete("/api/alerts/wallets/{wallet_address}")
+async def unwatch_alert_wallet(wallet_address: str):
+    """
+    Arrête la surveillance d'un portefeuille.
+    """
+    removed = alert_scheduler.unwatch(wallet_address)
+    if shared_state is not None:
+        removed = await shared_state.offload(shared_state.remove_wallet, wallet_address) or removed
+    if not removed:
+        raise HTTPException(status_code=404, detail="Ce portefeuille n'est pas surveillé.")
+    return {"count": len(alert_scheduler.wallets)}
+
+@app.get("/api/alerts")
+async def get_alerts():
+    """
+    Retourne l'état de la surveillance (portefeuilles, prochaine vérification, niveaux de risque)
+    et les dernières alertes émises.
+    """
+    return {**alert_scheduler.status(), "recent": list(alert_scheduler.recent)}
+
+startup_report["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 4)
@@ -0,0 +1,262 @@
+"""
+Prometheus metrics of the API, the upstream calls, the rate limiter, the data updater and
+the dataset, served as text by `/metrics` (exposition format 0.0.4) without any dependency.
+
+Metrics are module-level objects updated from the hot paths: recording a sample is a dict
+lookup and a few additions under an uncontended lock (the updater records from its own
+thread). Gauges that mirror existing state (cache sizes, dataset version) are read from
+callbacks at scrape time instead of being kept up to date.
+
+`MetricsMiddleware` records the latency of every API request, labelled by route template
+(e.g. `/api/jupiter-lend-positions/{wallet_address}`) rather than by raw path, so the
+number of series stays bounded. The latency is measured until the response headers are
+sent, so that streaming responses (Server-Sent Events) count their time to first byte.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+# Latency buckets, in seconds: from cache hits (sub-millisecond) to slow upstream calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets for long operations (updater stages), in seconds.
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count, per label values: either incremented, or read at
+    scrape time from `function`, as a mapping of label values to values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Mapping[Labels, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            try:
+                values = sorted(self.function().items())
+            except Exception:
+                # A failing callback (e.g. no dataset yet) must not break the whole scrape.
+                values = []
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, per label values: either set, or read at scrape time from `function`."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Counts of observations per bucket (cumulative when rendered), with their sum, per label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket (the last one is +Inf)..., sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observes the duration of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return int(sum(state[:-1])) if state is not None else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = []
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics exposed by `/metrics`, in registration order."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), function=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "cryptotrack_http_requests_total", "API requests, by route, method and status.", ("route", "method", "status"))
+http_request_duration = registry.histogram(
+    "cryptotrack_http_request_duration_seconds", "API request latency until the response headers, by route.", ("route", "method"))
+
+upstream_requests = registry.counter(
+    "cryptotrack_upstream_requests_total", "Upstream API calls, by upstream and status class (2xx, 4xx, 5xx, error).", ("upstream", "status"))
+upstream_request_duration = registry.histogram(
+    "cryptotrack_upstream_request_duration_seconds", "Upstream API call latency, by upstream.", ("upstream",))
+price_fallbacks = registry.counter(
+    "cryptotrack_price_fallbacks_total", "Prices served by a fallback source, by failed and fallback source.", ("from", "to"))
+circuit_transitions = registry.counter(
+    "cryptotrack_upstream_circuit_transitions_total", "Circuit breaker state changes, by upstream and new state.", ("upstream", "state"))
+upstream_cache_lookups = registry.counter(
+    "cryptotrack_upstream_cache_lookups_total",
+    "Upstream response cache lookups, by upstream and result (hit, stale, replay, miss).", ("upstream", "result"))
+price_hedges = registry.counter(
+    "cryptotrack_price_hedges_total", "Hedged price requests, by source of the answer (primary, secondary, or none when neither answered).", ("winner",))
+
+rate_limiter_wait = registry.histogram(
+    "cryptotrack_rate_limiter_wait_seconds", "Time spent waiting for a rate limiter token, by limiter.", ("limiter",))
+rate_limited_responses = registry.counter(
+    "cryptotrack_rate_limited_responses_total", "429 responses received, by limiter.", ("limiter",))
+
+updater_stage_duration = registry.histogram(
+    "cryptotrack_updater_stage_duration_seconds", "Duration of the data updater stages.", ("stage",), DURATION_BUCKETS)
+updater_runs = registry.counter(
+    "cryptotrack_updater_runs_total", "Data updater runs, by mode and final status.", ("mode", "status"))
+
+dataset_load_duration = registry.histogram(
+    "cryptotrack_dataset_load_duration_seconds",
+    "Time to build a dataset version, from the data file or from a refresh diff.", ("source",), DURATION_BUCKETS)
+
+
+def status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the count and latency of API requests, by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status: int):
+            nonlocal recorded
+            recorded = True
+            route = scope.get("route")
+            # Unmatched paths share one label, so scans of random URLs cannot add series.
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, template, method)
+            http_requests.inc(template, method, str(status))
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start" and not recorded:
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            if not recorded:
+                record(500)
@@ -0,0 +1,222 @@
+"""
+In-process cache for upstream prices, with single-flight request coalescing.
+
+Entries are keyed by `(source, key)`, e.g. `("binance", "BTCUSDC")` or
+`("coingecko", "bitcoin")`. Each source has its own TTL, the cache holds at most
+`max_entries` values (least recently used ones are evicted first), and concurrent
+misses for the same key share a single upstream request.
+
+In a multi-worker deployment, the price cache has a second level shared by the workers
+(see `src/shared_state.py`): local misses are looked up there, fetched prices are written
+there, and a worker missing a key another worker is already fetching waits for its result.
+The shared lookups and writes run on the shared state's thread, which is why `get`, `get_many`,
+`put` and `put_many` are coroutines.
+
+Configuration through environment variables:
+    PRICE_CACHE_TTL_BINANCE      seconds a Binance price stays fresh (default 5)
+    PRICE_CACHE_TTL_COINGECKO    seconds a CoinGecko price stays fresh (default 60)
+    PRICE_CACHE_MAX_ENTRIES      maximum number of cached prices (default 10000)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from src.shared_state import FETCH_WAIT, SharedState, shared_state
+
+
+class CacheResult(NamedTuple):
+    value: Any
+    cached: bool
+    age: float
+
+
+class AsyncTTLCache:
+    """
+    A bounded LRU cache with a TTL per source and single-flight fetches, optionally backed
+    by a cache `shared` with the other worker processes.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 10000, default_ttl: float = 30.0,
+                 shared: Optional[SharedState] = None, fetch_wait: float = FETCH_WAIT):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self.fetch_wait = fetch_wait
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self.shared_waits = 0
+
+    def ttl_for(self, source: str) -> float:
+        return self.ttls.get(source, self.default_ttl)
+
+    def _lookup(self, cache_key: Tuple[str, Hashable]) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl_for(cache_key[0]):
+            del self._entries[cache_key]
+            return None
+        self._entries.move_to_end(cache_key)
+        return value, age
+
+    async def _lookup_shared(self, source: str, keys: Iterable[Hashable]) -> Dict[Hashable, Tuple[Any, float]]:
+        """Looks up local misses in the shared cache, and keeps what it has locally."""
+        keys = list(keys)
+        if self.shared is None or not keys:
+            return {}
+        found = await self.shared.offload(self.shared.get_prices, source, keys, self.ttl_for(source))
+        for key, (value, age) in found.items():
+            self._store((source, key), value, time.monotonic() - age)
+        self.shared_hits += len(found)
+        return found
+
+    async def get(self, source: str, key: Hashable) -> Optional[CacheResult]:
+        """Returns the fresh cached value for a key, or None. Counts as a hit or a miss."""
+        found = self._lookup((source, key)) or (await self._lookup_shared(source, [key])).get(key)
+        if found is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CacheResult(found[0], True, found[1])
+
+    async def get_many(self, source: str, keys: Iterable[Hashable]) -> Dict[Hashable, CacheResult]:
+        """Returns the fresh cached values among `keys`, leaving out the misses."""
+        keys = list(keys)
+        results = {}
+        missing = []
+        for key in keys:
+            found = self._lookup((source, key))
+            if found is None:
+                missing.append(key)
+            else:
+                results[key] = CacheResult(found[0], True, found[1])
+        # The local misses are looked up in the shared cache with a single query.
+        for key, (value, age) in (await self._lookup_shared(source, missing)).items():
+            results[key] = CacheResult(value, True, age)
+        self.hits += len(results)
+        self.misses += len(keys) - len(results)
+        return results
+
+    def _store(self, cache_key: Tuple[str, Hashable], value: Any, stored_at: float):
+        self._entries[cache_key] = (value, stored_at)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def put(self, source: str, key: Hashable, value: Any):
+        """Stores a value, evicting the least recently used entries beyond `max_entries`."""
+        await self.put_many(source, {key: value})
+
+    async def put_many(self, source: str, values: Dict[Hashable, Any]):
+        """Stores many values of a source, and shares them with the other workers in one write."""
+        now = time.monotonic()
+        for key, value in values.items():
+            self._store((source, key), value, now)
+        if self.shared is not None and values:
+            await self.shared.offload(self.shared.put_prices, source, values)
+
+    async def get_or_fetch(self, source: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> CacheResult:
+        """
+        Returns the cached value for a key, or calls `fetch` to get it.
+        Concurrent callers missing the same key wait for a single `fetch` call, which runs as
+        its own task: a caller that is cancelled stops waiting, without cancelling the fetch
+        the others are waiting for. A None result is handed to every waiter but is not cached.
+        """
+        cache_key = (source, key)
+        found = self._lookup(cache_key)
+        if found is not None:
+            self.hits += 1
+            return CacheResult(found[0], True, found[1])
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            self.coalesced += 1
+            return CacheResult((await asyncio.shield(inflight)).value, False, 0.0)
+
+        # Registered before the shared lookup, so that callers arriving meanwhile wait for it.
+        task = asyncio.ensure_future(self._resolve(source, key, fetch))
+        self._inflight[cache_key] = task
+        task.add_done_callback(lambda task: self._done(cache_key, task))
+        return await asyncio.shield(task)
+
+    def _done(self, cache_key: Tuple[str, Hashable], task: asyncio.Future):
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled.
+            task.exception()
+
+    async def _resolve(self, source: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> CacheResult:
+        """Looks a local miss up in the shared cache, and fetches it when it is missing there too."""
+        found = (await self._lookup_shared(source, [key])).get(key)
+        if found is not None:
+            self.hits += 1
+            return CacheResult(found[0], True, found[1])
+        self.misses += 1
+        return await self._fetch(source, key, fetch)
+
+    async def _fetch(self, source: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> CacheResult:
+        """
+        Calls `fetch` and caches its result. With a shared cache, the fetch is claimed first:
+        when another worker already claimed it, its result is awaited instead.
+        """
+        claim = f"fetch:{source}:{key}"
+        claimed = False
+        if self.shared is not None:
+            claimed = await self.shared.offload(self.shared.acquire, claim, ttl=self.fetch_wait)
+            if not claimed:
+                self.shared_waits += 1
+                found, claimed = await self.shared.wait_for_price(source, key, self.ttl_for(source), self.fetch_wait)
+                if found is not None:
+                    self._store((source, key), found[0], time.monotonic() - found[1])
+                    return CacheResult(found[0], True, found[1])
+        try:
+            value = await fetch()
+            if value is not None:
+                # Shared before the claim is released, so that waiting workers find it.
+                await self.put(source, key, value)
+            return CacheResult(value, False, 0.0)
+        finally:
+            if claimed:
+                await self.shared.offload(self.shared.release, claim)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttls": self.ttls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "shared": self.shared is not None,
+            "shared_hits": self.shared_hits,
+            "shared_waits": self.shared_waits,
+        }
+
+
+price_cache = AsyncTTLCache(
+    ttls={
+        "binance": float(os.environ.get("PRICE_CACHE_TTL_BINANCE", 5)),
+        "coingecko": float(os.environ.get("PRICE_CACHE_TTL_COINGECKO", 60)),
+    },
+    max_entries=int(os.environ.get("PRICE_CACHE_MAX_ENTRIES", 10000)),
+    shared=shared_state,
+)
@@ -0,0 +1,99 @@
+"""
+Shared price polling for the price streaming endpoint.
+
+Clients subscribe to coins; a single background loop prices every watched coin in one
+batch (`resolve_prices`, which itself reads the live Binance price book and the price
+cache first) and publishes each changed price to the `price:<coin_id>` topic of the
+broadcaster. However many clients watch a coin, it costs one upstream lookup per tick.
+
+Configuration through environment variables:
+    PRICE_PUSH_INTERVAL    seconds between two pricing rounds (default 2)
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from src.event_stream import Broadcaster
+from src.prices import resolve_prices
+
+logger = logging.getLogger(__name__)
+
+PUSH_INTERVAL = float(os.environ.get("PRICE_PUSH_INTERVAL", 2))
+
+
+def price_topic(coin_id: str) -> str:
+    return f"price:{coin_id}"
+
+
+class PriceFeed:
+    """Prices the coins watched by at least one subscriber and publishes the changes."""
+
+    def __init__(self, broadcaster: Broadcaster, interval: float = PUSH_INTERVAL):
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self._watched: Dict[str, Dict[str, Any]] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._last_prices: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+
+    def watch(self, items: Iterable[Dict[str, Any]]):
+        """Starts watching `{symbol, coin_id, is_tradable}` items, and the polling loop if needed."""
+        for item in items:
+            coin_id = item['coin_id']
+            self._watched[coin_id] = item
+            self._refcounts[coin_id] = self._refcounts.get(coin_id, 0) + 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def unwatch(self, coin_ids: Iterable[str]):
+        for coin_id in coin_ids:
+            count = self._refcounts.get(coin_id, 0) - 1
+            if count > 0:
+                self._refcounts[coin_id] = count
+            else:
+                self._refcounts.pop(coin_id, None)
+                self._watched.pop(coin_id, None)
+                self._last_prices.pop(coin_id, None)
+
+    async def poll_once(self):
+        items = list(self._watched.values())
+        if not items:
+            return
+        for result in await resolve_prices(items):
+            coin_id = result['coin_id']
+            if result['price'] is None or self._last_prices.get(coin_id) == result['price']:
+                continue
+            if coin_id not in self._watched:
+                continue
+            self._last_prices[coin_id] = result['price']
+            self.broadcaster.publish(price_topic(coin_id), result)
+        self.rounds += 1
+
+    async def run(self):
+        while self._watched:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error while polling prices for the price stream: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "watched_coins": len(self._watched),
+            "rounds": self.rounds,
+        }
@@ -0,0 +1,339 @@
+"""
+Embedded time-series store of the prices we resolve, for charts that need no upstream call.
+
+Every price returned by `/api/price`, `/api/prices` or the price streams is recorded with
+its source and observation time in an append-only ring buffer per coin (NumPy arrays,
+grown on demand up to `capacity` points, after which the oldest points are overwritten).
+At most one point is kept per coin and `resolution` seconds. New points are periodically
+flushed to a local SQLite file, which only keeps the last `capacity * resolution` seconds
+(the span a buffer can hold), and from which the buffers are reloaded at startup: one query
+in a worker thread, whose rows are split into one array per coin without replaying them.
+
+`ohlc` aggregates a coin's points into open/high/low/close buckets with vectorized NumPy
+operations over the stored arrays.
+
+Configuration through environment variables:
+    PRICE_HISTORY_DB              SQLite file ("" to keep the history in memory only)
+    PRICE_HISTORY_RESOLUTION      minimum seconds between two points of a coin (default 10)
+    PRICE_HISTORY_CAPACITY        maximum points kept in memory per coin (default 262144, 30 days at 10s)
+    PRICE_HISTORY_FLUSH_INTERVAL  seconds between two flushes to SQLite (default 60)
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "price_history.sqlite3")
+
+DB_PATH = os.environ.get("PRICE_HISTORY_DB", DEFAULT_DB_PATH)
+RESOLUTION = float(os.environ.get("PRICE_HISTORY_RESOLUTION", 10))
+CAPACITY = int(os.environ.get("PRICE_HISTORY_CAPACITY", 2 ** 18))
+FLUSH_INTERVAL = float(os.environ.get("PRICE_HISTORY_FLUSH_INTERVAL", 60))
+
+INITIAL_SIZE = 256
+
+
+class PriceSeries:
+    """Ring buffer of `(timestamp, price, source code)` points of one coin, in time order."""
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        size = min(INITIAL_SIZE, capacity)
+        self.timestamps = np.empty(size, dtype=np.float64)
+        self.prices = np.empty(size, dtype=np.float64)
+        self.sources = np.empty(size, dtype=np.uint8)
+        self.start = 0          # Index of the oldest point.
+        self.length = 0         # Number of points stored.
+        self.appended = 0       # Points appended since creation (never decreases).
+
+    def _grow(self):
+        size = min(len(self.timestamps) * 2, self.capacity)
+        for name in ("timestamps", "prices", "sources"):
+            old = getattr(self, name)
+            new = np.empty(size, dtype=old.dtype)
+            new[:self.length] = old[:self.length]
+            setattr(self, name, new)
+
+    @classmethod
+    def from_arrays(cls, timestamps: np.ndarray, prices: np.ndarray, sources: np.ndarray,
+                    capacity: int = CAPACITY) -> "PriceSeries":
+        """A series of time-ordered points, of which the last `capacity` are kept."""
+        series = cls(capacity)
+        timestamps, prices, sources = timestamps[-capacity:], prices[-capacity:], sources[-capacity:]
+        length = len(timestamps)
+        if length > len(series.timestamps):
+            series.timestamps = np.empty(length, dtype=np.float64)
+            series.prices = np.empty(length, dtype=np.float64)
+            series.sources = np.empty(length, dtype=np.uint8)
+        series.timestamps[:length] = timestamps
+        series.prices[:length] = prices
+        series.sources[:length] = sources
+        series.length = series.appended = length
+        return series
+
+    def append(self, timestamp: float, price: float, source: int):
+        if self.length == len(self.timestamps) and self.length < self.capacity:
+            self._grow()
+        if self.length < len(self.timestamps):
+            index = self.length
+            self.length += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % len(self.timestamps)
+        self.timestamps[index] = timestamp
+        self.prices[index] = price
+        self.sources[index] = source
+        self.appended += 1
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        if self.length == 0:
+            return None
+        return float(self.timestamps[(self.start + self.length - 1) % len(self.timestamps)])
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the `(timestamps, prices, sources)` in time order (views when not wrapped)."""
+        end = self.start + self.length
+        if end <= len(self.timestamps):
+            return self.timestamps[self.start:end], self.prices[self.start:end], self.sources[self.start:end]
+        order = np.r_[self.start:len(self.timestamps), 0:end - len(self.timestamps)]
+        return self.timestamps[order], self.prices[order], self.sources[order]
+
+    def tail(self, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns copies of the `count` most recent points."""
+        timestamps, prices, sources = self.arrays()
+        count = min(count, self.length)
+        return timestamps[self.length - count:].copy(), prices[self.length - count:].copy(), sources[self.length - count:].copy()
+
+
+def ohlc(timestamps: np.ndarray, prices: np.ndarray, start: float, end: float, interval: float) -> Dict[str, List[Any]]:
+    """
+    Buckets time-ordered points of `[start, end)` into `interval`-second buckets.
+    Only non-empty buckets are returned, as columns: bucket start time, open, high, low, close, count.
+    """
+    # Points are in time order: a binary search of every bucket edge gives each bucket's
+    # contiguous run of points, without computing a bucket number per point.
+    count = int(np.ceil((end - start) / interval))
+    edges = np.searchsorted(timestamps, start + np.arange(count + 1) * interval, side="left")
+    edges[-1] = np.searchsorted(timestamps, end, side="left")
+    starts, ends = edges[:-1], edges[1:]
+    non_empty = np.flatnonzero(ends > starts)
+    if len(non_empty) == 0:
+        return {"t": [], "open": [], "high": [], "low": [], "close": [], "count": []}
+
+    starts, ends = starts[non_empty], ends[non_empty]
+    window = prices[starts[0]:ends[-1]]
+    offsets = starts - starts[0]
+    # reduceat runs from each offset to the next one, so empty buckets must be skipped
+    # (done above) and the last run ends with the window.
+    return {
+        "t": (start + non_empty * interval).tolist(),
+        "open": prices[starts].tolist(),
+        "high": np.maximum.reduceat(window, offsets).tolist(),
+        "low": np.minimum.reduceat(window, offsets).tolist(),
+        "close": prices[ends - 1].tolist(),
+        "count": (ends - starts).tolist(),
+    }
+
+
+class PriceHistory:
+    """Price series of every coin, with periodic persistence to SQLite."""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = DB_PATH,
+        resolution: float = RESOLUTION,
+        capacity: int = CAPACITY,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.db_path = db_path or None
+        self.resolution = resolution
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.series: Dict[str, PriceSeries] = {}
+        self.sources: List[str] = []
+        self._source_codes: Dict[str, int] = {}
+        self._flushed: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.last_error: Optional[str] = None
+
+    def _source_code(self, source: Optional[str]) -> int:
+        source = source or ""
+        code = self._source_codes.get(source)
+        if code is None:
+            code = self._source_codes[source] = len(self.sources)
+            self.sources.append(source)
+        return code
+
+    def record(self, coin_id: str, price: Optional[float], source: Optional[str], timestamp: Optional[float] = None):
+        """Records a resolved price, unless the coin already has a point within `resolution` seconds."""
+        if price is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        series = self.series.get(coin_id)
+        if series is None:
+            series = self.series[coin_id] = PriceSeries(self.capacity)
+        last = series.last_timestamp
+        if last is not None and timestamp < last + self.resolution:
+            return
+        series.append(timestamp, float(price), self._source_code(source))
+
+    def record_results(self, results: Iterable[Dict[str, Any]]):
+        """Records the results of `resolve_prices`, timestamped with their observation time."""
+        now = time.time()
+        for result in results:
+            age = result.get('age_seconds') or 0.0
+            self.record(result['coin_id'], result['price'], result['source'], now - age)
+
+    def ohlc(self, coin_id: str, start: float, end: float, interval: float) -> Dict[str, List[Any]]:
+        series = self.series.get(coin_id)
+        if series is None:
+            return ohlc(np.empty(0), np.empty(0), start, end, interval)
+        timestamps, prices, _ = series.arrays()
+        return ohlc(timestamps, prices, start, end, interval)
+
+    # Persistence
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS prices (coin_id TEXT NOT NULL, ts REAL NOT NULL, price REAL NOT NULL, source TEXT)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS prices_coin_ts ON prices (coin_id, ts)")
+        connection.execute("CREATE INDEX IF NOT EXISTS prices_ts ON prices (ts)")
+        return connection
+
+    def retention_start(self) -> float:
+        """Time of the oldest point worth keeping: a series holds `capacity` points `resolution` seconds apart."""
+        return time.time() - self.capacity * self.resolution
+
+    def _pending_rows(self) -> Tuple[List[Tuple[str, float, float, str]], Dict[str, int]]:
+        """Copies the points appended since the last flush. Called on the event loop thread."""
+        rows = []
+        flushed = {}
+        for coin_id, series in self.series.items():
+            pending = series.appended - self._flushed.get(coin_id, 0)
+            if pending <= 0:
+                continue
+            timestamps, prices, sources = series.tail(pending)
+            rows.extend(zip([coin_id] * len(timestamps), timestamps.tolist(), prices.tolist(),
+                            [self.sources[code] for code in sources.tolist()]))
+            flushed[coin_id] = series.appended
+        return rows, flushed
+
+    def _write(self, rows, since: float):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany("INSERT INTO prices (coin_id, ts, price, source) VALUES (?, ?, ?, ?)", rows)
+                connection.execute("DELETE FROM prices WHERE ts < ?", (since,))
+        finally:
+            connection.close()
+
+    async def flush(self) -> int:
+        """Writes the new points to SQLite and drops the expired ones. Returns the number of points written."""
+        if self.db_path is None:
+            return 0
+        rows, flushed = self._pending_rows()
+        if rows:
+            await asyncio.to_thread(self._write, rows, self.retention_start())
+            self._flushed.update(flushed)
+        self.flushes += 1
+        return len(rows)
+
+    def _read(self, since: float) -> Tuple[List[str], Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        """
+        Reads the points since `since` as `(source names, {coin_id: (timestamps, prices, source codes)})`,
+        with each coin's last `capacity` points. Runs in a worker thread.
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT coin_id, ts, price, source FROM prices WHERE ts >= ? ORDER BY coin_id, ts", (since,)
+            ).fetchall()
+        finally:
+            connection.close()
+        if not rows:
+            return [], {}
+        coin_ids, timestamps, prices, sources = zip(*rows)
+        timestamps = np.array(timestamps, dtype=np.float64)
+        prices = np.array(prices, dtype=np.float64)
+        names: Dict[str, int] = {}
+        codes = np.fromiter((names.setdefault(source or "", len(names)) for source in sources),
+                            dtype=np.uint8, count=len(rows))
+        # Rows are grouped by coin: each coin's points are one contiguous run.
+        coin_ids = np.array(coin_ids, dtype=object)
+        starts = np.flatnonzero(np.r_[True, coin_ids[1:] != coin_ids[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+        series = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            start = max(start, end - self.capacity)
+            series[coin_ids[start]] = (timestamps[start:end], prices[start:end], codes[start:end])
+        return list(names), series
+
+    async def load(self):
+        """Reloads the points of the last `capacity * resolution` seconds from SQLite."""
+        if self.db_path is None:
+            return
+        names, loaded = await asyncio.to_thread(self._read, self.retention_start())
+        # Source codes of the file, translated to the codes of this history.
+        translate = np.array([self._source_code(name) for name in names], dtype=np.uint8)
+        for coin_id, (timestamps, prices, codes) in loaded.items():
+            if coin_id in self.series:
+                # Points recorded before the load: merged one at a time, as they would have been recorded.
+                for timestamp, price, code in zip(timestamps.tolist(), prices.tolist(), codes.tolist()):
+                    self.record(coin_id, price, names[code], timestamp)
+            else:
+                self.series[coin_id] = PriceSeries.from_arrays(timestamps, prices, translate[codes], self.capacity)
+        # Reloaded points are already in the database.
+        self._flushed = {coin_id: series.appended for coin_id, series in self.series.items()}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Error while flushing the price history: %s", e)
+
+    def start(self):
+        if self.db_path is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops the flush task and writes the remaining points."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Error while flushing the price history: %s", e)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "coins": len(self.series),
+            "points": sum(series.length for series in self.series.values()),
+            "resolution_seconds": self.resolution,
+            "persistent": self.db_path is not None,
+            "flushes": self.flushes,
+            "last_error": self.last_error,
+        }
+
+
+price_history = PriceHistory()
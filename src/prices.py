@@ -0,0 +1,106 @@
+"""
+Bulk price resolution for many coins at once.
+
+Tradable coins are priced from Binance with a single multi-symbol request, and
+everything else (non-tradable coins, and tradable coins Binance could not price)
+is priced from CoinGecko with chunked multi-id requests. The per-coin fallback
+semantics are the same as the single-coin `/api/price` endpoint, and so is the
+price cache: prices from the live Binance price book and fresh cached prices
+are used as is, and only the misses go upstream.
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+from src.binance_client import get_prices_from_binance
+from src.binance_stream import price_book
+from src.coingecko_client import get_prices_from_coingecko
+from src.metrics import price_fallbacks
+from src.price_cache import CacheResult, price_cache
+from src.price_history import price_history
+from src.upstream_health import upstream_health
+
+SOURCE_BINANCE = "Binance"
+SOURCE_COINGECKO = "CoinGecko"
+SOURCE_BINANCE_FALLBACK = "Binance (fallback CoinGecko)"
+
+
+def binance_pair(symbol: str) -> str:
+    """Returns the Binance USDC pair for a coin symbol, e.g. 'btc' -> 'BTCUSDC'."""
+    return f"{symbol.upper()}USDC"
+
+
+async def _fetch_missing(source: str, keys, fetch_many) -> Dict[str, CacheResult]:
+    """Returns cached results for `keys`, fetching the misses in bulk and caching them."""
+    results = await price_cache.get_many(source, keys)
+    missing = set(keys) - set(results)
+    if missing:
+        fetched = await fetch_many(missing)
+        await price_cache.put_many(source, fetched)
+        for key, price in fetched.items():
+            results[key] = CacheResult(price, False, 0.0)
+    return results
+
+
+async def _binance_prices(pairs) -> Tuple[Dict[str, CacheResult], Set[str]]:
+    """
+    Returns Binance prices for `pairs`, from the live price book first, then the cache
+    and the API, along with the set of pairs that were answered by the price book.
+    The API is skipped while Binance's circuit breaker is open.
+    """
+    results = {}
+    for pair in pairs:
+        streamed = price_book.get(pair)
+        if streamed is not None:
+            results[pair] = CacheResult(streamed[0], False, streamed[1])
+    streamed_pairs = set(results)
+    missing = set(pairs) - streamed_pairs
+    if upstream_health("binance").available():
+        results.update(await _fetch_missing("binance", missing, get_prices_from_binance))
+    else:
+        results.update(await price_cache.get_many("binance", missing))
+    return results, streamed_pairs
+
+
+async def resolve_prices(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Resolves the price of every `{symbol, coin_id, is_tradable}` item.
+    Returns one result per item, in the same order, with `price` and `source`
+    set to None when no source could price the coin.
+    """
+    tradable_pairs = {binance_pair(item['symbol']) for item in items if item['is_tradable']}
+    binance_prices, streamed_pairs = await _binance_prices(tradable_pairs)
+
+    missing_ids = {
+        item['coin_id'] for item in items
+        if not item['is_tradable'] or binance_pair(item['symbol']) not in binance_prices
+    }
+    coingecko_prices = await _fetch_missing("coingecko", missing_ids, get_prices_from_coingecko)
+
+    results = []
+    for item in items:
+        result = None
+        source = None
+        streamed = False
+        if item['is_tradable']:
+            pair = binance_pair(item['symbol'])
+            result = binance_prices.get(pair)
+            if result is not None:
+                source = SOURCE_BINANCE
+                streamed = pair in streamed_pairs
+        if result is None:
+            result = coingecko_prices.get(item['coin_id'])
+            if result is not None:
+                source = SOURCE_BINANCE_FALLBACK if item['is_tradable'] else SOURCE_COINGECKO
+            if item['is_tradable']:
+                price_fallbacks.inc("binance", "coingecko" if result is not None else "none")
+        results.append({
+            "symbol": item['symbol'],
+            "coin_id": item['coin_id'],
+            "price": result.value if result else None,
+            "source": source,
+            "cached": result.cached if result else False,
+            "age_seconds": round(result.age, 3) if result else None,
+            "streamed": streamed,
+        })
+    price_history.record_results(results)
+    return results
@@ -0,0 +1,220 @@
+"""
+Risk engine for lending positions: values, LTV, health factor and risk level of many
+positions at once, from our own prices, and under "what-if" price shocks.
+
+Positions use the Jupiter Lend fields (`collateral`, `collateralValue`, `borrowed`,
+`borrowValue`, and optionally `collateralAmount`, `borrowAmount` and
+`liquidationThreshold`, in percent). A position with token amounts is revalued with the
+prices we resolve (see `src/prices.py`); one without keeps its reported values. Every
+computation is a vectorized NumPy pass over all positions, and over all scenarios at
+once: a scenario is a set of relative price shocks by symbol, e.g. `{"SOL": -20}`.
+
+Configuration through environment variables:
+    RISK_LIQUIDATION_THRESHOLD    default liquidation threshold, in percent (default 85)
+    RISK_RISKY_HEALTH_FACTOR      health factor under which a position is "risky" (default 1.5)
+    RISK_CRITICAL_HEALTH_FACTOR   health factor under which it is "critical" (default 1.1)
+"""
+
+import os
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.prices import resolve_prices
+
+LIQUIDATION_THRESHOLD = float(os.environ.get("RISK_LIQUIDATION_THRESHOLD", 85))
+RISKY_HEALTH_FACTOR = float(os.environ.get("RISK_RISKY_HEALTH_FACTOR", 1.5))
+CRITICAL_HEALTH_FACTOR = float(os.environ.get("RISK_CRITICAL_HEALTH_FACTOR", 1.1))
+
+RISK_LEVELS = np.array(["safe", "risky", "critical"], dtype=object)
+
+
+def _number(position: Dict[str, Any], field: str, default: float = np.nan) -> float:
+    value = position.get(field)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid '{field}' in position: {value!r}")
+
+
+def _rounded(values: np.ndarray, digits: int) -> List[Optional[float]]:
+    """Rounds to a list, with None for infinite or unknown values (not representable in JSON)."""
+    rounded = np.round(values, digits)
+    result = rounded.tolist()
+    for index in np.flatnonzero(~np.isfinite(rounded)).tolist():
+        result[index] = None
+    return result
+
+
+def health(collateral_value: np.ndarray, borrow_value: np.ndarray, threshold: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns `(ltv, health_factor)`, element-wise: the LTV in percent and the health factor
+    `collateral * threshold / borrow`, infinite for positions without borrow.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ltv = np.where(borrow_value > 0, borrow_value / collateral_value * 100, 0.0)
+        health_factor = np.where(borrow_value > 0, collateral_value * threshold / borrow_value, np.inf)
+    return ltv, health_factor
+
+
+def risk_codes(health_factor: np.ndarray) -> np.ndarray:
+    """0 (safe), 1 (risky) or 2 (critical) for each health factor, see `RISK_LEVELS`."""
+    return np.select([health_factor < CRITICAL_HEALTH_FACTOR, health_factor < RISKY_HEALTH_FACTOR], [2, 1], 0)
+
+
+class PositionBook:
+    """Lending positions as columns, with their tokens indexed in `symbols` (upper case)."""
+
+    def __init__(self, positions: Sequence[Dict[str, Any]]):
+        self.positions = positions
+        self.symbols: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        count = len(positions)
+        self.collateral_index = np.empty(count, dtype=np.intp)
+        self.borrow_index = np.empty(count, dtype=np.intp)
+        self.collateral_amount = np.empty(count)
+        self.borrow_amount = np.empty(count)
+        self.collateral_value = np.empty(count)
+        self.borrow_value = np.empty(count)
+        self.threshold = np.empty(count)
+        for i, position in enumerate(positions):
+            self.collateral_index[i] = self._index(position, "collateral")
+            self.borrow_index[i] = self._index(position, "borrowed")
+            self.collateral_amount[i] = _number(position, "collateralAmount")
+            self.borrow_amount[i] = _number(position, "borrowAmount")
+            self.collateral_value[i] = _number(position, "collateralValue", 0.0)
+            self.borrow_value[i] = _number(position, "borrowValue", 0.0)
+            self.threshold[i] = _number(position, "liquidationThreshold", LIQUIDATION_THRESHOLD) / 100
+
+    def _index(self, position: Dict[str, Any], field: str) -> int:
+        symbol = position.get(field) or ""
+        if not isinstance(symbol, str):
+            raise ValueError(f"Invalid '{field}' in position: {symbol!r}")
+        symbol = symbol.upper()
+        index = self._symbol_index.get(symbol)
+        if index is None:
+            index = self._symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return index
+
+    def price_vector(self, prices: Mapping[str, Optional[float]]) -> np.ndarray:
+        """Prices of `symbols`, NaN where unknown."""
+        return np.array([np.nan if prices.get(symbol) is None else prices[symbol] for symbol in self.symbols], dtype=np.float64)
+
+    def shock_matrix(self, scenarios: Sequence[Mapping[str, float]]) -> np.ndarray:
+        """Price multipliers of `symbols` (columns) for each scenario (rows) of shocks in percent."""
+        multipliers = np.ones((len(scenarios), len(self.symbols)))
+        for row, shocks in enumerate(scenarios):
+            for symbol, percent in shocks.items():
+                index = self._symbol_index.get(symbol.upper())
+                if index is not None:
+                    multipliers[row, index] = 1 + percent / 100
+        return multipliers
+
+    def _revalue(self, collateral_price: np.ndarray, borrow_price: np.ndarray):
+        revalued_collateral = np.isfinite(collateral_price) & np.isfinite(self.collateral_amount)
+        revalued_borrow = np.isfinite(borrow_price) & np.isfinite(self.borrow_amount)
+        collateral_value = np.where(revalued_collateral, self.collateral_amount * collateral_price, self.collateral_value)
+        borrow_value = np.where(revalued_borrow, self.borrow_amount * borrow_price, self.borrow_value)
+        return revalued_collateral, revalued_borrow, collateral_value, borrow_value
+
+    def health_factors(self, prices: Mapping[str, Optional[float]]) -> np.ndarray:
+        """Health factor of every position with `prices`, without building the full evaluation."""
+        price = self.price_vector(prices)
+        _, _, collateral_value, borrow_value = self._revalue(price[self.collateral_index], price[self.borrow_index])
+        return health(collateral_value, borrow_value, self.threshold)[1]
+
+    def evaluate(self, prices: Mapping[str, Optional[float]], scenarios: Sequence[Mapping[str, float]] = ()) -> Dict[str, Any]:
+        """
+        Revalues the positions with `prices` (by upper-case symbol) and computes their risk,
+        then the risk of every scenario. Returns the positions (their own fields, with the
+        recomputed ones), a summary, and per-scenario summaries and columns.
+        """
+        price = self.price_vector(prices)
+        collateral_price = price[self.collateral_index]
+        borrow_price = price[self.borrow_index]
+        revalued_collateral, revalued_borrow, collateral_value, borrow_value = self._revalue(collateral_price, borrow_price)
+
+        ltv, health_factor = health(collateral_value, borrow_value, self.threshold)
+        codes = risk_codes(health_factor)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Collateral price at which the health factor reaches 1, the borrow being unchanged.
+            liquidation_price = borrow_value / (self.collateral_amount * self.threshold)
+
+        columns = {
+            "collateralValue": _rounded(collateral_value, 2),
+            "borrowValue": _rounded(borrow_value, 2),
+            "ratio": _rounded(ltv, 2),
+            "healthFactor": _rounded(health_factor, 3),
+            "riskLevel": RISK_LEVELS[codes].tolist(),
+            "liquidationThreshold": _rounded(self.threshold * 100, 2),
+            "liquidationPrice": _rounded(liquidation_price, 6),
+            "collateralPrice": _rounded(collateral_price, 8),
+            "borrowPrice": _rounded(borrow_price, 8),
+            "revalued": (revalued_collateral | revalued_borrow).tolist(),
+        }
+        positions = [
+            {**position, **{name: column[i] for name, column in columns.items()}}
+            for i, position in enumerate(self.positions)
+        ]
+
+        result = {
+            "positions": positions,
+            "summary": _summaries(collateral_value[None, :], borrow_value[None, :], health_factor[None, :], codes[None, :])[0],
+            "scenarios": [],
+        }
+        if scenarios:
+            multipliers = self.shock_matrix(scenarios)
+            shocked_collateral = collateral_value * multipliers[:, self.collateral_index]
+            shocked_borrow = borrow_value * multipliers[:, self.borrow_index]
+            shocked_ltv, shocked_health = health(shocked_collateral, shocked_borrow, self.threshold)
+            shocked_codes = risk_codes(shocked_health)
+            summaries = _summaries(shocked_collateral, shocked_borrow, shocked_health, shocked_codes)
+            result["scenarios"] = [
+                {
+                    "shocks": dict(scenarios[row]),
+                    "summary": summaries[row],
+                    "ratio": _rounded(shocked_ltv[row], 2),
+                    "healthFactor": _rounded(shocked_health[row], 3),
+                    "riskLevel": RISK_LEVELS[shocked_codes[row]].tolist(),
+                }
+                for row in range(len(scenarios))
+            ]
+        return result
+
+
+def _summaries(collateral_value, borrow_value, health_factor, codes) -> List[Dict[str, Any]]:
+    """Summaries of each row of (scenarios x positions) matrices."""
+    total_collateral = collateral_value.sum(axis=1)
+    total_borrow = borrow_value.sum(axis=1)
+    min_health = health_factor.min(axis=1, initial=np.inf)
+    liquidatable = (health_factor < 1).sum(axis=1)
+    counts = [(codes == code).sum(axis=1) for code in range(len(RISK_LEVELS))]
+    return [
+        {
+            "totalCollateralValue": round(float(total_collateral[row]), 2),
+            "totalBorrowValue": round(float(total_borrow[row]), 2),
+            "minHealthFactor": round(float(min_health[row]), 3) if np.isfinite(min_health[row]) else None,
+            "liquidatable": int(liquidatable[row]),
+            "riskLevels": {str(level): int(counts[code][row]) for code, level in enumerate(RISK_LEVELS)},
+        }
+        for row in range(collateral_value.shape[0])
+    ]
+
+
+async def resolve_symbol_prices(symbols: Sequence[str], coins_by_symbol: Mapping[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolves the price of position tokens through `resolve_prices` (price book, cache,
+    Binance, CoinGecko), mapping each symbol to the best-ranked coin of the dataset with
+    that symbol. Symbols with no such coin are left out.
+    """
+    items = []
+    for symbol in symbols:
+        coin = coins_by_symbol.get(symbol.lower())
+        if coin is not None:
+            items.append({"symbol": symbol, "coin_id": coin['id'], "is_tradable": coin['is_tradable_on_binance_vs_usdc']})
+    if not items:
+        return {}
+    return {result['symbol']: result for result in await resolve_prices(items)}
@@ -0,0 +1,132 @@
+"""
+Market screener over the coin list: filters, sorting and top-k as NumPy array operations.
+
+`MarketTable` holds the market data of `MARKET_FIELDS` as one float64 column per field
+(NaN where CoinGecko had no value) plus the tradability flags. Read from the columnar data
+file, the columns are the file's memory-mapped arrays themselves, without any copy. A query
+builds one boolean mask over the whole universe, then selects the top `offset + limit` rows
+of the sort key with a partial sort (`np.partition`) and only sorts those, so a query costs a few passes over
+contiguous arrays instead of a Python loop over every coin dict.
+"""
+
+import math
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.dataset_diff import MARKET_FIELDS
+
+TRADABLE_FIELD = "is_tradable_on_binance_vs_usdc"
+
+OPERATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+    "==": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_FILTER = re.compile(r"^\s*([a-z0-9_]+)\s*(>=|<=|!=|==|>|<)\s*(\S+)\s*$")
+
+Filter = Tuple[str, str, float]
+
+
+class ScreenerError(ValueError):
+    """An unknown field or operator, or a value that is not a number."""
+
+
+def parse_filter(expression: str) -> Filter:
+    """Parses `field<op>value`, e.g. `total_volume>=1e6`, into `(field, op, value)`."""
+    match = _FILTER.match(expression)
+    if not match:
+        raise ScreenerError(f"invalid filter {expression!r}, expected field<op>value with op among {', '.join(OPERATORS)}")
+    field, op, raw_value = match.groups()
+    if field not in MARKET_FIELDS:
+        raise ScreenerError(f"unknown field {field!r}, expected one of {', '.join(MARKET_FIELDS)}")
+    try:
+        value = float(raw_value)
+    except ValueError:
+        raise ScreenerError(f"invalid value {raw_value!r} for {field}") from None
+    if math.isnan(value):
+        raise ScreenerError(f"invalid value {raw_value!r} for {field}")
+    return field, op, value
+
+
+class MarketTable:
+    """Column-oriented market data of one dataset version, aligned with its coin list."""
+
+    def __init__(self, coins: Sequence[Dict[str, Any]]):
+        self.coins = coins
+        self.count = len(coins)
+        if hasattr(coins, 'numbers'):
+            self.tradable = coins.flags(TRADABLE_FIELD)
+            self.columns = {field: self._mapped_column(coins, field) for field in MARKET_FIELDS}
+        else:
+            self.tradable = np.fromiter((bool(coin[TRADABLE_FIELD]) for coin in coins), dtype=np.bool_, count=self.count)
+            self.columns = {
+                field: np.fromiter((_number(coin.get(field)) for coin in coins), dtype=np.float64, count=self.count)
+                for field in MARKET_FIELDS
+            }
+
+    def _mapped_column(self, coins, field: str) -> np.ndarray:
+        column = coins.numbers(field)
+        # A file written before the market data was kept: the screener sees no values.
+        return np.full(self.count, np.nan) if column is None else column
+
+    def mask(self, filters: Sequence[Filter] = (), tradable: Optional[bool] = None) -> np.ndarray:
+        """Rows matching every filter. A coin without a value for a filtered field never matches."""
+        mask = np.ones(self.count, dtype=np.bool_)
+        if tradable is not None:
+            mask &= self.tradable if tradable else ~self.tradable
+        for field, op, value in filters:
+            column = self.columns[field]
+            matches = OPERATORS[op](column, value)
+            if op == "!=":
+                matches &= ~np.isnan(column)  # NaN != value is true; a missing value still fails.
+            mask &= matches
+        return mask
+
+    def screen(
+        self,
+        filters: Sequence[Filter] = (),
+        tradable: Optional[bool] = None,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        The coins matching `filters`, sorted by `sort` (missing values last) or else in the
+        order of the coin list (market cap), and the total number of matches.
+        """
+        if sort is not None and sort not in MARKET_FIELDS:
+            raise ScreenerError(f"unknown sort field {sort!r}, expected one of {', '.join(MARKET_FIELDS)}")
+        positions = np.flatnonzero(self.mask(filters, tradable))
+        total = len(positions)
+        end = min(offset + limit, total)
+        if offset >= end:
+            return [], total
+
+        if sort is None:
+            selected = positions[offset:end]
+        else:
+            key = self.columns[sort][positions]
+            if descending:
+                key = -key
+            key = np.where(np.isnan(key), np.inf, key)
+            if end < total:
+                # Only the first `end` rows are needed: keep the keys up to the end-th smallest
+                # (ties included, so that they stay in coin list order), and sort those alone.
+                threshold = np.partition(key, end - 1)[end - 1]
+                top = np.flatnonzero(key <= threshold)
+                top = top[np.argsort(key[top], kind='stable')]
+            else:
+                top = np.argsort(key, kind='stable')
+            selected = positions[top[offset:end]]
+        return [self.coins[int(position)] for position in selected], total
+
+
+def _number(value: Any) -> float:
+    return math.nan if value is None else float(value)
@@ -0,0 +1,188 @@
+"""
+Search indexes over the coin list, built once when the data is loaded.
+
+`PrefixIndex` answers "name or symbol starts with" queries with a binary search over a
+sorted array of lowercased names and symbols, instead of lowercasing and scanning every
+coin on each request. `FuzzyIndex` answers typo-tolerant queries from a trigram index.
+"""
+
+import heapq
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Prefixes up to this length have their sorted matches memoized.
+SHORT_PREFIX_LENGTH = 2
+
+
+class PrefixIndex:
+    """
+    Sorted array of `(lowercased key, position)` pairs over coin names and symbols.
+    A coin's position in the list is its market-cap rank, since the data file is
+    saved in market-cap order.
+    """
+
+    def __init__(self, coins: Sequence[Dict[str, Any]]):
+        self.coins = coins
+        entries: List[Tuple[str, int]] = []
+        self._by_symbol: Dict[str, List[int]] = {}
+        for position, coin in enumerate(coins):
+            name = coin['name'].lower()
+            symbol = coin['symbol'].lower()
+            self._by_symbol.setdefault(symbol, []).append(position)
+            entries.append((name, position))
+            if symbol != name:
+                entries.append((symbol, position))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._positions = [position for _, position in entries]
+        # Sorted matches of one- and two-letter prefixes, which match a large share of
+        # the universe and are typed on every new search; filled on first use.
+        self._short_prefixes: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return len(self.coins)
+
+    def _matching_positions(self, prefix: str) -> set:
+        start = bisect_left(self._keys, prefix)
+        # Every key starting with `prefix` sorts before `prefix + U+10FFFF`.
+        end = bisect_left(self._keys, prefix + "\U0010ffff", lo=start)
+        return set(self._positions[start:end])
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Returns the coins whose name or symbol starts with `query` (case-insensitive),
+        exact symbol matches first and then by market-cap rank, along with the total
+        number of matches before `limit`/`offset` are applied.
+        """
+        prefix = query.lower()
+        exact = self._by_symbol.get(prefix, [])
+
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            ranked = self._short_prefixes.get(prefix)
+            if ranked is None:
+                ranked = self._short_prefixes[prefix] = sorted(self._matching_positions(prefix))
+            positions = ranked
+        elif limit is None:
+            positions = self._matching_positions(prefix)
+            ranked = sorted(positions)
+        else:
+            positions = self._matching_positions(prefix)
+            # Only the best `offset + limit` positions are needed, which heapq finds
+            # without sorting every match of a short prefix.
+            ranked = heapq.nsmallest(offset + limit + len(exact), positions)
+        exact_set = set(exact)
+        ordered = exact + [position for position in ranked if position not in exact_set]
+        end = None if limit is None else offset + limit
+        return [self.coins[position] for position in ordered[offset:end]], len(positions)
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Levenshtein distance between `a` and `b`, or `max_distance + 1` as soon as it is
+    known to exceed `max_distance` (only a diagonal band of the matrix is computed).
+    """
+    if a == b:
+        return 0
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    width = len(b)
+    previous = list(range(width + 1))
+    for i, char in enumerate(a, 1):
+        low = i - max_distance if i > max_distance else 1
+        high = i + max_distance if i + max_distance < width else width
+        current = [too_far] * (width + 1)
+        current[0] = i
+        left = current[low - 1]
+        row_min = left
+        for j in range(low, high + 1):
+            # Comparisons inline rather than min(): this loop is the hot path of fuzzy search.
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if left + 1 < value:
+                value = left + 1
+            current[j] = left = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return too_far
+        previous = current
+    return previous[width] if previous[width] < too_far else too_far
+
+
+def max_typos(query: str) -> int:
+    """Number of typos tolerated for a query of this length."""
+    if len(query) <= 4:
+        return 1
+    if len(query) <= 8:
+        return 2
+    return 3
+
+
+class FuzzyIndex:
+    """
+    Typo-tolerant search over coin names and symbols.
+    A trigram inverted index narrows the universe down to the keys sharing the most
+    trigrams with the query, and only those candidates are scored with a bounded edit
+    distance, either against the whole key or against its prefix of the query's length
+    (so that partially typed, misspelled names still match).
+    """
+
+    def __init__(self, coins: Sequence[Dict[str, Any]], candidates: int = 32):
+        self.coins = coins
+        self.candidates = candidates
+        key_positions: Dict[str, List[int]] = {}
+        for position, coin in enumerate(coins):
+            for key in {coin['name'].lower(), coin['symbol'].lower()}:
+                key_positions.setdefault(key, []).append(position)
+        self._keys = list(key_positions)
+        self._key_positions = [key_positions[key] for key in self._keys]
+        self._postings: Dict[str, List[int]] = {}
+        for key_id, key in enumerate(self._keys):
+            for trigram in _trigrams(key):
+                self._postings.setdefault(trigram, []).append(key_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Returns up to `limit` coins, closest matches first, then by market-cap rank."""
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        query_trigrams = _trigrams(query)
+        overlap: Dict[int, int] = {}
+        for trigram in query_trigrams:
+            for key_id in self._postings.get(trigram, ()):
+                overlap[key_id] = overlap.get(key_id, 0) + 1
+
+        budget = max_typos(query)
+        # Each edit destroys at most three trigrams, so a key within `budget` edits
+        # shares at least this many trigrams with the query (the q-gram filter).
+        min_overlap = max(1, len(query_trigrams) - 3 * budget)
+        overlap = {key_id: count for key_id, count in overlap.items() if count >= min_overlap}
+        if not overlap:
+            return []
+        candidates = heapq.nlargest(self.candidates, overlap, key=overlap.__getitem__)
+
+        best: Dict[int, Tuple[int, int]] = {}
+        for key_id in candidates:
+            key = self._keys[key_id]
+            distance = bounded_edit_distance(query, key, budget)
+            # A match on the key's prefix ranks just behind a whole-key match of the same distance.
+            scores = [(distance, 0)]
+            if distance > 0 and len(key) > len(query):
+                scores.append((bounded_edit_distance(query, key[:len(query)], budget), 1))
+            score = min(scores)
+            if score[0] > budget:
+                continue
+            for position in self._key_positions[key_id]:
+                if position not in best or score < best[position]:
+                    best[position] = score
+
+        ranked = sorted(best, key=lambda position: (best[position], position))
+        return [self.coins[position] for position in ranked[:limit]]
@@ -0,0 +1,396 @@
+"""
+State shared by the worker processes of a multi-worker deployment (`python run.py --workers N`).
+
+Each uvicorn worker is a separate process: without help, each one keeps its own refresh
+progress, can start its own refresh and fills its own price cache. When SHARED_STATE_DB is
+set (run.py sets it in multi-worker mode), the workers share through one SQLite database on
+local disk, in WAL mode so that readers never block the writer:
+
+- leases (`acquire`, `renew`, `release`): the refresh lock, so that a single worker runs a
+  refresh at a time, and the leadership of the background jobs that must run once (the
+  alert scheduler). A lease expires when its holder stops renewing it, e.g. a killed worker,
+  so a lock is never left behind.
+- versioned JSON values (`set_value`, `get_value`): the refresh progress, which every worker
+  serves and relays to its Server-Sent Events subscribers (see `SharedStateSync`).
+- the wallets registered for liquidation alerts (`add_wallets`, `remove_wallet`, `wallets`),
+  whichever worker registered them, and the alerts the leader emitted (`add_alert`,
+  `alerts_since`), which every worker relays like the progress.
+- prices: a second level of the in-process price cache (see `src/price_cache.py`), so that a
+  price fetched by one worker is reused by the others, with fetch claims that make the other
+  workers wait for an in-flight upstream request instead of repeating it.
+
+Every operation is one short local transaction. The event loop never runs them itself: it hands
+them to the state's own thread (`offload`, `submit`), which keeps one connection and runs them in
+order, so a lock held by another worker (up to the 1 s busy timeout) never stalls requests. A failing one (e.g. the database stayed locked
+longer than the busy timeout) is logged and treated as a miss, so that a worker falls back to
+its own state rather than failing requests.
+
+Configuration through environment variables:
+    SHARED_STATE_DB        SQLite file shared by the workers ("" (default): single process, nothing shared)
+    SHARED_LEASE_TTL       seconds a lease stays valid without being renewed (default 30)
+    SHARED_FETCH_WAIT      seconds a worker waits for another worker's in-flight fetch (default 2)
+    SHARED_SYNC_INTERVAL   seconds between two checks of the shared progress and leadership (default 0.5)
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get("SHARED_STATE_DB", "")
+LEASE_TTL = float(os.environ.get("SHARED_LEASE_TTL", 30))
+FETCH_WAIT = float(os.environ.get("SHARED_FETCH_WAIT", 2))
+SYNC_INTERVAL = float(os.environ.get("SHARED_SYNC_INTERVAL", 0.5))
+
+# Identifies this worker as the owner of leases and the writer of values.
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+REFRESH_LOCK = "refresh"
+LEADER_LEASE = "leader"
+PROGRESS_KEY = "refresh-progress"
+
+# SQLite's historical limit on the number of bound parameters of a statement.
+MAX_VARIABLES = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS kv (name TEXT PRIMARY KEY, version INTEGER NOT NULL, writer TEXT, value TEXT);
+CREATE TABLE IF NOT EXISTS prices (
+    source TEXT NOT NULL, key TEXT NOT NULL, value REAL NOT NULL, fetched_at REAL NOT NULL,
+    PRIMARY KEY (source, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS alert_wallets (wallet TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS alerts (seq INTEGER PRIMARY KEY AUTOINCREMENT, writer TEXT, event TEXT NOT NULL);
+"""
+
+
+class SharedState:
+    """Leases, versioned values and prices in a SQLite file shared by the worker processes."""
+
+    def __init__(self, path: str, lease_ttl: float = LEASE_TTL, owner: str = PROCESS_ID,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.owner = owner
+        self.clock = clock
+        self.errors = 0
+        # sqlite3 connections belong to the thread that opened them (the state thread, the refresh thread).
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self._connection().executescript(SCHEMA)
+
+    async def offload(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs a blocking operation (e.g. `self.get_prices`) on the state thread and awaits its result."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> Future:
+        """Queues a blocking operation on the state thread without waiting for it (e.g. a write)."""
+        return self._executor.submit(function, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit: every statement is its own short transaction.
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()) -> Optional[sqlite3.Cursor]:
+        try:
+            return self._connection().execute(sql, tuple(params))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Shared state operation failed: %s", e)
+            return None
+
+    # Leases
+
+    def acquire(self, name: str, owner: Optional[str] = None, ttl: Optional[float] = None) -> bool:
+        """Takes (or renews) the lease `name` if it is free, expired or already held by `owner`."""
+        owner = owner or self.owner
+        now = self.clock()
+        cursor = self._execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+            (name, owner, now + (ttl or self.lease_ttl), now),
+        )
+        return cursor is not None and cursor.rowcount == 1
+
+    def renew(self, name: str, owner: Optional[str] = None, ttl: Optional[float] = None) -> bool:
+        """Extends a lease still held by `owner`. Returns False when it was lost."""
+        cursor = self._execute(
+            "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+            (self.clock() + (ttl or self.lease_ttl), name, owner or self.owner),
+        )
+        return cursor is not None and cursor.rowcount == 1
+
+    def release(self, name: str, owner: Optional[str] = None):
+        self._execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner or self.owner))
+
+    def holder(self, name: str) -> Optional[str]:
+        """Returns the owner of an unexpired lease, or None."""
+        cursor = self._execute("SELECT owner FROM leases WHERE name = ? AND expires_at >= ?", (name, self.clock()))
+        row = cursor.fetchone() if cursor is not None else None
+        return row[0] if row else None
+
+    @contextmanager
+    def held(self, name: str, owner: Optional[str] = None):
+        """
+        Keeps an acquired lease renewed from a background thread for the duration of the
+        block, then releases it. For work that outlives the lease TTL (a refresh).
+        """
+        owner = owner or self.owner
+        done = threading.Event()
+
+        def keep_renewed():
+            while not done.wait(self.lease_ttl / 3):
+                if not self.renew(name, owner):
+                    logger.warning("Lost the shared lease '%s'.", name)
+
+        thread = threading.Thread(target=keep_renewed, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+            self.release(name, owner)
+
+    # Versioned values
+
+    def set_value(self, name: str, value: Any) -> Optional[int]:
+        """Stores a JSON-serializable value and returns its new version."""
+        cursor = self._execute(
+            "INSERT INTO kv (name, version, writer, value) VALUES (?, 1, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET version = kv.version + 1, writer = excluded.writer, value = excluded.value "
+            "RETURNING version",
+            (name, self.owner, json.dumps(value)),
+        )
+        row = cursor.fetchone() if cursor is not None else None
+        return row[0] if row else None
+
+    def get_value(self, name: str) -> Optional[Tuple[int, str, Any]]:
+        """Returns `(version, writer, value)`, or None when the value was never set."""
+        cursor = self._execute("SELECT version, writer, value FROM kv WHERE name = ?", (name,))
+        row = cursor.fetchone() if cursor is not None else None
+        return (row[0], row[1], json.loads(row[2])) if row else None
+
+    # Prices
+
+    def get_prices(self, source: str, keys: Iterable[Hashable], max_age: float) -> Dict[Hashable, Tuple[float, float]]:
+        """Returns `{key: (price, age)}` for the keys with a price fetched less than `max_age` seconds ago."""
+        keys = list(keys)
+        now = self.clock()
+        found = {}
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            by_text = {str(key): key for key in chunk}
+            cursor = self._execute(
+                f"SELECT key, value, fetched_at FROM prices WHERE source = ? AND fetched_at >= ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                (source, now - max_age, *by_text),
+            )
+            for key, value, fetched_at in (cursor.fetchall() if cursor is not None else ()):
+                found[by_text[key]] = (value, max(now - fetched_at, 0.0))
+        return found
+
+    def put_prices(self, source: str, prices: Dict[Hashable, float]):
+        now = self.clock()
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "INSERT OR REPLACE INTO prices (source, key, value, fetched_at) VALUES (?, ?, ?, ?)",
+                    [(source, str(key), value, now) for key, value in prices.items()],
+                )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Could not share %d %s prices: %s", len(prices), source, e)
+
+    async def wait_for_price(self, source: str, key: Hashable, max_age: float,
+                             timeout: float = FETCH_WAIT, poll: float = 0.05) -> Tuple[Optional[Tuple[float, float]], bool]:
+        """
+        Waits for the price another worker is fetching. Returns `(price and age, claimed)`:
+        the price as soon as it is shared, or, when the other worker released or lost its claim
+        without sharing one, None and whether this worker got the claim instead.
+        """
+        claim = f"fetch:{source}:{key}"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+            found, claimed = await self.offload(self._price_or_claim, source, key, max_age, claim, timeout)
+            if found is not None or claimed:
+                return found, claimed
+        return None, False
+
+    def _price_or_claim(self, source: str, key: Hashable, max_age: float, claim: str,
+                        ttl: float) -> Tuple[Optional[Tuple[float, float]], bool]:
+        found = self.get_prices(source, [key], max_age).get(key)
+        if found is not None:
+            return found, False
+        return None, self.acquire(claim, ttl=ttl)
+
+    # Alerts
+
+    def add_wallets(self, wallets: Iterable[str]) -> List[str]:
+        """Registers wallets for the alerts. Returns the ones that were not registered yet."""
+        added = []
+        for wallet in wallets:
+            cursor = self._execute("INSERT OR IGNORE INTO alert_wallets (wallet) VALUES (?)", (wallet,))
+            if cursor is not None and cursor.rowcount == 1:
+                added.append(wallet)
+        return added
+
+    def remove_wallet(self, wallet: str) -> bool:
+        cursor = self._execute("DELETE FROM alert_wallets WHERE wallet = ?", (wallet,))
+        return cursor is not None and cursor.rowcount == 1
+
+    def wallets(self) -> Optional[List[str]]:
+        """The registered wallets, or None when they could not be read (not: no wallet)."""
+        cursor = self._execute("SELECT wallet FROM alert_wallets ORDER BY wallet")
+        return [row[0] for row in cursor.fetchall()] if cursor is not None else None
+
+    def add_alert(self, event: Dict[str, Any], keep: int = 100):
+        """Shares an emitted alert, keeping the `keep` most recent ones."""
+        cursor = self._execute("INSERT INTO alerts (writer, event) VALUES (?, ?)", (self.owner, json.dumps(event)))
+        if cursor is not None:
+            self._execute("DELETE FROM alerts WHERE seq <= ?", (cursor.lastrowid - keep,))
+
+    def alerts_since(self, seq: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Returns the `(seq, writer, event)` of the alerts shared after `seq`, oldest first."""
+        cursor = self._execute("SELECT seq, writer, event FROM alerts WHERE seq > ? ORDER BY seq", (seq,))
+        return [(row[0], row[1], json.loads(row[2])) for row in cursor.fetchall()] if cursor is not None else []
+
+    def reset(self):
+        """
+        Clears the leases, values and alerts left by a previous run (e.g. the refresh lock of a
+        killed worker and its progress), before the workers of a new run start. Prices are kept:
+        their age is checked on every read.
+        """
+        for table in ("leases", "kv", "alert_wallets", "alerts"):
+            self._execute(f"DELETE FROM {table}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "owner": self.owner,
+            "refresh_lock": self.holder(REFRESH_LOCK),
+            "leader": self.holder(LEADER_LEASE),
+            "errors": self.errors,
+        }
+
+
+def progress_writer(state: SharedState, min_interval: float = 0.25) -> Callable[[Dict[str, Any]], None]:
+    """
+    Returns a `ProgressState` listener sharing the refresh progress: every status or stage
+    change is written, and other changes (the current item) at most every `min_interval`.
+    Writes are queued on the state thread, in order, without waiting for them.
+    """
+    last = {"written_at": 0.0, "key": None}
+
+    def listener(snapshot: Dict[str, Any]):
+        key = (snapshot.get("status"), snapshot.get("stage"))
+        now = time.monotonic()
+        if key == last["key"] and now - last["written_at"] < min_interval:
+            return
+        last["key"] = key
+        last["written_at"] = now
+        # Queued on the state thread: the listener also runs on the event loop (e.g. `start_refresh`).
+        state.submit(state.set_value, PROGRESS_KEY, snapshot)
+
+    return listener
+
+
+class SharedStateSync:
+    """
+    Background loop of every worker of a multi-worker deployment: relays the refresh progress
+    written by other workers to `on_progress`, and competes for the leader lease, calling
+    `on_leadership(True)` when this worker becomes the leader and `on_leadership(False)` when
+    it loses the lease. When given, `on_wallets` receives the registered alert wallets and
+    `on_alert` each alert emitted by another worker.
+    """
+
+    def __init__(self, state: SharedState, on_progress: Callable[[Any], None],
+                 on_leadership: Callable[[bool], Awaitable[None]], interval: float = SYNC_INTERVAL,
+                 on_wallets: Optional[Callable[[List[str]], None]] = None,
+                 on_alert: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.state = state
+        self.on_progress = on_progress
+        self.on_leadership = on_leadership
+        self.interval = interval
+        self.on_wallets = on_wallets
+        self.on_alert = on_alert
+        self.is_leader = False
+        self.progress_version = 0
+        self.alert_seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync(self):
+        found = await self.state.offload(self.state.get_value, PROGRESS_KEY)
+        if found is not None and found[0] != self.progress_version:
+            version, writer, value = found
+            self.progress_version = version
+            # This worker's own progress was already published when it changed.
+            if writer != self.state.owner:
+                self.on_progress(value)
+
+        if self.on_wallets is not None:
+            wallets = await self.state.offload(self.state.wallets)
+            if wallets is not None:
+                self.on_wallets(wallets)
+        if self.on_alert is not None:
+            for seq, writer, event in await self.state.offload(self.state.alerts_since, self.alert_seq):
+                self.alert_seq = seq
+                if writer != self.state.owner:
+                    self.on_alert(event)
+
+        is_leader = await self.state.offload(self.state.acquire, LEADER_LEASE)
+        if is_leader != self.is_leader:
+            self.is_leader = is_leader
+            logger.info("This worker %s the leader.", "is now" if is_leader else "is no longer")
+            await self.on_leadership(is_leader)
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error while syncing the shared state: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self.state.offload(self.state.release, LEADER_LEASE)
+            await self.on_leadership(False)
+
+
+shared_state = SharedState(DB_PATH) if DB_PATH else None
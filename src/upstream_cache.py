@@ -0,0 +1,381 @@
+"""
+Persistent, content-addressed cache of upstream responses, for outages, offline work and
+deterministic benchmarks.
+
+`CachingTransport` wraps the transport of an upstream client (see `build_client` in
+`src/http_clients.py`) and stores every successful GET response on disk: the bodies as files
+named by their SHA-256 (identical bodies, e.g. an unchanged exchangeInfo, are stored once),
+and an index of requests in SQLite. A request is identified by its upstream, method, path and
+sorted query parameters, not by its host, so recordings made against the real APIs replay
+against local stubs and back. The cache works in one of these modes:
+
+    record    every request goes upstream and its response is stored; when the upstream fails
+              (transport error, open circuit, 5xx, 429, 403/418/451) a stored response not
+              older than UPSTREAM_CACHE_MAX_STALE is served instead
+    cache     as record, but a stored response younger than its upstream's TTL is served
+              without any request, and an older one is served at once while a background
+              request revalidates it (stale-while-revalidate)
+    replay    only stored responses are served, whatever their age, and nothing goes upstream:
+              a request that was never recorded gets a 504 (as HTTP's `only-if-cached`), so the
+              updater and the price endpoints run from recorded data, at full speed and
+              without rate limits
+
+Every served response carries an `X-Upstream-Cache` header (hit, stale, replay, miss). The
+bodies are bounded by UPSTREAM_CACHE_MAX_MB: the least recently used responses are evicted
+first, along with any response older than UPSTREAM_CACHE_MAX_STALE.
+
+Configuration through environment variables:
+    UPSTREAM_CACHE_MODE        off (default), record, cache or replay
+    UPSTREAM_CACHE_DIR         directory of the cache (default: upstream_cache in DATA_DIR)
+    UPSTREAM_CACHE_MAX_MB      size bound of the stored bodies, in MiB (default 256)
+    UPSTREAM_CACHE_TTL         seconds a stored response is fresh in cache mode (default 30)
+    <NAME>_CACHE_TTL           the same for one upstream, e.g. COINGECKO_CACHE_TTL
+    UPSTREAM_CACHE_MAX_STALE   seconds a stored response may still be served stale (default 7 days)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import httpx
+
+from src.dataset import atomic_write
+from src.metrics import upstream_cache_lookups
+from src.upstream_health import is_failure
+
+logger = logging.getLogger(__name__)
+
+OFF, RECORD, CACHE, REPLAY = "off", "record", "cache", "replay"
+MODES = (OFF, RECORD, CACHE, REPLAY)
+
+CACHE_MODE = os.environ.get("UPSTREAM_CACHE_MODE", OFF)
+CACHE_DIR = os.environ.get("UPSTREAM_CACHE_DIR") or os.path.join(
+    os.environ.get("DATA_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upstream_cache")
+CACHE_MAX_BYTES = int(float(os.environ.get("UPSTREAM_CACHE_MAX_MB", 256)) * 1024 * 1024)
+CACHE_TTL = float(os.environ.get("UPSTREAM_CACHE_TTL", 30))
+CACHE_MAX_STALE = float(os.environ.get("UPSTREAM_CACHE_MAX_STALE", 7 * 24 * 3600))
+
+CACHE_HEADER = "X-Upstream-Cache"
+# Headers that describe the transfer rather than the content: the stored body is decoded.
+TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+# Once over the size bound, evict down to this share of it, so that eviction does not run on every store.
+EVICTION_TARGET = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY, upstream TEXT NOT NULL, method TEXT NOT NULL, url TEXT NOT NULL,
+    status INTEGER NOT NULL, headers TEXT NOT NULL, body TEXT NOT NULL,
+    stored_at REAL NOT NULL, used_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+CREATE INDEX IF NOT EXISTS responses_body ON responses (body);
+CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A stored response: its index entry, the body being read from its file on demand."""
+    key: str
+    upstream: str
+    url: str
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body_hash: str
+    stored_at: float
+
+
+def request_key(upstream: str, method: str, url: Union[str, httpx.URL]) -> str:
+    """Identifies a request by upstream, method, path and sorted query parameters (not by host)."""
+    url = httpx.URL(url)
+    query = sorted(url.params.multi_items())
+    return hashlib.sha256(json.dumps([upstream, method.upper(), url.path, query]).encode()).hexdigest()
+
+
+class UpstreamCache:
+    """The on-disk store: an SQLite index of responses and a directory of content-addressed bodies."""
+
+    def __init__(self, directory: str, mode: str = CACHE, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL,
+                 max_stale: float = CACHE_MAX_STALE, ttls: Optional[Dict[str, float]] = None,
+                 clock: Callable[[], float] = time.time):
+        if mode not in MODES:
+            raise ValueError(f"Unknown upstream cache mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.default_ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.max_stale = max_stale
+        self.clock = clock
+        self.counts: Dict[str, int] = {}
+        self.evictions = 0
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        # sqlite3 connections belong to the thread that opened them (the event loop, the refresh thread).
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        self.total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _body_path(self, body_hash: str) -> str:
+        return os.path.join(self.directory, "bodies", body_hash[:2], body_hash)
+
+    def ttl(self, upstream: str) -> float:
+        return self.ttls.get(upstream, self.default_ttl)
+
+    def age(self, entry: CachedResponse) -> float:
+        return max(self.clock() - entry.stored_at, 0.0)
+
+    def count(self, upstream: str, result: str):
+        self.counts[result] = self.counts.get(result, 0) + 1
+        upstream_cache_lookups.inc(upstream, result)
+
+    def lookup(self, upstream: str, method: str, url: Union[str, httpx.URL]) -> Optional[CachedResponse]:
+        """The stored response of a request, whatever its age, or None."""
+        key = request_key(upstream, method, url)
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT url, status, headers, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (self.clock(), key))
+        url, status, headers, body_hash, stored_at = row
+        return CachedResponse(key, upstream, url, status, [tuple(pair) for pair in json.loads(headers)], body_hash, stored_at)
+
+    def load(self, upstream: str, method: str, url: Union[str, httpx.URL]) -> Tuple[Optional[CachedResponse], Optional[bytes]]:
+        """
+        `lookup` and `servable_body` in one blocking call, for a worker thread. In record mode the
+        request goes upstream anyway: the body is not read, only when the upstream fails.
+        """
+        entry = self.lookup(upstream, method, url)
+        if entry is None or self.mode == RECORD:
+            return entry, None
+        return entry, self.servable_body(entry)
+
+    def servable_body(self, entry: CachedResponse) -> Optional[bytes]:
+        """The body of `entry` if it may be served (in replay mode, or not older than `max_stale`), else None."""
+        if self.mode != REPLAY and self.age(entry) >= self.max_stale:
+            return None
+        return self.read_body(entry)
+
+    def read_body(self, entry: CachedResponse) -> Optional[bytes]:
+        """The body of a stored response, or None if its file is gone (e.g. removed by hand)."""
+        try:
+            with open(self._body_path(entry.body_hash), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, upstream: str, method: str, url: Union[str, httpx.URL], status_code: int,
+              headers: List[Tuple[str, str]], body: bytes):
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        now = self.clock()
+        with self._lock:
+            connection = self._connection()
+            if connection.execute("SELECT 1 FROM bodies WHERE hash = ?", (body_hash,)).fetchone() is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with atomic_write(path, "wb") as f:
+                    f.write(body)
+                connection.execute("INSERT INTO bodies (hash, size) VALUES (?, ?)", (body_hash, len(body)))
+                self.total_bytes += len(body)
+            key = request_key(upstream, method, url)
+            previous = connection.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, upstream, method, url, status, headers, body, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, upstream, method.upper(), str(url), status_code,
+                 json.dumps([[name, value] for name, value in headers]), body_hash, now, now),
+            )
+            if previous is not None and previous[0] != body_hash:
+                self._drop_body_if_unused(previous[0])
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def _drop_body_if_unused(self, body_hash: str):
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM responses WHERE body = ? LIMIT 1", (body_hash,)).fetchone() is not None:
+            return
+        row = connection.execute("SELECT size FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+        connection.execute("DELETE FROM bodies WHERE hash = ?", (body_hash,))
+        if row is not None:
+            self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_path(body_hash))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drops the responses too old to be served, then the least recently used ones, down to the size bound."""
+        connection = self._connection()
+        expired = connection.execute(
+            "SELECT key, body FROM responses WHERE stored_at < ?", (self.clock() - self.max_stale,)).fetchall()
+        for key, body_hash in expired:
+            self._delete(key, body_hash)
+        target = self.max_bytes * EVICTION_TARGET
+        candidates = iter(connection.execute("SELECT key, body FROM responses ORDER BY used_at").fetchall())
+        while self.total_bytes > target:
+            victim = next(candidates, None)
+            if victim is None:
+                break
+            self._delete(*victim)
+
+    def _delete(self, key: str, body_hash: str):
+        cursor = self._connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+        if cursor.rowcount:
+            self.evictions += 1
+            self._drop_body_if_unused(body_hash)
+
+    def status(self) -> Dict[str, Any]:
+        entries = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "mode": self.mode,
+            "directory": self.directory,
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": {"default": self.default_ttl, **self.ttls},
+            "max_stale_seconds": self.max_stale,
+            "evictions": self.evictions,
+            "lookups": dict(self.counts),
+        }
+
+
+# Revalidations left running after a stale response was served, so that they are not garbage collected.
+_background: Set[asyncio.Task] = set()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Serves and stores the GET responses of one upstream through an `UpstreamCache`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str, cache: "UpstreamCache"):
+        self.transport = transport
+        self.upstream = upstream
+        self.cache = cache
+        self._revalidating: Set[str] = set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cache = self.cache
+        if request.method != "GET" or cache.mode == OFF:
+            return await self.transport.handle_async_request(request)
+        # The index query, its used_at update and the body file read stay off the event loop.
+        entry, body = await asyncio.to_thread(cache.load, self.upstream, request.method, request.url)
+
+        if cache.mode == REPLAY:
+            if body is not None:
+                return self._cached_response(entry, body, request, "replay")
+            cache.count(self.upstream, "miss")
+            return httpx.Response(504, headers={CACHE_HEADER: "miss"}, request=request,
+                                  json={"error": f"{request.url.path} was not recorded for {self.upstream}"})
+
+        if cache.mode == CACHE and body is not None:
+            if cache.age(entry) < cache.ttl(self.upstream):
+                return self._cached_response(entry, body, request, "hit")
+            self._revalidate(request, entry.key)
+            return self._cached_response(entry, body, request, "stale")
+
+        cache.count(self.upstream, "miss")
+        try:
+            response = await self._forward(request)
+        except httpx.TransportError as e:
+            body = await self._stale_body(entry, body)
+            if body is None:
+                raise
+            logger.warning("%s unavailable (%s), serving a response stored %.0f s ago for %s.",
+                           self.upstream, type(e).__name__, cache.age(entry), request.url.path)
+            return self._cached_response(entry, body, request, "stale")
+        if is_failure(response.status_code):
+            body = await self._stale_body(entry, body)
+            if body is not None:
+                logger.warning("%s answered %d, serving a response stored %.0f s ago for %s.",
+                               self.upstream, response.status_code, cache.age(entry), request.url.path)
+                await response.aclose()
+                return self._cached_response(entry, body, request, "stale")
+        return response
+
+    async def _stale_body(self, entry: Optional[CachedResponse], body: Optional[bytes]) -> Optional[bytes]:
+        """The stored body to serve instead of a failed request: read now in record mode, which skips it upfront."""
+        if body is not None or entry is None or self.cache.mode != RECORD:
+            return body
+        return await asyncio.to_thread(self.cache.servable_body, entry)
+
+    async def _forward(self, request: httpx.Request) -> httpx.Response:
+        """Sends the request upstream, and stores the response if it is a success."""
+        response = await self.transport.handle_async_request(request)
+        if not 200 <= response.status_code < 300:
+            return response
+        try:
+            body = await response.aread()  # Decoded: the stored and served body has no Content-Encoding.
+        finally:
+            await response.aclose()
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in TRANSFER_HEADERS]
+        try:
+            await asyncio.to_thread(self.cache.store, self.upstream, request.method, request.url,
+                                    response.status_code, headers, body)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Could not store a %s response in the upstream cache: %s", self.upstream, e)
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request,
+                              extensions=response.extensions)
+
+    def _cached_response(self, entry: CachedResponse, body: bytes, request: httpx.Request, result: str) -> httpx.Response:
+        self.cache.count(self.upstream, result)
+        headers = entry.headers + [(CACHE_HEADER, result), ("Age", str(int(self.cache.age(entry))))]
+        return httpx.Response(entry.status_code, headers=headers, content=body, request=request)
+
+    def _revalidate(self, request: httpx.Request, key: str):
+        """Refreshes a stale response in the background, once at a time per request."""
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+        timeout = request.extensions.get("timeout")
+        fresh_request = httpx.Request(request.method, request.url, headers=request.headers,
+                                      extensions={"timeout": timeout} if timeout else {})
+
+        async def revalidate():
+            try:
+                response = await self._forward(fresh_request)
+                await response.aclose()
+            except httpx.HTTPError as e:
+                logger.info("Revalidation of a %s response failed: %s", self.upstream, e)
+            finally:
+                self._revalidating.discard(key)
+
+        task = asyncio.ensure_future(revalidate())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def replaying() -> bool:
+    """True when upstream responses come from recordings only."""
+    return upstream_cache is not None and upstream_cache.mode == REPLAY
+
+
+def _upstream_ttls() -> Dict[str, float]:
+    ttls = {}
+    for name in ("binance", "coingecko", "jupiter"):
+        value = os.environ.get(f"{name.upper()}_CACHE_TTL")
+        if value:
+            ttls[name] = float(value)
+    return ttls
+
+
+upstream_cache = UpstreamCache(CACHE_DIR, CACHE_MODE, ttls=_upstream_ttls()) if CACHE_MODE != OFF else None
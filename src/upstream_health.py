@@ -0,0 +1,253 @@
+"""
+Health tracking of the upstream APIs: circuit breakers, adaptive timeouts and hedged requests.
+
+Every request through the shared upstream clients (see `InstrumentedTransport` in
+`src/http_clients.py`) is recorded in the `UpstreamHealth` of its upstream:
+
+- Circuit breaker: after `failure_threshold` consecutive failures (transport errors and
+  timeouts, 5xx, 429, and the 403/418/451 answers of a geo-blocked or banned IP), the circuit
+  opens and requests fail at once with `CircuitOpenError` for `cooldown` seconds, so callers
+  fall back to the next source immediately. A single probe request is then let through
+  (half-open): its success closes the circuit, its failure opens it again.
+- Adaptive timeout: once `MIN_SAMPLES` latencies were observed, the timeout of a request is
+  `timeout_factor` times the p99 latency of the last requests, between `min_timeout` and the
+  upstream's configured timeout, instead of always the configured one. A timed-out request
+  counts with the time it waited, so the timeout grows back when the upstream gets slower;
+  opening the circuit forgets the latencies, and a half-open probe gets the configured
+  timeout, so an upstream that is slower than it used to be is not locked out.
+- Hedging (`hedged`): when a primary source has not answered within a latency budget, a
+  secondary one is called too, and the first usable answer wins. `/api/price` uses it for
+  tradable coins (Binance, then CoinGecko) when PRICE_HEDGING is enabled.
+
+Configuration through environment variables:
+    UPSTREAM_BREAKER_FAILURES   consecutive failures that open a circuit (default 5)
+    UPSTREAM_BREAKER_COOLDOWN   seconds an open circuit rejects requests (default 30)
+    UPSTREAM_ADAPTIVE_TIMEOUT   "0" to always use the configured timeouts (default 1)
+    UPSTREAM_MIN_TIMEOUT        lower bound of an adaptive timeout, in seconds (default 1)
+    UPSTREAM_TIMEOUT_FACTOR     adaptive timeout as a multiple of the p99 latency (default 4)
+    PRICE_HEDGING               "1" to hedge Binance price requests with CoinGecko (default 0)
+    PRICE_HEDGE_DELAY           latency budget before hedging, in seconds (default: Binance's p95 latency)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import httpx
+
+from src.metrics import circuit_transitions
+
+BREAKER_FAILURES = int(os.environ.get("UPSTREAM_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("UPSTREAM_BREAKER_COOLDOWN", 30))
+ADAPTIVE_TIMEOUT = os.environ.get("UPSTREAM_ADAPTIVE_TIMEOUT", "1") == "1"
+MIN_TIMEOUT = float(os.environ.get("UPSTREAM_MIN_TIMEOUT", 1))
+TIMEOUT_FACTOR = float(os.environ.get("UPSTREAM_TIMEOUT_FACTOR", 4))
+HEDGING_ENABLED = os.environ.get("PRICE_HEDGING", "0") == "1"
+HEDGE_DELAY = float(os.environ.get("PRICE_HEDGE_DELAY", 0))
+
+# Latencies kept per upstream, and how many are needed before timeouts and budgets adapt.
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# Bounds of the automatic hedging budget, and the budget until enough latencies were seen.
+MIN_HEDGE_DELAY = 0.05
+DEFAULT_HEDGE_DELAY = 0.5
+
+# Statuses that tell the upstream is unavailable to us, rather than that a request was wrong.
+FAILURE_STATUSES = {403, 418, 429, 451}
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request to an upstream whose circuit is open."""
+
+
+def is_failure(status_code: int) -> bool:
+    return status_code >= 500 or status_code in FAILURE_STATUSES
+
+
+class UpstreamHealth:
+    """Circuit breaker and latency statistics of one upstream."""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 min_timeout: float = MIN_TIMEOUT, timeout_factor: float = TIMEOUT_FACTOR,
+                 adaptive: bool = ADAPTIVE_TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.adaptive = adaptive
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.probing = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._sorted: Optional[list] = None
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            circuit_transitions.inc(self.name, state)
+
+    def available(self) -> bool:
+        """False while the circuit is open and cooling down; callers can skip the upstream."""
+        return self.state != OPEN or self.clock() - self.opened_at >= self.cooldown
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now. After the cool-down, lets a single probe through."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+            self._transition(HALF_OPEN)
+            self.probing = False
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release_probe(self):
+        """Lets another probe through after a probe request was cancelled without an outcome."""
+        self.probing = False
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.probing = False
+        self.latencies.append(latency)
+        self._sorted = None
+        self._transition(CLOSED)
+
+    def record_failure(self, error: str, timed_out_after: Optional[float] = None):
+        """Records a failed request; `timed_out_after` is the time a timed-out request waited."""
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.probing = False
+        if timed_out_after is not None:
+            self.latencies.append(timed_out_after)
+            self._sorted = None
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            # The latencies seen before the outage say nothing about the upstream once it is back.
+            self.latencies.clear()
+            self._sorted = None
+            self._transition(OPEN)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """The `q` quantile (0-1) of the recent latencies, or None without enough samples."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.latencies)
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+    def timeout(self, configured: float) -> float:
+        """
+        The timeout of the next request: adapted to the observed latency, never above `configured`.
+        A probe of a circuit that is not closed gets `configured`.
+        """
+        p99 = self.latency_quantile(0.99)
+        if not self.adaptive or p99 is None or self.state != CLOSED:
+            return configured
+        return min(max(p99 * self.timeout_factor, self.min_timeout), configured)
+
+    def hedge_delay(self) -> float:
+        """How long to wait for this upstream before hedging: PRICE_HEDGE_DELAY, or its p95 latency."""
+        if HEDGE_DELAY > 0:
+            return HEDGE_DELAY
+        p95 = self.latency_quantile(0.95)
+        return DEFAULT_HEDGE_DELAY if p95 is None else max(p95, MIN_HEDGE_DELAY)
+
+    def reset(self):
+        self.consecutive_failures = 0
+        self.probing = False
+        self._transition(CLOSED)
+
+    def status(self, configured_timeout: Optional[float] = None) -> Dict[str, Any]:
+        p50, p95, p99 = (self.latency_quantile(q) for q in (0.5, 0.95, 0.99))
+        ms = lambda value: round(value * 1000, 3) if value is not None else None
+        status = {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown,
+            "retry_in": round(max(self.cooldown - (self.clock() - self.opened_at), 0.0), 3) if self.state == OPEN else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "latency_ms": {"p50": ms(p50), "p95": ms(p95), "p99": ms(p99), "samples": len(self.latencies)},
+            "hedge_delay_ms": ms(self.hedge_delay()),
+        }
+        if configured_timeout is not None:
+            status["timeout_seconds"] = round(self.timeout(configured_timeout), 3)
+        return status
+
+
+_health: Dict[str, UpstreamHealth] = {}
+
+
+def upstream_health(name: str) -> UpstreamHealth:
+    """The health of an upstream, created on first use."""
+    health = _health.get(name)
+    if health is None:
+        health = _health[name] = UpstreamHealth(name)
+    return health
+
+
+def all_upstream_health() -> Dict[str, UpstreamHealth]:
+    return dict(_health)
+
+
+# Hedged requests left running after losing, so that they can still fill the caches.
+_background: Set[asyncio.Task] = set()
+
+
+def _finish_in_background(task: asyncio.Task):
+    _background.add(task)
+
+    def done(task: asyncio.Task):
+        _background.discard(task)
+        if not task.cancelled():
+            task.exception()  # Retrieved, so that a failing loser is not reported as unhandled.
+
+    task.add_done_callback(done)
+
+
+async def hedged(primary: Callable[[], Awaitable[Any]], secondary: Callable[[], Awaitable[Any]], delay: float,
+                 usable: Callable[[Any], bool] = lambda result: result is not None) -> Tuple[Any, str]:
+    """
+    Awaits `primary()`, and also starts `secondary()` if the primary has no usable result
+    after `delay` seconds. Returns the first usable result with "primary" or "secondary";
+    when neither is usable (both were then called), returns the primary's result with "none",
+    or raises its exception. The loser is not
+    cancelled (it may be shared with other callers) but left to finish in the background.
+    """
+    def succeeded(task: asyncio.Task) -> bool:
+        return task.exception() is None and usable(task.result())
+
+    first = asyncio.ensure_future(primary())
+    names = {first: "primary"}
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done and succeeded(first):
+        return first.result(), "primary"
+    names[asyncio.ensure_future(secondary())] = "secondary"
+
+    pending = set(names) - done
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if succeeded(task):
+                for loser in pending:
+                    _finish_in_background(loser)
+                return task.result(), names[task]
+    return first.result(), "none"
@@ -0,0 +1,283 @@
+"""
+Local stand-ins for the upstream services, so that features talking to them can be tested offline.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import string
+
+import uvicorn
+import websockets
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+class BinanceWebsocketStub:
+    """
+    A local websocket server emulating Binance's `!miniTicker@arr` stream.
+    Use as an async context manager, then point `BinanceTickerStream` at `stub.url`.
+    """
+
+    def __init__(self):
+        self._server = None
+        self.clients = set()
+        self.connections = 0
+
+    async def __aenter__(self):
+        self._server = await websockets.serve(self._handler, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        host, port = list(self._server.sockets)[0].getsockname()[:2]
+        return f"ws://{host}:{port}/ws/!miniTicker@arr"
+
+    async def _handler(self, websocket, *args):
+        self.clients.add(websocket)
+        self.connections += 1
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.clients.discard(websocket)
+
+    async def wait_for_clients(self, count: int = 1, timeout: float = 5.0):
+        async def _wait():
+            while len(self.clients) < count:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(_wait(), timeout)
+
+    async def send_tickers(self, prices):
+        """Pushes one mini-ticker array, e.g. `{'BTCUSDC': 67000.0}`, to every connected client."""
+        message = json.dumps([
+            {"e": "24hrMiniTicker", "E": 0, "s": symbol, "c": str(price)} for symbol, price in prices.items()
+        ])
+        for websocket in list(self.clients):
+            await websocket.send(message)
+
+    async def drop_clients(self):
+        """Closes every client connection, as Binance does on its daily disconnect."""
+        for websocket in list(self.clients):
+            await websocket.close()
+
+
+def synthetic_market(count: int = 3000, seed: int = 42):
+    """
+    Returns `count` coins shaped like CoinGecko's `coins/markets` results, by decreasing market cap.
+    The first coins are real ones, so that searches and demo wallets find familiar symbols.
+    """
+    rng = random.Random(seed)
+    known = [("bitcoin", "btc", "Bitcoin", 67000.0), ("ethereum", "eth", "Ethereum", 3500.0),
+             ("tether", "usdt", "Tether", 1.0), ("solana", "sol", "Solana", 150.0),
+             ("usd-coin", "usdc", "USDC", 1.0), ("jito-staked-sol", "jitosol", "Jito Staked SOL", 175.0)]
+    coins = []
+    for i in range(count):
+        if i < len(known):
+            coin_id, symbol, name, price = known[i]
+        else:
+            name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).capitalize()
+            symbol = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 5)))
+            coin_id = f"{name.lower()}-{i}"
+            price = round(10 ** rng.uniform(-6, 3), 8)
+        coins.append({
+            "id": coin_id, "symbol": symbol, "name": name, "current_price": price,
+            "market_cap": round(1e12 / (i + 1)), "market_cap_rank": i + 1,
+            "total_volume": round(1e10 / (i + 1)), "price_change_percentage_24h": round(rng.uniform(-10, 10), 2),
+        })
+    return coins
+
+
+class HttpStub:
+    """
+    Base of the local HTTP stubs: serves `routes()` with uvicorn in the current event loop.
+    Use as an async context manager, then point an upstream at `stub.url`.
+
+    Every request first waits `delay` seconds plus up to `jitter` seconds, then fails with
+    HTTP `error_status` with probability `error_rate`. The random generator is seeded, so a
+    benchmark run sees the same latencies and failures every time.
+    """
+
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, port: int = 0, seed: int = 0):
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self.error_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rng = random.Random(seed)
+        self.app = Starlette(routes=[Route(path, self._simulated(handler)) for path, handler in self.routes()])
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._task = None
+
+    def routes(self):
+        """The `(path, handler)` pairs served by the stub."""
+        raise NotImplementedError
+
+    def _simulated(self, handler):
+        async def endpoint(request):
+            self.request_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay + self._rng.uniform(0, self.jitter))
+            finally:
+                self.in_flight -= 1
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.error_count += 1
+                return JSONResponse({"error": "simulated failure"}, status_code=self.error_status)
+            return await handler(request)
+        return endpoint
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.should_exit = True
+        await self._task
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+
+class JupiterLendStub(HttpStub):
+    """
+    A local HTTP server emulating `lite-api.jup.ag`'s `/lend/v1/positions/{wallet}`
+    (run this module to serve it standalone and set JUPITER_API_URL).
+    Wallets in `positions` get their positions, wallets in `failures` get that HTTP
+    status, and any other wallet gets an empty object, as the real API does.
+    """
+
+    def __init__(self, positions=None, failures=None, delay: float = 0.0, **kwargs):
+        self.positions = dict(positions or {})
+        self.failures = dict(failures or {})
+        self.requests = []
+        super().__init__(delay=delay, **kwargs)
+
+    def routes(self):
+        return [("/lend/v1/positions/{wallet}", self._positions)]
+
+    async def _positions(self, request):
+        wallet = request.path_params["wallet"]
+        self.requests.append(wallet)
+        if wallet in self.failures:
+            return JSONResponse({"error": "stub failure"}, status_code=self.failures[wallet])
+        return JSONResponse(self.positions.get(wallet, {}))
+
+
+class BinanceRestStub(HttpStub):
+    """
+    A local HTTP server emulating Binance's `/api/v3/ticker/price` (one `symbol`, a JSON list
+    of `symbols`, or every pair) and `/api/v3/exchangeInfo` (with its ETag and used-weight header).
+    Every `tradable_every`-th coin of `market` has a USDC pair.
+    """
+
+    def __init__(self, market=None, tradable_every: int = 3, **kwargs):
+        market = synthetic_market() if market is None else market
+        self.prices = {
+            f"{coin['symbol'].upper()}USDC": coin["current_price"]
+            for i, coin in enumerate(market) if i % tradable_every == 0
+        }
+        self.exchange_info = json.dumps(
+            {"timezone": "UTC", "symbols": [{"symbol": symbol, "status": "TRADING"} for symbol in self.prices]}
+        ).encode()
+        self.etag = '"' + hashlib.sha256(self.exchange_info).hexdigest()[:16] + '"'
+        self.used_weight = 0
+        super().__init__(**kwargs)
+
+    def routes(self):
+        return [("/api/v3/ticker/price", self._ticker_price), ("/api/v3/exchangeInfo", self._exchange_info)]
+
+    def _invalid_symbol(self):
+        return JSONResponse({"code": -1121, "msg": "Invalid symbol."}, status_code=400)
+
+    async def _ticker_price(self, request):
+        symbol = request.query_params.get("symbol")
+        if symbol is not None:
+            self.used_weight += 2
+            if symbol not in self.prices:
+                return self._invalid_symbol()
+            return JSONResponse({"symbol": symbol, "price": str(self.prices[symbol])})
+        if "symbols" in request.query_params:
+            symbols = json.loads(request.query_params["symbols"])
+            self.used_weight += 4
+            # Like Binance, one unknown symbol fails the whole request.
+            if any(symbol not in self.prices for symbol in symbols):
+                return self._invalid_symbol()
+        else:
+            symbols = self.prices
+            self.used_weight += 4
+        return JSONResponse([{"symbol": symbol, "price": str(self.prices[symbol])} for symbol in symbols])
+
+    async def _exchange_info(self, request):
+        self.used_weight += 20
+        headers = {"etag": self.etag, "x-mbx-used-weight-1m": str(self.used_weight)}
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(self.exchange_info, media_type="application/json", headers=headers)
+
+
+class CoinGeckoStub(HttpStub):
+    """
+    A local HTTP server emulating CoinGecko's `/api/v3/coins/markets` (paged with `page`
+    and `per_page`) and `/api/v3/simple/price` (USD prices of comma-separated `ids`).
+    """
+
+    def __init__(self, market=None, **kwargs):
+        self.market = synthetic_market() if market is None else market
+        self.prices = {coin["id"]: coin["current_price"] for coin in self.market}
+        super().__init__(**kwargs)
+
+    def routes(self):
+        return [("/api/v3/coins/markets", self._markets), ("/api/v3/simple/price", self._simple_price)]
+
+    async def _markets(self, request):
+        page = int(request.query_params.get("page", 1))
+        per_page = int(request.query_params.get("per_page", 100))
+        return JSONResponse(self.market[(page - 1) * per_page:page * per_page])
+
+    async def _simple_price(self, request):
+        ids = [coin_id for coin_id in request.query_params.get("ids", "").split(",") if coin_id in self.prices]
+        return JSONResponse({coin_id: {"usd": self.prices[coin_id]} for coin_id in ids})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stub of an upstream API.")
+    parser.add_argument("service", choices=["jupiter", "binance", "coingecko"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="latency added to every request, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with a 503")
+    args = parser.parse_args()
+    options = {"delay": args.delay, "error_rate": args.error_rate, "port": args.port}
+
+    async def serve():
+        if args.service == "jupiter":
+            demo = [{"collateral": "SOL", "collateralValue": 1500.5, "borrowed": "USDC", "borrowValue": 750.25,
+                     "ratio": 50.0, "healthFactor": 1.7, "riskLevel": "safe"}]
+            stub = JupiterLendStub(positions={"STUB": demo}, **options)
+        elif args.service == "binance":
+            stub = BinanceRestStub(**options)
+        else:
+            stub = CoinGeckoStub(**options)
+        async with stub:
+            variable = f"{args.service.upper()}_API_URL"
+            print(f"{type(stub).__name__} listening on {stub.url} (set {variable}={stub.url})")
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
@@ -0,0 +1,154 @@
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.alerts import AlertScheduler, alert_topic, next_levels, position_keys
+from src.event_stream import Broadcaster
+
+
+def position(collateral_value, borrow_value):
+    return {"collateral": "SOL", "collateralValue": collateral_value, "borrowed": "USDC", "borrowValue": borrow_value}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_hysteresis(self):
+        current = np.array([0, 1, 1, 2, 2])
+        health_factor = np.array([1.4, 1.52, 1.56, 1.12, 1.6])
+        # Escalates at once; goes down only 0.05 above the threshold (1.5 for risky, 1.1 for critical).
+        self.assertEqual(next_levels(current, health_factor, 0.05).tolist(), [1, 1, 0, 2, 0])
+
+    def test_position_keys(self):
+        positions = [position(1, 1), position(2, 2), {"collateral": "JitoSOL", "borrowed": "USDT"}]
+        self.assertEqual(position_keys("w", positions), ["w:SOL/USDC", "w:SOL/USDC#2", "w:JitoSOL/USDT"])
+
+
+class TestAlertScheduler(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.broadcaster = Broadcaster()
+        self.clock = FakeClock()
+        self.scheduler = AlertScheduler(self.broadcaster, dict, webhook_url=None, min_interval=30,
+                                        max_interval=900, relaxed_health_factor=3, hysteresis=0.05, clock=self.clock)
+        self.positions = {}
+        self.fetched = []
+
+        async def batch(wallets):
+            self.fetched.append(list(wallets))
+            return [{"wallet": wallet, "positions": self.positions[wallet], "error": None} if wallet in self.positions
+                    else {"wallet": wallet, "positions": None, "error": {"status_code": 503, "detail": "down"}}
+                    for wallet in wallets]
+
+        self.patchers = [
+            patch('src.alerts.get_lend_positions_batch', batch),
+            patch('src.alerts.resolve_symbol_prices', AsyncMock(return_value={})),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_interval_follows_risk(self):
+        self.assertEqual(self.scheduler.interval_for(0.9), 30)
+        self.assertEqual(self.scheduler.interval_for(2.0), 465)
+        self.assertEqual(self.scheduler.interval_for(5.0), 900)
+        self.assertEqual(self.scheduler.interval_for(float("inf")), 900)
+
+    def test_relaxed_health_factor_must_be_above_one(self):
+        for relaxed_health_factor in (1, 0.5):
+            with self.assertRaises(ValueError):
+                AlertScheduler(self.broadcaster, dict, relaxed_health_factor=relaxed_health_factor)
+
+    async def test_alerts_with_hysteresis(self):
+        subscription = self.broadcaster.subscribe([alert_topic("alice")])
+        everything = self.broadcaster.subscribe([alert_topic("*")])
+        self.scheduler.watch(["alice"])
+
+        # 0.85 * 1000 / 800 = 1.06: critical right away.
+        self.positions["alice"] = [position(1000, 800)]
+        await self.scheduler.check_due()
+        topic, event = await subscription.get(timeout=1)
+        self.assertEqual((event["type"], event["level"], event["previous_level"]), ("alert", "critical", "safe"))
+        self.assertEqual(event["position"], "alice:SOL/USDC")
+        self.assertEqual((await everything.get(timeout=1))[1], event)
+
+        # 1.12: above the critical threshold, but within the hysteresis margin: no alert.
+        self.positions["alice"] = [position(1000, 0.85 * 1000 / 1.12)]
+        self.clock.now += self.scheduler.wallets["alice"].interval
+        self.assertEqual(await self.scheduler.check_due(), 1)
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+        # 1.2: back to risky.
+        self.positions["alice"] = [position(1000, 0.85 * 1000 / 1.2)]
+        self.clock.now += self.scheduler.wallets["alice"].interval
+        await self.scheduler.check_due()
+        topic, event = await subscription.get(timeout=1)
+        self.assertEqual((event["type"], event["level"]), ("recovered", "risky"))
+        self.assertEqual(self.scheduler.alerts, 2)
+        self.assertEqual(len(self.scheduler.recent), 2)
+
+    async def test_due_wallets_share_one_round(self):
+        self.positions.update(risky=[position(1000, 700)], healthy=[position(1000, 100)], empty=[])
+        self.scheduler.watch(["risky", "healthy", "empty"])
+        self.assertEqual(await self.scheduler.check_due(), 3)
+        self.assertEqual(self.fetched, [["risky", "healthy", "empty"]])
+
+        wallets = {watched.wallet: watched for watched in self.scheduler.wallets.values()}
+        self.assertLess(wallets["risky"].interval, wallets["healthy"].interval)
+        self.assertEqual(wallets["healthy"].interval, 900)
+        self.assertEqual(wallets["empty"].interval, 900)
+
+        # Only the risky wallet is due again before the healthy ones.
+        self.clock.now += wallets["risky"].interval
+        self.assertEqual(await self.scheduler.check_due(), 1)
+        self.assertEqual(self.fetched[-1], ["risky"])
+
+    async def test_failing_wallet_backs_off(self):
+        self.scheduler.watch(["broken"])
+        intervals = []
+        for _ in range(3):
+            self.clock.now += 1000
+            await self.scheduler.check_due()
+            intervals.append(self.scheduler.wallets["broken"].interval)
+        self.assertEqual(intervals, [30, 60, 120])
+        self.assertEqual(self.scheduler.wallets["broken"].last_error, "down")
+
+    async def test_webhook(self):
+        received = []
+
+        def handler(request):
+            received.append(request)
+            return httpx.Response(200)
+
+        self.scheduler.webhook_url = "http://127.0.0.1:9999/alerts"
+        self.scheduler._webhook_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.positions["alice"] = [position(1000, 800)]
+        self.scheduler.watch(["alice"])
+        await self.scheduler.check_due()
+        await self.scheduler.stop()
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(str(received[0].url), "http://127.0.0.1:9999/alerts")
+        self.assertEqual(self.scheduler.webhooks_sent, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
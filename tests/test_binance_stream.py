@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.binance_stream import BinanceTickerStream, PriceBook
+from tests.stubs import BinanceWebsocketStub
+
+async def wait_until(predicate, timeout=5.0):
+    async def _wait():
+        while not predicate():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(_wait(), timeout)
+
+class TestBinanceTickerStream(unittest.IsolatedAsyncioTestCase):
+
+    async def test_stream_updates_price_book_and_reconnects(self):
+        """Prices pushed by the stub reach the book, also after the connection is dropped."""
+        book = PriceBook()
+        async with BinanceWebsocketStub() as stub:
+            stream = BinanceTickerStream(book, lambda: {'BTCUSDC', 'ETHUSDC'}, url=stub.url, min_backoff=0.01, max_backoff=0.05)
+            stream.start()
+            try:
+                await stub.wait_for_clients()
+                await stub.send_tickers({'BTCUSDC': 67000.0, 'DOGEBTC': 0.000002})
+                await wait_until(lambda: book.get('BTCUSDC') is not None)
+                self.assertEqual(book.get('BTCUSDC')[0], 67000.0)
+                # Pairs we do not track are ignored.
+                self.assertIsNone(book.get('DOGEBTC'))
+
+                await stub.drop_clients()
+                await wait_until(lambda: stub.connections == 2)
+                await stub.wait_for_clients()
+                await stub.send_tickers({'ETHUSDC': 3500.0})
+                await wait_until(lambda: book.get('ETHUSDC') is not None)
+                self.assertEqual(stream.status()['connections'], 2)
+            finally:
+                await stream.stop()
+        self.assertFalse(stream.status()['running'])
+
+    def test_stale_prices_are_ignored(self):
+        book = PriceBook()
+        book.update('BTCUSDC', 67000.0, timestamp=0)
+        self.assertIsNone(book.get('BTCUSDC', max_age=10))
+        book.update('BTCUSDC', 68000.0)
+        self.assertEqual(book.get('BTCUSDC', max_age=10)[0], 68000.0)
+
+    def test_combined_stream_payload(self):
+        book = PriceBook()
+        stream = BinanceTickerStream(book, lambda: {'SOLUSDC'})
+        stream._refresh_symbols()
+        stream.handle_message('{"stream": "!miniTicker@arr", "data": [{"s": "SOLUSDC", "c": "150.5"}]}')
+        self.assertEqual(book.get('SOLUSDC')[0], 150.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,11 @@ import httpx
 # Add the src directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.binance_client import get_price_from_binance
-from src.coingecko_client import get_price_from_coingecko
+from src import binance_client, data_updater, http_clients
+from src.binance_client import get_price_from_binance, get_prices_from_binance
+from src.coingecko_client import get_price_from_coingecko, get_prices_from_coingecko
+from src.http_clients import UpstreamConfig
+from tests.stubs import BinanceRestStub, CoinGeckoStub, synthetic_market
 
 class TestClients(unittest.IsolatedAsyncioTestCase):
 
@@ -58,6 +61,39 @@ class TestClients(unittest.IsolatedAsyncioTestCase):
         price = await get_price_from_binance('BTCUSDC')
         self.assertIsNone(price)
 
+    @patch('httpx.AsyncClient')
+    async def test_get_prices_from_binance_single_request(self, MockAsyncClient):
+        """Test bulk price retrieval from Binance with one `symbols` request."""
+        mock_response = MagicMock()
+        mock_response.json.return_value = [
+            {'symbol': 'BTCUSDC', 'price': '67000.00'},
+            {'symbol': 'ETHUSDC', 'price': '3500.50'},
+        ]
+        mock_get = AsyncMock(return_value=mock_response)
+        MockAsyncClient.return_value.__aenter__.return_value.get = mock_get
+
+        prices = await get_prices_from_binance(['BTCUSDC', 'ETHUSDC'])
+
+        self.assertEqual(prices, {'BTCUSDC': 67000.00, 'ETHUSDC': 3500.50})
+        mock_get.assert_awaited_once()
+        self.assertEqual(mock_get.call_args.kwargs['params'], {'symbols': '["BTCUSDC","ETHUSDC"]'})
+
+    @patch('httpx.AsyncClient')
+    async def test_get_prices_from_binance_invalid_symbol_uses_snapshot(self, MockAsyncClient):
+        """An unknown symbol makes Binance reject the batch; the full snapshot is used instead."""
+        binance_client._ticker_snapshot = (0.0, {})
+        bad_request = MagicMock()
+        bad_request.status_code = 400
+        snapshot_response = MagicMock()
+        snapshot_response.json.return_value = [{'symbol': 'BTCUSDC', 'price': '67000.00'}, {'symbol': 'XRPUSDC', 'price': '0.5'}]
+        MockAsyncClient.return_value.__aenter__.return_value.get = AsyncMock(side_effect=[
+            httpx.HTTPStatusError("Bad Request", request=MagicMock(), response=bad_request),
+            snapshot_response,
+        ])
+
+        prices = await get_prices_from_binance(['BTCUSDC', 'NOPEUSDC'])
+        self.assertEqual(prices, {'BTCUSDC': 67000.00})
+
     # --- Tests for CoinGecko Client ---
 
     @patch('httpx.AsyncClient')
@@ -100,5 +136,58 @@ class TestClients(unittest.IsolatedAsyncioTestCase):
         price = await get_price_from_coingecko('bitcoin')
         self.assertIsNone(price)
 
+    @patch('src.coingecko_client.IDS_PER_REQUEST', 2)
+    @patch('httpx.AsyncClient')
+    async def test_get_prices_from_coingecko_chunks_ids(self, MockAsyncClient):
+        """Test bulk price retrieval from CoinGecko is split into multi-id chunks."""
+        async def fake_get(url, params):
+            return MagicMock(json=MagicMock(return_value={
+                coin_id: {'usd': float(len(coin_id))} for coin_id in params['ids'].split(',') if coin_id != 'unknown'
+            }))
+        mock_get = AsyncMock(side_effect=fake_get)
+        MockAsyncClient.return_value.__aenter__.return_value.get = mock_get
+
+        prices = await get_prices_from_coingecko(['bitcoin', 'solana', 'unknown', 'bitcoin'])
+
+        self.assertEqual(prices, {'bitcoin': 7.0, 'solana': 6.0})
+        self.assertEqual(mock_get.await_count, 2)
+
+
+class TestClientsAgainstStubs(unittest.IsolatedAsyncioTestCase):
+    """The clients against the local upstream stubs used by the load benchmark."""
+
+    async def asyncSetUp(self):
+        self.market = synthetic_market(600)
+        self.binance = await BinanceRestStub(self.market).__aenter__()
+        self.coingecko = await CoinGeckoStub(self.market, error_rate=0.5, seed=1).__aenter__()
+        upstreams = dict(http_clients.UPSTREAMS,
+                         binance=UpstreamConfig("binance", self.binance.url, 5),
+                         coingecko=UpstreamConfig("coingecko", self.coingecko.url, 5))
+        self.patcher = patch.dict(http_clients.UPSTREAMS, upstreams)
+        self.patcher.start()
+        binance_client._ticker_snapshot = (0.0, {})
+
+    async def asyncTearDown(self):
+        self.patcher.stop()
+        await self.binance.__aexit__(None, None, None)
+        await self.coingecko.__aexit__(None, None, None)
+
+    async def test_binance_prices_and_exchange_info(self):
+        self.assertEqual(await get_price_from_binance('BTCUSDC'), 67000.0)
+        self.assertEqual(await get_prices_from_binance(['ETHUSDC', 'SOLUSDC', 'NOPEUSDC']), {'SOLUSDC': 150.0})
+
+        with patch.dict(data_updater._exchange_info_cache, clear=True):
+            symbols = await data_updater.fetch_binance_symbols_conditionally()
+            self.assertEqual(symbols, set(self.binance.prices))
+            self.assertIs(await data_updater.fetch_binance_symbols_conditionally(), symbols)
+        # One unknown symbol sends the batch to the snapshot, and the second exchangeInfo gets a 304.
+        self.assertEqual(self.binance.request_count, 5)
+
+    async def test_coingecko_error_rate(self):
+        results = [await get_price_from_coingecko('bitcoin') for _ in range(20)]
+        self.assertEqual({result for result in results if result is not None}, {67000.0})
+        self.assertEqual(results.count(None), self.coingecko.error_count)
+        self.assertTrue(0 < self.coingecko.error_count < 20)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
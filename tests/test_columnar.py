@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.columnar import ColumnarCoins, write_columnar
+from src.dataset import Dataset, DatasetError, read_dataset_file
+
+COINS = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'shiba-inu', 'name': 'Shiba Inu 柴犬', 'symbol': 'SHIB', 'is_tradable_on_binance_vs_usdc': False},
+]
+
+
+class TestColumnarCoins(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'coins.cols')
+        write_columnar(self.path, COINS, timestamp_utc='2024-01-01T00:00:00+00:00')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        coins = ColumnarCoins(self.path)
+        self.assertEqual(len(coins), 3)
+        self.assertEqual(list(coins), COINS)
+        self.assertEqual(coins[2], COINS[2])
+        self.assertEqual(coins[-1], COINS[-1])
+        self.assertEqual(coins[1:], COINS[1:])
+        self.assertEqual(coins.timestamp_utc, '2024-01-01T00:00:00+00:00')
+        with self.assertRaises(IndexError):
+            coins[3]
+
+    def test_dataset_over_columnar_file(self):
+        coins, timestamp_utc, source = read_dataset_file(self.path)
+        dataset = Dataset(coins, 1, timestamp_utc, source).warm()
+        self.assertEqual(dataset.coins_by_id['ethereum'], COINS[1])
+        self.assertEqual(dataset.search_index.search('shi')[0][0]['id'], 'shiba-inu')
+        self.assertEqual(dataset.tradable_pairs, ['BTCUSDC', 'ETHUSDC'])
+
+    def test_not_a_columnar_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"coins": []}')
+        with self.assertRaises(DatasetError) as cm:
+            read_dataset_file(self.path)
+        self.assertEqual(cm.exception.kind, "corrupt")
+
+
+if __name__ == '__main__':
+    unittest.main()
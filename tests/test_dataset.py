@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dataset import DatasetError, DatasetStore, file_id, write_json_atomic
+from src.dataset_diff import compute_diff
+
+COINS = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethena', 'name': 'Ethena', 'symbol': 'ENA', 'is_tradable_on_binance_vs_usdc': False},
+]
+
+
+class TestDatasetStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'data.json')
+        self.store = DatasetStore(self.path, watch_interval=0.01)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def save(self, coins, timestamp="t"):
+        write_json_atomic(self.path, {'timestamp_utc': timestamp, 'count': len(coins), 'coins': coins})
+
+    async def test_missing_file(self):
+        with self.assertRaises(DatasetError) as cm:
+            self.store.get()
+        self.assertEqual(cm.exception.kind, "missing")
+        self.assertFalse(await self.store.reload_if_changed())
+
+    async def test_reloads_on_change_only(self):
+        self.save(COINS)
+        self.assertTrue(await self.store.reload_if_changed())
+        first = self.store.get()
+        self.assertEqual(first.search_index.search('eth')[0][0]['id'], 'ethereum')
+        self.assertFalse(await self.store.reload_if_changed())
+        self.assertIs(self.store.get(), first)
+
+        self.save(COINS[:2], timestamp="t2")
+        self.assertTrue(await self.store.reload_if_changed())
+        second = self.store.get()
+        self.assertEqual(second.version, first.version + 1)
+        self.assertNotIn('ethena', second.coins_by_id)
+        # The previous version is left untouched for requests still using it.
+        self.assertIn('ethena', first.coins_by_id)
+
+    async def test_keeps_serving_on_a_corrupt_file(self):
+        self.save(COINS)
+        await self.store.reload_if_changed()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"coins": [')
+        self.assertFalse(await self.store.reload_if_changed())
+        self.assertEqual(len(self.store.get().coins), 3)
+        self.assertIsNotNone(self.store.status()['last_error'])
+
+    async def test_apply_diff(self):
+        self.save(COINS)
+        await self.store.reload_if_changed()
+        new_coins = [dict(COINS[0], is_tradable_on_binance_vs_usdc=False)] + COINS[1:]
+        diff = compute_diff(COINS, new_coins)
+        diff['base'] = [list(file_id(self.path))]
+        self.save(new_coins, timestamp="t2")
+
+        self.assertTrue(await self.store.apply_diff(diff))
+        self.assertEqual(self.store.get().tradable_pairs, ['ETHUSDC'])
+        # The saved file matches the applied version, so the watcher does not reload it.
+        self.assertFalse(await self.store.reload_if_changed())
+
+    async def test_diff_of_another_version_reloads_the_file(self):
+        self.save(COINS[:2])
+        await self.store.reload_if_changed()
+        # The refresh diffed a newer saved version than the one in memory.
+        self.save(COINS, timestamp="t2")
+        base = [list(file_id(self.path))]
+        new_coins = [dict(COINS[0], is_tradable_on_binance_vs_usdc=False)] + COINS[1:]
+        diff = dict(compute_diff(COINS, new_coins), base=base)
+        self.save(new_coins, timestamp="t3")
+
+        self.assertTrue(await self.store.apply_diff(diff))
+        self.assertEqual([coin['id'] for coin in self.store.get().coins], ['bitcoin', 'ethereum', 'ethena'])
+        self.assertEqual(self.store.get().timestamp_utc, "t3")
+        self.assertFalse(await self.store.reload_if_changed())
+
+    def test_atomic_write_leaves_no_temp_file(self):
+        self.save(COINS)
+        self.assertEqual(os.listdir(self.tmp.name), ['data.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+
+import httpx
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import data_updater
+from src.dataset_diff import apply_diff, compute_diff, is_empty
+
+OLD = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethena', 'name': 'Ethena', 'symbol': 'ENA', 'is_tradable_on_binance_vs_usdc': False},
+    {'id': 'old-coin', 'name': 'Old Coin', 'symbol': 'OLD', 'is_tradable_on_binance_vs_usdc': False},
+]
+NEW = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethena', 'name': 'Ethena', 'symbol': 'ENA', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'new-coin', 'name': 'New Coin', 'symbol': 'NEW', 'is_tradable_on_binance_vs_usdc': False},
+]
+
+
+class TestDatasetDiff(unittest.TestCase):
+
+    def test_compute_diff(self):
+        diff = compute_diff(OLD, NEW)
+        self.assertEqual([c['id'] for c in diff['added']], ['new-coin'])
+        self.assertEqual(diff['removed'], ['old-coin'])
+        self.assertEqual(diff['changed'], [{'id': 'ethena', 'changes': {'is_tradable_on_binance_vs_usdc': [False, True]}}])
+        self.assertEqual(diff['order'], ['bitcoin', 'ethena', 'ethereum', 'new-coin'])
+
+    def test_apply_diff_round_trip(self):
+        self.assertEqual(apply_diff(OLD, compute_diff(OLD, NEW)), NEW)
+        # Flags-only change: the order is kept.
+        flipped = [dict(c) for c in OLD]
+        flipped[0]['is_tradable_on_binance_vs_usdc'] = False
+        diff = compute_diff(OLD, flipped)
+        self.assertIsNone(diff['order'])
+        self.assertEqual(apply_diff(OLD, diff), flipped)
+
+    def test_empty_diff(self):
+        self.assertTrue(is_empty(compute_diff(OLD, [dict(c) for c in OLD])))
+
+    def test_market_data_only_change(self):
+        priced = [dict(c, current_price=float(i + 1), market_cap_rank=i + 1) for i, c in enumerate(OLD)]
+        moved = [dict(c, current_price=c['current_price'] * 1.01) for c in priced]
+        del moved[3]['market_cap_rank']
+        diff = compute_diff(priced, moved)
+        self.assertTrue(is_empty(diff))
+        self.assertEqual(diff['changed'], [])
+        self.assertEqual(diff['market']['current_price'], [c['current_price'] for c in moved])
+        self.assertEqual(apply_diff(priced, diff), moved)
+        self.assertIsNone(compute_diff(priced, [dict(c) for c in priced])['market'])
+
+
+class TestIncrementalUpdate(unittest.TestCase):
+
+    def test_saves_only_when_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.json')
+            symbols = {'BTCUSDC', 'ETHUSDC'}
+            raw = [{'id': c['id'], 'name': c['name'], 'symbol': c['symbol'].lower()} for c in OLD]
+
+            # No previous dataset: saved in full, no diff.
+            self.assertIsNone(data_updater.apply_incremental_update(raw, symbols, filename=path))
+            mtime = os.stat(path).st_mtime_ns
+
+            diff = data_updater.apply_incremental_update(raw, symbols, filename=path)
+            self.assertTrue(is_empty(diff))
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+            diff = data_updater.apply_incremental_update(raw, symbols | {'ENAUSDC'}, filename=path)
+            self.assertEqual([c['id'] for c in diff['changed']], ['ethena'])
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)['coins']
+            self.assertTrue(next(c for c in saved if c['id'] == 'ethena')['is_tradable_on_binance_vs_usdc'])
+
+
+class TestConditionalExchangeInfo(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        data_updater._exchange_info_cache.clear()
+
+    async def test_etag_and_weight(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if request.headers.get('if-none-match') == '"v1"':
+                return httpx.Response(304, headers={'x-mbx-used-weight-1m': '40'})
+            return httpx.Response(
+                200, json={'symbols': [{'symbol': 'BTCUSDC'}]},
+                headers={'etag': '"v1"', 'x-mbx-used-weight-1m': '20'},
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://stub") as client:
+            self.assertEqual(await data_updater.fetch_binance_symbols_conditionally(client), {'BTCUSDC'})
+            self.assertEqual(await data_updater.fetch_binance_symbols_conditionally(client), {'BTCUSDC'})
+            self.assertEqual(requests[1].headers['if-none-match'], '"v1"')
+
+            # Close to the weight limit: the previous symbols are reused without a request.
+            data_updater._exchange_info_cache['used_weight'] = data_updater.BINANCE_WEIGHT_LIMIT
+            data_updater._exchange_info_cache['fetched_at'] = time.time()
+            self.assertEqual(await data_updater.fetch_binance_symbols_conditionally(client), {'BTCUSDC'})
+            self.assertEqual(len(requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch, AsyncMock
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data_updater import ProgressState
+from src.event_stream import Broadcaster
+from src.price_feed import PriceFeed, price_topic
+
+class TestBroadcaster(unittest.IsolatedAsyncioTestCase):
+
+    async def test_events_fan_out_to_every_subscriber(self):
+        broadcaster = Broadcaster()
+        first = broadcaster.subscribe(['price:bitcoin'])
+        second = broadcaster.subscribe(['price:bitcoin', 'price:solana'])
+        broadcaster.publish('price:bitcoin', {'price': 1})
+        broadcaster.publish('price:solana', {'price': 2})
+
+        self.assertEqual(await first.get(timeout=1), ('price:bitcoin', {'price': 1}))
+        self.assertEqual(await second.get(timeout=1), ('price:bitcoin', {'price': 1}))
+        self.assertEqual(await second.get(timeout=1), ('price:solana', {'price': 2}))
+        self.assertIsNone(await first.get(timeout=0.01))
+
+        # Late subscribers get the latest event right away.
+        late = broadcaster.subscribe(['price:solana'])
+        self.assertEqual(await late.get(timeout=1), ('price:solana', {'price': 2}))
+
+    async def test_slow_consumer_keeps_latest_events_then_is_dropped(self):
+        broadcaster = Broadcaster(queue_size=2, max_drops=3)
+        slow = broadcaster.subscribe(['refresh-status'])
+        for current in range(5):
+            broadcaster.publish('refresh-status', {'current': current})
+        self.assertEqual(slow.dropped, 3)
+        self.assertEqual((await slow.get(timeout=1))[1], {'current': 3})
+        self.assertEqual((await slow.get(timeout=1))[1], {'current': 4})
+        # Caught up: the earlier losses no longer count towards the disconnection.
+        self.assertEqual((slow.dropped, slow.dropped_total), (0, 3))
+        for current in range(5, 10):
+            broadcaster.publish('refresh-status', {'current': current})
+        self.assertFalse(slow.closed)
+        self.assertEqual(broadcaster.stats()['dropped_events'], 6)
+
+        broadcaster.publish('refresh-status', {'current': 10})
+        self.assertTrue(slow.closed)
+        self.assertEqual(broadcaster.subscriber_count('refresh-status'), 0)
+
+    async def test_progress_changes_from_a_thread_are_published(self):
+        broadcaster = Broadcaster()
+        broadcaster.attach(asyncio.get_running_loop())
+        progress = ProgressState({'status': 'idle'})
+        progress.listeners.append(lambda snapshot: broadcaster.publish_threadsafe('refresh-status', snapshot))
+        subscription = broadcaster.subscribe(['refresh-status'])
+
+        thread = threading.Thread(target=progress.__setitem__, args=('status', 'running'))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(await subscription.get(timeout=1), ('refresh-status', {'status': 'running'}))
+
+    async def test_throttled_publishing_keeps_the_latest_event(self):
+        broadcaster = Broadcaster(queue_size=100)
+        broadcaster.attach(asyncio.get_running_loop())
+        subscription = broadcaster.subscribe(['refresh-status'])
+
+        def update():
+            for current in range(1000):
+                broadcaster.publish_threadsafe('refresh-status', {'current': current}, min_interval=0.05)
+
+        thread = threading.Thread(target=update)
+        thread.start()
+        thread.join()
+
+        events = []
+        while (item := await subscription.get(timeout=0.2)) is not None:
+            events.append(item[1]['current'])
+        self.assertLessEqual(len(events), 3)
+        self.assertEqual(events[-1], 999)
+
+    async def test_event_cleared_by_attach_is_not_published(self):
+        broadcaster = Broadcaster()
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        broadcaster.attach(loop)
+        subscription = broadcaster.subscribe(['refresh-status'])
+        broadcaster.publish_threadsafe('refresh-status', {'current': 1}, min_interval=0.05)
+        broadcaster.attach(loop)
+
+        self.assertIsNone(await subscription.get(timeout=0.2))
+        self.assertEqual(errors, [])
+
+class TestPriceFeed(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.price_feed.resolve_prices', new_callable=AsyncMock)
+    async def test_one_lookup_per_round_for_all_subscribers(self, mock_resolve):
+        mock_resolve.return_value = [{'coin_id': 'bitcoin', 'symbol': 'BTC', 'price': 67000.0, 'source': 'Binance'}]
+        broadcaster = Broadcaster()
+        feed = PriceFeed(broadcaster, interval=3600)
+        item = {'symbol': 'BTC', 'coin_id': 'bitcoin', 'is_tradable': True}
+        subscriptions = [broadcaster.subscribe([price_topic('bitcoin')]) for _ in range(10)]
+        feed.watch([item])
+        feed.watch([item])
+        try:
+            for subscription in subscriptions:
+                topic, event = await subscription.get(timeout=1)
+                self.assertEqual(event['price'], 67000.0)
+            mock_resolve.assert_awaited_once_with([item])
+
+            # An unchanged price is not pushed again.
+            await feed.poll_once()
+            self.assertIsNone(await subscriptions[0].get(timeout=0.01))
+        finally:
+            await feed.stop()
+
+        feed.unwatch(['bitcoin'])
+        self.assertEqual(feed.status()['watched_coins'], 1)
+        feed.unwatch(['bitcoin'])
+        self.assertEqual(feed.status()['watched_coins'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import gzip
+import json
+
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.dataset import Dataset
+from src.fast_json import EncodedBody, dumps
+
+COINS = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethena', 'name': 'Ethena', 'symbol': 'ENA', 'is_tradable_on_binance_vs_usdc': False},
+]
+
+
+class TestEncodedBody(unittest.TestCase):
+
+    def test_variants(self):
+        encoded = EncodedBody(COINS)
+        self.assertEqual(json.loads(encoded.identity), COINS)
+        self.assertEqual(gzip.decompress(encoded.gzip), encoded.identity)
+        self.assertEqual(encoded.variant("gzip, deflate")[1], "gzip")
+        self.assertEqual(encoded.variant("")[1], None)
+        self.assertEqual(EncodedBody(COINS).etag, encoded.etag)
+        self.assertEqual(dumps({'name': 'Éther'}), '{"name":"Éther"}'.encode('utf-8'))
+
+
+class TestPairsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.dataset_store.current
+        main.dataset_store.current = Dataset(COINS, version=7)
+        # Without the context manager, the application lifespan (upstream clients, file watcher) is not run.
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.dataset_store.current = self.previous
+
+    def test_full_list_is_pre_encoded_and_conditional(self):
+        response = self.client.get('/api/pairs', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(response.json(), COINS)
+        self.assertEqual(response.headers['x-dataset-version'], '7')
+        self.assertEqual(response.headers['x-total-count'], '3')
+
+        etag = response.headers['etag']
+        response = self.client.get('/api/pairs', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_search_responses_carry_an_etag(self):
+        response = self.client.get('/api/pairs', params={'search': 'eth'})
+        self.assertEqual([c['id'] for c in response.json()], ['ethereum', 'ethena'])
+        response = self.client.get('/api/pairs', params={'search': 'eth'}, headers={'If-None-Match': response.headers['etag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_paging_without_search(self):
+        response = self.client.get('/api/pairs', params={'limit': 1, 'offset': 1})
+        self.assertEqual(response.json(), [COINS[1]])
+        self.assertEqual(response.headers['x-total-count'], '3')
+
+
+if __name__ == '__main__':
+    unittest.main()
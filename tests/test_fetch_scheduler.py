@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.fetch_scheduler import TokenBucket, fetch_pages, get_with_retry, retry_after_seconds
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+
+    async def test_waits_instead_of_failing(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        # Two tokens of burst, then three more at 50 per second.
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertGreater(bucket.waited, 0)
+
+
+class TestGetWithRetry(unittest.IsolatedAsyncioTestCase):
+
+    async def test_honours_retry_after_on_429(self):
+        calls = []
+
+        def handler(request):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0.2"})
+            return httpx.Response(200, json=[{"id": "bitcoin"}])
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://stub") as client:
+            response = await get_with_retry(client, "/markets", TokenBucket(rate=1000, capacity=10))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(calls[1] - calls[0], 0.2)
+
+    async def test_gives_up_after_max_retries(self):
+        def handler(request):
+            return httpx.Response(503)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://stub") as client:
+            with patch('src.fetch_scheduler.asyncio.sleep', return_value=None):
+                response = await get_with_retry(client, "/markets", TokenBucket(rate=1000, capacity=10), max_retries=2)
+        self.assertEqual(response.status_code, 503)
+
+    def test_retry_after_formats(self):
+        self.assertEqual(retry_after_seconds(httpx.Response(429, headers={"Retry-After": "7"})), 7.0)
+        self.assertIsNone(retry_after_seconds(httpx.Response(429)))
+        self.assertEqual(retry_after_seconds(httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})), 0.0)
+
+
+class TestFetchPages(unittest.IsolatedAsyncioTestCase):
+
+    async def test_bounded_concurrency_and_page_order(self):
+        in_flight = 0
+        peak = 0
+
+        async def fetch_page(page):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01 * (6 - page))
+            in_flight -= 1
+            return [page * 10, page * 10 + 1]
+
+        results = await fetch_pages(fetch_page, range(1, 6), concurrency=2)
+        self.assertEqual(results, [10, 11, 20, 21, 30, 31, 40, 41, 50, 51])
+        self.assertEqual(peak, 2)
+
+    async def test_stops_at_first_empty_page(self):
+        async def fetch_page(page):
+            return [page] if page < 3 else []
+
+        self.assertEqual(await fetch_pages(fetch_page, range(1, 10), concurrency=1), [1, 2])
+
+    async def test_resumes_after_a_failure(self):
+        fetched = []
+        failing = {3}
+
+        async def fetch_page(page):
+            if page in failing:
+                raise httpx.ConnectError("boom")
+            fetched.append(page)
+            return [page]
+
+        done = {}
+        with self.assertRaises(httpx.ConnectError):
+            await fetch_pages(fetch_page, range(1, 5), concurrency=1, done=done)
+        self.assertEqual(sorted(done), [1, 2])
+
+        failing.clear()
+        fetched.clear()
+        self.assertEqual(await fetch_pages(fetch_page, range(1, 5), concurrency=2, done=done), [1, 2, 3, 4])
+        self.assertEqual(sorted(fetched), [3, 4])
+
+    async def test_overlapping_pages_deduplicated_by_key(self):
+        # Page 1 was fetched by an earlier run: 'c' has since moved from page 2 up to page 1.
+        done = {1: [{'id': 'a'}, {'id': 'b'}, {'id': 'c', 'page': 1}]}
+
+        async def fetch_page(page):
+            return {2: [{'id': 'c', 'page': 2}, {'id': 'd'}], 3: [{'id': 'e'}]}[page]
+
+        results = await fetch_pages(fetch_page, range(1, 4), done=done, key=lambda coin: coin['id'])
+        self.assertEqual([coin['id'] for coin in results], ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(results[2]['page'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
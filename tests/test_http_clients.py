@@ -0,0 +1,55 @@
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import http_clients
+from src.http_clients import PoolStats, upstream_client
+
+class TestHttpClients(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await http_clients.close_upstream_clients()
+
+    async def test_shared_client_is_reused_within_lifespan(self):
+        """The same pooled client is handed out for every call once started."""
+        await http_clients.start_upstream_clients()
+        async with upstream_client('binance') as first:
+            pass
+        async with upstream_client('binance') as second:
+            pass
+        self.assertIs(first, second)
+        self.assertFalse(first.is_closed)
+        self.assertEqual(str(first.base_url), http_clients.UPSTREAMS['binance'].base_url)
+
+    async def test_short_lived_client_outside_lifespan(self):
+        """Without the lifespan, each call gets its own client, closed afterwards."""
+        async with upstream_client('coingecko') as client:
+            self.assertNotIn(client, http_clients._clients.values())
+        self.assertTrue(client.is_closed)
+
+    async def test_stats_are_exposed_per_upstream(self):
+        await http_clients.start_upstream_clients()
+        stats = http_clients.get_pool_stats()
+        self.assertEqual(set(stats), set(http_clients.UPSTREAMS))
+        self.assertEqual(stats['jupiter']['open_connections'], 0)
+        self.assertIsNone(stats['jupiter']['reuse_ratio'])
+
+class TestPoolStats(unittest.TestCase):
+
+    def test_reuse_ratio_and_wait(self):
+        stats = PoolStats()
+        stats.record(0.0, {'connection.connect_tcp.started': 0.002, 'http11.send_request_headers.started': 0.05})
+        stats.record(1.0, {'http11.send_request_headers.started': 1.001})
+        stats.record(2.0, {'http11.send_request_headers.started': 2.003})
+        stats.record(3.0, {'http11.send_request_headers.started': 3.001})
+        result = stats.as_dict()
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['new_connections'], 1)
+        self.assertEqual(result['reuse_ratio'], 0.75)
+        self.assertAlmostEqual(result['max_wait_ms'], 3.0, places=3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import sys
+import os
+import asyncio
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import http_clients
+from src.http_clients import UpstreamConfig
+from src.jupiter_client import (
+    DEMO_POSITIONS, JupiterLendError, get_lend_positions, get_lend_positions_batch, positions_cache,
+)
+from tests.stubs import JupiterLendStub
+
+POSITION = {"collateral": "SOL", "collateralValue": 1000.0, "borrowed": "USDC", "borrowValue": 500.0}
+
+
+class TestJupiterClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        positions_cache.clear()
+        self.stub = JupiterLendStub(positions={"alice": [POSITION]}, failures={"broken": 500}, delay=0.05)
+        await self.stub.__aenter__()
+        upstreams = dict(http_clients.UPSTREAMS, jupiter=UpstreamConfig("jupiter", self.stub.url, 5))
+        self.patcher = patch.dict(http_clients.UPSTREAMS, upstreams)
+        self.patcher.start()
+
+    async def asyncTearDown(self):
+        self.patcher.stop()
+        await self.stub.__aexit__(None, None, None)
+
+    async def test_cached_and_coalesced(self):
+        results = await asyncio.gather(*(get_lend_positions("alice") for _ in range(5)))
+        self.assertTrue(all(result.value == [POSITION] for result in results))
+        self.assertEqual(self.stub.requests, ["alice"])
+
+        result = await get_lend_positions("alice")
+        self.assertTrue(result.cached)
+        self.assertEqual(self.stub.requests, ["alice"])
+
+    async def test_empty_object_means_no_position(self):
+        self.assertEqual((await get_lend_positions("bob")).value, [])
+
+    async def test_errors(self):
+        with self.assertRaises(JupiterLendError) as cm:
+            await get_lend_positions("broken")
+        self.assertEqual(cm.exception.status_code, 500)
+
+    async def test_demo_wallet_needs_no_upstream(self):
+        self.assertEqual((await get_lend_positions("demo")).value, DEMO_POSITIONS)
+        self.assertEqual(self.stub.requests, [])
+
+    async def test_batch_partial_results_and_bounded_concurrency(self):
+        wallets = ["alice", "broken"] + [f"wallet-{i}" for i in range(10)] + ["alice"]
+        results = await get_lend_positions_batch(wallets, concurrency=3)
+
+        self.assertEqual([r["wallet"] for r in results], wallets[:-1])
+        self.assertEqual(results[0]["positions"], [POSITION])
+        self.assertEqual(results[1]["error"]["status_code"], 500)
+        self.assertIsNone(results[1]["positions"])
+        self.assertEqual(results[2]["positions"], [])
+        self.assertLessEqual(self.stub.max_in_flight, 3)
+        self.assertEqual(len(self.stub.requests), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import json
+import logging
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.dataset import Dataset
+from src.fetch_scheduler import TokenBucket
+from src.logging_setup import JsonFormatter
+from src.metrics import Counter, Gauge, Histogram, http_requests, price_fallbacks, rate_limiter_wait
+from src.price_cache import price_cache
+from src.prices import resolve_prices
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_histogram_rendering(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, "/a")
+        lines = histogram.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"])
+        self.assertEqual(lines[2:], [
+            'latency_seconds_bucket{route="/a",le="0.1"} 2',
+            'latency_seconds_bucket{route="/a",le="1"} 3',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+            'latency_seconds_sum{route="/a"} 3.65',
+            'latency_seconds_count{route="/a"} 4',
+        ])
+
+    def test_counter_and_gauges(self):
+        counter = Counter("errors_total", "Errors.", ("kind",))
+        counter.inc('say "hi"')
+        counter.inc('say "hi"', amount=2)
+        self.assertEqual(counter.samples(), ['errors_total{kind="say \\"hi\\""} 3'])
+
+        gauge = Gauge("entries", "Entries.", (), lambda: {(): 12})
+        self.assertEqual(gauge.samples(), ["entries 12"])
+        broken = Gauge("broken", "Broken.", (), lambda: 1 / 0)
+        self.assertEqual(broken.samples(), [])
+
+
+class TestInstrumentation(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        price_cache.clear()
+
+    async def test_rate_limiter_wait(self):
+        bucket = TokenBucket(rate=100, capacity=1, name="test-limiter")
+        before = rate_limiter_wait.count("test-limiter")
+        await bucket.acquire()
+        await bucket.acquire()
+        self.assertEqual(rate_limiter_wait.count("test-limiter"), before + 2)
+
+    @patch('src.prices.get_prices_from_coingecko', new_callable=AsyncMock)
+    @patch('src.prices.get_prices_from_binance', new_callable=AsyncMock)
+    async def test_fallbacks_are_counted(self, mock_binance, mock_coingecko):
+        mock_binance.return_value = {}
+        mock_coingecko.return_value = {'ethereum': 3500.0}
+        before = price_fallbacks.value("binance", "coingecko"), price_fallbacks.value("binance", "none")
+        await resolve_prices([
+            {'symbol': 'eth', 'coin_id': 'ethereum', 'is_tradable': True},
+            {'symbol': 'ghost', 'coin_id': 'ghost', 'is_tradable': True},
+            {'symbol': 'pepe', 'coin_id': 'pepe', 'is_tradable': False},
+        ])
+        self.assertEqual(price_fallbacks.value("binance", "coingecko"), before[0] + 1)
+        self.assertEqual(price_fallbacks.value("binance", "none"), before[1] + 1)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.dataset_store.current
+        main.dataset_store.current = Dataset([
+            {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+        ], version=7)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.dataset_store.current = self.previous
+
+    def test_requests_are_labelled_by_route_template(self):
+        route = "/api/jupiter-lend-positions/{wallet_address}"
+        before = http_requests.value(route, "GET", "200")
+        self.assertEqual(self.client.get('/api/jupiter-lend-positions/DEMO').status_code, 200)
+        self.client.get('/no/such/path')
+        self.assertEqual(http_requests.value(route, "GET", "200"), before + 1)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain; version=0.0.4'))
+        body = response.text
+        self.assertIn(f'cryptotrack_http_request_duration_seconds_count{{route="{route}",method="GET"}}', body)
+        self.assertIn('cryptotrack_http_requests_total{route="unmatched",method="GET",status="404"}', body)
+        self.assertNotIn('/no/such/path', body)
+        self.assertIn('cryptotrack_dataset_version 7', body)
+
+
+class TestJsonFormatter(unittest.TestCase):
+
+    def test_extra_fields(self):
+        record = logging.LogRecord("src.test", logging.INFO, __file__, 1, "Diff: %d added", (3,), None)
+        record.added = 3
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual((entry["level"], entry["logger"], entry["message"], entry["added"]),
+                         ("INFO", "src.test", "Diff: 3 added", 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
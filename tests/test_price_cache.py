@@ -0,0 +1,90 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch, AsyncMock
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.price_cache import AsyncTTLCache
+
+class TestAsyncTTLCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_misses_are_coalesced(self):
+        """N concurrent misses for the same key cause exactly one upstream call."""
+        cache = AsyncTTLCache(ttls={'binance': 10})
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 67000.0
+
+        results = await asyncio.gather(*(cache.get_or_fetch('binance', 'BTCUSDC', fetch) for _ in range(20)))
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(r.value == 67000.0 for r in results))
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['coalesced'], 19)
+
+        cached = await cache.get_or_fetch('binance', 'BTCUSDC', fetch)
+        self.assertTrue(cached.cached)
+        self.assertEqual(calls, 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    async def test_ttl_is_per_source(self):
+        cache = AsyncTTLCache(ttls={'binance': 5, 'coingecko': 60})
+        await cache.put('binance', 'BTCUSDC', 1.0)
+        await cache.put('coingecko', 'bitcoin', 2.0)
+        now = time.monotonic()
+        with patch('src.price_cache.time.monotonic', return_value=now + 30):
+            self.assertIsNone(await cache.get('binance', 'BTCUSDC'))
+            result = await cache.get('coingecko', 'bitcoin')
+        self.assertEqual(result.value, 2.0)
+        self.assertGreaterEqual(result.age, 29)
+
+    async def test_lru_eviction(self):
+        cache = AsyncTTLCache(ttls={}, max_entries=2)
+        await cache.put('coingecko', 'a', 1.0)
+        await cache.put('coingecko', 'b', 2.0)
+        await cache.get('coingecko', 'a')  # 'b' is now the least recently used entry
+        await cache.put('coingecko', 'c', 3.0)
+        self.assertIsNone(await cache.get('coingecko', 'b'))
+        self.assertEqual((await cache.get('coingecko', 'a')).value, 1.0)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    async def test_failures_are_not_cached(self):
+        cache = AsyncTTLCache(ttls={'coingecko': 60})
+        fetch = AsyncMock(side_effect=[None, 3.0])
+        self.assertIsNone((await cache.get_or_fetch('coingecko', 'x', fetch)).value)
+        self.assertEqual((await cache.get_or_fetch('coingecko', 'x', fetch)).value, 3.0)
+        self.assertEqual(fetch.await_count, 2)
+
+    async def test_cancelled_caller_does_not_cancel_the_others(self):
+        cache = AsyncTTLCache(ttls={'binance': 10})
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 67000.0
+
+        first = asyncio.create_task(cache.get_or_fetch('binance', 'BTCUSDC', fetch))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_fetch('binance', 'BTCUSDC', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual((await second).value, 67000.0)
+        self.assertTrue(first.cancelled())
+        self.assertEqual(calls, 1)
+        self.assertTrue((await cache.get_or_fetch('binance', 'BTCUSDC', fetch)).cached)
+
+if __name__ == '__main__':
+    unittest.main()
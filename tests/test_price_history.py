@@ -0,0 +1,127 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.price_history import PriceHistory, PriceSeries, ohlc
+
+
+class TestPriceSeries(unittest.TestCase):
+
+    def test_ring_buffer_keeps_the_latest_points_in_order(self):
+        series = PriceSeries(capacity=300)
+        for i in range(1000):
+            series.append(float(i), float(i) * 2, 0)
+        timestamps, prices, _ = series.arrays()
+        self.assertEqual(series.length, 300)
+        self.assertEqual(timestamps.tolist(), [float(i) for i in range(700, 1000)])
+        self.assertEqual(prices[-1], 1998.0)
+        self.assertEqual(series.tail(2)[0].tolist(), [998.0, 999.0])
+
+
+class TestOhlc(unittest.TestCase):
+
+    def test_buckets(self):
+        timestamps = np.array([0, 1, 2, 10, 11, 35], dtype=np.float64)
+        prices = np.array([5, 7, 3, 4, 6, 9], dtype=np.float64)
+        result = ohlc(timestamps, prices, start=0, end=40, interval=10)
+        self.assertEqual(result, {
+            "t": [0.0, 10.0, 30.0],
+            "open": [5.0, 4.0, 9.0],
+            "high": [7.0, 6.0, 9.0],
+            "low": [3.0, 4.0, 9.0],
+            "close": [3.0, 6.0, 9.0],
+            "count": [3, 2, 1],
+        })
+        self.assertEqual(ohlc(timestamps, prices, start=100, end=200, interval=10)["t"], [])
+
+
+class TestPriceHistory(unittest.IsolatedAsyncioTestCase):
+
+    async def test_resolution_and_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'history.sqlite3')
+            history = PriceHistory(db_path=db_path, resolution=10, capacity=10 ** 9)
+            history.record('bitcoin', 100.0, 'Binance', timestamp=1000)
+            history.record('bitcoin', 101.0, 'Binance', timestamp=1005)  # Within the resolution: dropped.
+            history.record('bitcoin', 102.0, 'Binance', timestamp=1010)
+            history.record('ethereum', None, None, timestamp=1010)
+            self.assertEqual(history.series['bitcoin'].length, 2)
+            self.assertNotIn('ethereum', history.series)
+
+            self.assertEqual(await history.flush(), 2)
+            self.assertEqual(await history.flush(), 0)
+
+            reloaded = PriceHistory(db_path=db_path, resolution=10, capacity=10 ** 9)
+            await reloaded.load()
+            self.assertEqual(reloaded.ohlc('bitcoin', 1000, 1020, 20)['count'], [2])
+            self.assertEqual(await reloaded.flush(), 0)
+
+    async def test_expired_points_pruned_and_series_reloaded_in_bulk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'history.sqlite3')
+            now = time.time()
+            previous_run = PriceHistory(db_path=db_path, resolution=10, capacity=10 ** 9)
+            previous_run.record('bitcoin', 1.0, 'Binance', timestamp=now - 1000)
+            self.assertEqual(await previous_run.flush(), 1)
+
+            # 5 points of 10 s: the point of the previous run is too old to be kept.
+            history = PriceHistory(db_path=db_path, resolution=10, capacity=5)
+            for i in range(5):
+                history.record('bitcoin', 100.0 + i, 'Binance' if i % 2 else 'CoinGecko', timestamp=now - 45 + i * 10)
+            history.record('solana', 20.0, 'CoinGecko', timestamp=now)
+            self.assertEqual(await history.flush(), 6)
+            connection = sqlite3.connect(db_path)
+            self.assertEqual(connection.execute("SELECT COUNT(*), MIN(ts) FROM prices").fetchone(), (6, now - 45))
+            connection.close()
+
+            reloaded = PriceHistory(db_path=db_path, resolution=10, capacity=3)
+            await reloaded.load()
+            timestamps, prices, sources = reloaded.series['bitcoin'].arrays()
+            self.assertEqual(prices.tolist(), [102.0, 103.0, 104.0])
+            self.assertEqual([reloaded.sources[code] for code in sources.tolist()], ['CoinGecko', 'Binance', 'CoinGecko'])
+            self.assertEqual(reloaded.series['solana'].arrays()[1].tolist(), [20.0])
+            # A reloaded series keeps growing as a recorded one.
+            reloaded.record('bitcoin', 105.0, 'Binance', timestamp=now + 5)
+            self.assertEqual(reloaded.series['bitcoin'].arrays()[1].tolist(), [103.0, 104.0, 105.0])
+            self.assertEqual(await reloaded.flush(), 1)
+
+
+class TestHistoryEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.price_history.series
+        main.price_history.series = {}
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.price_history.series = self.previous
+
+    def test_history(self):
+        for i in range(6):
+            main.price_history.record('solana', 150.0 + i, 'Binance', timestamp=1000 + 20 * i)
+        response = self.client.get('/api/history', params={'coin_ids': 'solana,bitcoin', 'start': 1000, 'end': 1120, 'interval': 60})
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['series']
+        self.assertEqual(series['solana']['open'], [150.0, 153.0])
+        self.assertEqual(series['solana']['close'], [152.0, 155.0])
+        self.assertEqual(series['bitcoin']['t'], [])
+
+        response = self.client.get('/api/history', params={'coin_ids': 'solana', 'start': 0, 'end': 10 ** 6, 'interval': 1})
+        self.assertEqual(response.status_code, 400)
+        for params in ({'start': 'nan'}, {'end': 'inf'}, {'start': '-inf', 'end': 1000}, {'interval': 'inf'}):
+            response = self.client.get('/api/history', params={'coin_ids': 'solana', **params})
+            self.assertEqual(response.status_code, 400, params)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.price_cache import price_cache
+from src.prices import resolve_prices
+
+class TestResolvePrices(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        price_cache.clear()
+
+    @patch('src.prices.get_prices_from_coingecko', new_callable=AsyncMock)
+    @patch('src.prices.get_prices_from_binance', new_callable=AsyncMock)
+    async def test_fallback_semantics_per_coin(self, mock_binance, mock_coingecko):
+        """Binance first for tradable coins, CoinGecko for the rest and for Binance misses."""
+        mock_binance.return_value = {'BTCUSDC': 67000.0}
+        mock_coingecko.return_value = {'ethereum': 3500.0, 'pepe': 0.00001}
+
+        results = await resolve_prices([
+            {'symbol': 'btc', 'coin_id': 'bitcoin', 'is_tradable': True},
+            {'symbol': 'eth', 'coin_id': 'ethereum', 'is_tradable': True},
+            {'symbol': 'pepe', 'coin_id': 'pepe', 'is_tradable': False},
+            {'symbol': 'ghost', 'coin_id': 'ghost', 'is_tradable': False},
+        ])
+
+        mock_binance.assert_awaited_once_with({'BTCUSDC', 'ETHUSDC'})
+        mock_coingecko.assert_awaited_once_with({'ethereum', 'pepe', 'ghost'})
+        self.assertEqual([(r['price'], r['source']) for r in results], [
+            (67000.0, 'Binance'),
+            (3500.0, 'Binance (fallback CoinGecko)'),
+            (0.00001, 'CoinGecko'),
+            (None, None),
+        ])
+
+    @patch('src.prices.get_prices_from_coingecko', new_callable=AsyncMock)
+    @patch('src.prices.get_prices_from_binance', new_callable=AsyncMock)
+    async def test_cached_prices_are_not_fetched_again(self, mock_binance, mock_coingecko):
+        mock_binance.return_value = {'BTCUSDC': 67000.0}
+        mock_coingecko.return_value = {'pepe': 0.00001}
+        items = [
+            {'symbol': 'btc', 'coin_id': 'bitcoin', 'is_tradable': True},
+            {'symbol': 'pepe', 'coin_id': 'pepe', 'is_tradable': False},
+        ]
+        await resolve_prices(items)
+        results = await resolve_prices(items)
+
+        self.assertEqual(mock_binance.await_count, 1)
+        self.assertEqual(mock_coingecko.await_count, 1)
+        self.assertTrue(all(r['cached'] for r in results))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.dataset import Dataset
+from src.risk_engine import PositionBook, resolve_symbol_prices
+
+POSITIONS = [
+    # Revalued with our prices: 10 SOL at 150 against 600 USDC.
+    {"collateral": "SOL", "collateralAmount": 10, "collateralValue": 1000, "borrowed": "USDC", "borrowAmount": 600, "borrowValue": 600},
+    # Reported values only, with its own liquidation threshold.
+    {"collateral": "JitoSOL", "collateralValue": 2000, "borrowed": "USDT", "borrowValue": 1500, "liquidationThreshold": 80},
+    # No borrow.
+    {"collateral": "SOL", "collateralAmount": 1, "collateralValue": 150, "borrowed": "USDC", "borrowAmount": 0, "borrowValue": 0},
+]
+PRICES = {"SOL": 150.0, "USDC": 1.0, "USDT": None}
+
+
+class TestPositionBook(unittest.TestCase):
+
+    def test_revalues_and_computes_risk(self):
+        result = PositionBook(POSITIONS).evaluate(PRICES)
+        first, second, third = result["positions"]
+
+        self.assertEqual(first["collateralValue"], 1500.0)
+        self.assertEqual(first["ratio"], 40.0)
+        self.assertEqual(first["healthFactor"], 2.125)
+        self.assertEqual(first["riskLevel"], "safe")
+        self.assertEqual(first["liquidationPrice"], round(600 / (10 * 0.85), 6))
+        self.assertTrue(first["revalued"])
+
+        self.assertEqual(second["collateralValue"], 2000.0)
+        self.assertEqual(second["healthFactor"], round(2000 * 0.8 / 1500, 3))
+        self.assertEqual(second["riskLevel"], "critical")
+        self.assertFalse(second["revalued"])
+        self.assertIsNone(second["liquidationPrice"])
+
+        self.assertIsNone(third["healthFactor"])
+        self.assertEqual(third["riskLevel"], "safe")
+
+        self.assertEqual(result["summary"]["totalCollateralValue"], 3650.0)
+        self.assertEqual(result["summary"]["riskLevels"], {"safe": 2, "risky": 0, "critical": 1})
+        self.assertEqual(result["scenarios"], [])
+
+    def test_scenarios(self):
+        scenarios = [{"sol": -20}, {"SOL": -60, "JitoSOL": -50}, {"USDC": 100}]
+        result = PositionBook(POSITIONS).evaluate(PRICES, scenarios)
+        sol_down, crash, depeg = result["scenarios"]
+
+        self.assertEqual(sol_down["healthFactor"][0], round(1200 * 0.85 / 600, 3))
+        self.assertEqual(sol_down["healthFactor"][1], result["positions"][1]["healthFactor"])
+        self.assertEqual(crash["riskLevel"][:2], ["critical", "critical"])
+        self.assertEqual(crash["summary"]["liquidatable"], 2)
+        self.assertEqual(depeg["ratio"][0], 80.0)
+        # Positions without borrow are unaffected by any shock.
+        self.assertTrue(all(scenario["healthFactor"][2] is None for scenario in result["scenarios"]))
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValueError):
+            PositionBook([{"collateral": "SOL", "collateralValue": "a lot"}])
+        with self.assertRaises(ValueError):
+            PositionBook([{"collateral": 42, "collateralValue": 10}])
+
+    def test_many_positions(self):
+        positions = [dict(POSITIONS[i % 3], collateralAmount=1 + i % 7) for i in range(5000)]
+        scenarios = [{"SOL": -shock} for shock in range(0, 100, 5)]
+        result = PositionBook(positions).evaluate(PRICES, scenarios)
+        self.assertEqual(len(result["scenarios"]), 20)
+        liquidatable = [scenario["summary"]["liquidatable"] for scenario in result["scenarios"]]
+        self.assertEqual(liquidatable, sorted(liquidatable))
+
+
+class TestResolveSymbolPrices(unittest.IsolatedAsyncioTestCase):
+
+    async def test_maps_symbols_to_best_ranked_coin(self):
+        dataset = Dataset([
+            {'id': 'solana', 'name': 'Solana', 'symbol': 'sol', 'is_tradable_on_binance_vs_usdc': True},
+            {'id': 'sol-wormhole', 'name': 'SOL (Wormhole)', 'symbol': 'sol', 'is_tradable_on_binance_vs_usdc': False},
+        ])
+        resolved = [{'symbol': 'SOL', 'coin_id': 'solana', 'price': 150.0, 'source': 'Binance'}]
+        with patch('src.risk_engine.resolve_prices', AsyncMock(return_value=resolved)) as mock_resolve:
+            prices = await resolve_symbol_prices(['SOL', 'UNKNOWN'], dataset.coins_by_symbol)
+
+        mock_resolve.assert_awaited_once_with([{'symbol': 'SOL', 'coin_id': 'solana', 'is_tradable': True}])
+        self.assertEqual(prices['SOL']['price'], 150.0)
+        self.assertNotIn('UNKNOWN', prices)
+
+
+class TestRiskEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.dataset_store.current
+        main.dataset_store.current = Dataset([
+            {'id': 'solana', 'name': 'Solana', 'symbol': 'sol', 'is_tradable_on_binance_vs_usdc': True},
+            {'id': 'usd-coin', 'name': 'USDC', 'symbol': 'usdc', 'is_tradable_on_binance_vs_usdc': False},
+        ], version=7)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.dataset_store.current = self.previous
+
+    def test_demo_wallet_with_scenario(self):
+        resolved = [
+            {'symbol': 'SOL', 'coin_id': 'solana', 'price': 100.0, 'source': 'Binance'},
+            {'symbol': 'USDC', 'coin_id': 'usd-coin', 'price': 1.0, 'source': 'CoinGecko'},
+        ]
+        with patch('src.risk_engine.resolve_prices', AsyncMock(return_value=resolved)):
+            response = self.client.post('/api/lending/risk', json={
+                'wallets': ['DEMO'],
+                'scenarios': [{'name': 'SOL -20%', 'shocks': {'SOL': -20}}],
+            })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual(body['errors'], [])
+        self.assertEqual(body['prices']['SOL'], {'price': 100.0, 'source': 'Binance'})
+        sol = body['positions'][0]
+        self.assertEqual((sol['wallet'], sol['collateralValue']), ('DEMO', 1000.0))
+        self.assertEqual(sol['healthFactor'], round(1000 * 0.85 / 750.25, 3))
+        self.assertEqual(body['scenarios'][0]['name'], 'SOL -20%')
+        self.assertEqual(body['scenarios'][0]['healthFactor'][0], round(800 * 0.85 / 750.25, 3))
+
+    def test_validation(self):
+        response = self.client.post('/api/lending/risk', json={'scenarios': [{'shocks': {'SOL': -150}}]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/lending/risk', json={'positions': [{'collateral': 'SOL', 'borrowValue': 'x'}]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/lending/risk', json={'positions': [{'collateral': ['SOL'], 'borrowed': 'USDC'}]})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
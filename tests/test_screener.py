@@ -0,0 +1,121 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.columnar import write_columnar
+from src.data_updater import build_records
+from src.dataset import Dataset, read_dataset_file
+from src.screener import MarketTable, ScreenerError, parse_filter
+
+COINS = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True,
+     'current_price': 67000.0, 'market_cap': 1.3e12, 'market_cap_rank': 1, 'total_volume': 3e10, 'price_change_percentage_24h': 1.5},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True,
+     'current_price': 3500.0, 'market_cap': 4.2e11, 'market_cap_rank': 2, 'total_volume': 1.5e10, 'price_change_percentage_24h': -2.0},
+    {'id': 'tether', 'name': 'Tether', 'symbol': 'USDT', 'is_tradable_on_binance_vs_usdc': False,
+     'current_price': 1.0, 'market_cap': 1.1e11, 'market_cap_rank': 3, 'total_volume': 5e10, 'price_change_percentage_24h': 0.01},
+    {'id': 'solana', 'name': 'Solana', 'symbol': 'SOL', 'is_tradable_on_binance_vs_usdc': True,
+     'current_price': 150.0, 'market_cap': 7e10, 'market_cap_rank': 4, 'total_volume': 3e9, 'price_change_percentage_24h': 6.5},
+    {'id': 'new-coin', 'name': 'New Coin', 'symbol': 'NEW', 'is_tradable_on_binance_vs_usdc': True,
+     'current_price': 0.5},
+]
+
+
+def ids(coins):
+    return [coin['id'] for coin in coins]
+
+
+class TestMarketTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'coins.cols')
+        write_columnar(path, COINS)
+        # The same queries over plain dicts and over the memory-mapped columnar file.
+        self.tables = [MarketTable(COINS), MarketTable(read_dataset_file(path)[0])]
+
+    def tearDown(self):
+        self.tables.clear()
+        self.tmp.cleanup()
+
+    def test_filters_and_missing_values(self):
+        for table in self.tables:
+            self.assertEqual(table.screen([parse_filter('total_volume>=1e10')])[1], 3)
+            matches, total = table.screen([parse_filter('total_volume>=1e10')], tradable=True)
+            self.assertEqual((ids(matches), total), (['bitcoin', 'ethereum'], 2))
+            # A coin without a 24h change never matches a filter on it, even '!='.
+            self.assertEqual(ids(table.screen([parse_filter('price_change_percentage_24h != 0')])[0]),
+                             ['bitcoin', 'ethereum', 'tether', 'solana'])
+            self.assertEqual(ids(table.screen(tradable=False)[0]), ['tether'])
+
+    def test_sort_and_top_k(self):
+        for table in self.tables:
+            top, total = table.screen(sort='price_change_percentage_24h', descending=True, limit=2)
+            self.assertEqual((ids(top), total), (['solana', 'bitcoin'], 5))
+            # Missing values come last in either direction.
+            self.assertEqual(ids(table.screen(sort='total_volume')[0])[-1], 'new-coin')
+            self.assertEqual(ids(table.screen(sort='total_volume', descending=True)[0])[-1], 'new-coin')
+            page, _ = table.screen(sort='current_price', limit=2, offset=1)
+            self.assertEqual(ids(page), ['tether', 'solana'])
+            self.assertEqual(table.screen(limit=2, offset=10), ([], 5))
+
+    def test_ties_keep_coin_list_order(self):
+        coins = [dict(coin, total_volume=1.0) for coin in COINS]
+        table = MarketTable(coins)
+        self.assertEqual(ids(table.screen(sort='total_volume', limit=3)[0]), ['bitcoin', 'ethereum', 'tether'])
+
+    def test_invalid_expressions(self):
+        for expression in ('volume>1', 'market_cap=>1', 'market_cap>abc', 'market_cap>nan'):
+            with self.assertRaises(ScreenerError):
+                parse_filter(expression)
+        with self.assertRaises(ScreenerError):
+            self.tables[0].screen(sort='name')
+
+    def test_build_records_keeps_market_fields(self):
+        markets = [
+            {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'btc', 'current_price': 67000, 'market_cap': 1300000000000,
+             'market_cap_rank': 1, 'total_volume': 30000000000.5, 'price_change_percentage_24h': 1.5},
+            {'id': 'new-coin', 'name': 'New Coin', 'symbol': 'new', 'current_price': 0.5, 'market_cap_rank': None},
+        ]
+        records = build_records(markets, {'BTCUSDC'})
+        self.assertEqual(records[0]['market_cap_rank'], 1)
+        self.assertEqual(records[0]['current_price'], 67000.0)
+        self.assertNotIn('market_cap_rank', records[1])
+        self.assertEqual(records[1]['current_price'], 0.5)
+
+
+class TestScreenerEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.dataset_store.current
+        main.dataset_store.current = Dataset(COINS, version=3)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.dataset_store.current = self.previous
+
+    def test_screener(self):
+        response = self.client.get('/api/screener', params=[
+            ('tradable', 'true'), ('filter', 'market_cap>=1e10'), ('filter', 'total_volume>1e9'),
+            ('sort', '-price_change_percentage_24h'), ('limit', 2),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ids(response.json()), ['solana', 'bitcoin'])
+        self.assertEqual(response.headers['X-Total-Count'], '3')
+        self.assertEqual(response.headers['X-Dataset-Version'], '3')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/screener', params={'filter': 'volume>1'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/screener', params={'sort': '-name'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/screener', params={'limit': 0}).status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.search_index import FuzzyIndex, PrefixIndex, bounded_edit_distance
+
+# Saved in market-cap order, like the data file.
+COINS = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethereum', 'name': 'Ethereum', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'binancecoin', 'name': 'BNB', 'symbol': 'BNB', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'bitcoin-cash', 'name': 'Bitcoin Cash', 'symbol': 'BCH', 'is_tradable_on_binance_vs_usdc': True},
+    {'id': 'ethena', 'name': 'Ethena', 'symbol': 'ENA', 'is_tradable_on_binance_vs_usdc': False},
+    {'id': 'ether-fi', 'name': 'ether.fi', 'symbol': 'ETHFI', 'is_tradable_on_binance_vs_usdc': False},
+    {'id': 'eth-wrapped', 'name': 'Wrapped Ether', 'symbol': 'ETH', 'is_tradable_on_binance_vs_usdc': False},
+]
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex(COINS)
+
+    def linear_scan(self, query):
+        query = query.lower()
+        return {c['id'] for c in COINS if c['name'].lower().startswith(query) or c['symbol'].lower().startswith(query)}
+
+    def test_matches_the_linear_scan(self):
+        for query in ['b', 'bi', 'BITCOIN', 'bitcoin c', 'e', 'eth', 'ether', 'x', 'wrapped']:
+            results, total = self.index.search(query)
+            self.assertEqual({c['id'] for c in results}, self.linear_scan(query), query)
+            self.assertEqual(total, len(results))
+
+    def test_exact_symbol_first_then_market_cap_rank(self):
+        results, _ = self.index.search('eth')
+        self.assertEqual([c['id'] for c in results], ['ethereum', 'eth-wrapped', 'ethena', 'ether-fi'])
+
+    def test_limit_and_offset(self):
+        results, total = self.index.search('b', limit=2)
+        self.assertEqual([c['id'] for c in results], ['bitcoin', 'binancecoin'])
+        self.assertEqual(total, 3)
+        results, _ = self.index.search('b', limit=2, offset=2)
+        self.assertEqual([c['id'] for c in results], ['bitcoin-cash'])
+
+
+class TestFuzzyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = FuzzyIndex(COINS)
+
+    def test_bounded_edit_distance(self):
+        self.assertEqual(bounded_edit_distance('ethereum', 'ethereum', 2), 0)
+        self.assertEqual(bounded_edit_distance('etherum', 'ethereum', 2), 1)
+        self.assertEqual(bounded_edit_distance('btc', 'bct', 2), 2)
+        # Past the bound, the distance is reported as max_distance + 1.
+        self.assertEqual(bounded_edit_distance('bitcoin', 'solana', 2), 3)
+
+    def test_tolerates_typos(self):
+        self.assertEqual(self.index.search('etherum')[0]['id'], 'ethereum')
+        self.assertEqual(self.index.search('bitconi')[0]['id'], 'bitcoin')
+
+    def test_matches_misspelled_prefixes(self):
+        self.assertIn('ethereum', [c['id'] for c in self.index.search('etheru')])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('zzzzzzzz'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.alerts import ALL_ALERTS_TOPIC, AlertScheduler
+from src.event_stream import Broadcaster
+from src.price_cache import AsyncTTLCache
+from src.shared_state import LEADER_LEASE, PROGRESS_KEY, SharedState, SharedStateSync, progress_writer
+
+
+class SharedStateTestCase(unittest.IsolatedAsyncioTestCase):
+    """Each SharedState plays one worker process: its own owner id and connection to the same file."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'shared.sqlite3')
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def worker(self, owner):
+        return SharedState(self.path, lease_ttl=30, owner=owner, clock=lambda: self.now)
+
+
+class TestLeases(SharedStateTestCase):
+
+    def test_single_holder_until_release_or_expiry(self):
+        a, b = self.worker('a'), self.worker('b')
+        self.assertTrue(a.acquire('refresh'))
+        self.assertFalse(b.acquire('refresh'))
+        self.assertTrue(a.acquire('refresh'))  # Re-acquiring renews.
+        self.assertEqual(b.holder('refresh'), 'a')
+
+        a.release('refresh')
+        self.assertTrue(b.acquire('refresh'))
+        self.assertFalse(a.renew('refresh'))
+
+        # A worker that stops renewing (killed) loses the lease once it expires.
+        self.now += 31
+        self.assertIsNone(a.holder('refresh'))
+        self.assertTrue(a.acquire('refresh'))
+
+    def test_versioned_values(self):
+        a, b = self.worker('a'), self.worker('b')
+        self.assertIsNone(b.get_value(PROGRESS_KEY))
+        self.assertEqual(a.set_value(PROGRESS_KEY, {'status': 'running'}), 1)
+        self.assertEqual(a.set_value(PROGRESS_KEY, {'status': 'complete'}), 2)
+        self.assertEqual(b.get_value(PROGRESS_KEY), (2, 'a', {'status': 'complete'}))
+
+    def test_reset_clears_a_previous_run(self):
+        a = self.worker('a')
+        a.acquire('refresh')
+        a.set_value(PROGRESS_KEY, {'status': 'running'})
+        self.worker('launcher').reset()
+        self.assertIsNone(a.holder('refresh'))
+        self.assertIsNone(a.get_value(PROGRESS_KEY))
+
+    def test_progress_writer_throttles_item_updates(self):
+        a = self.worker('a')
+        write = progress_writer(a, min_interval=60)
+        write({'status': 'running', 'stage': 'Fetching', 'current': 1})
+        write({'status': 'running', 'stage': 'Fetching', 'current': 2})
+        # Writes are queued on the state thread: wait for them before reading.
+        self.assertEqual(a.submit(a.get_value, PROGRESS_KEY).result()[2]['current'], 1)
+        write({'status': 'complete', 'stage': 'Done', 'current': 3})
+        self.assertEqual(a.submit(a.get_value, PROGRESS_KEY).result()[:2], (2, 'a'))
+
+
+class TestSharedPriceCache(SharedStateTestCase):
+
+    async def test_prices_fetched_once_across_workers(self):
+        caches = [AsyncTTLCache({'binance': 10}, shared=SharedState(self.path, owner=owner)) for owner in 'ab']
+        calls = 0
+        fetching = asyncio.Event()
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            fetching.set()
+            await asyncio.sleep(0.1)
+            return 67000.0
+
+        # The second worker misses while the first one is fetching: it waits for its result.
+        first = asyncio.create_task(caches[0].get_or_fetch('binance', 'BTCUSDC', fetch))
+        await fetching.wait()
+        second = await caches[1].get_or_fetch('binance', 'BTCUSDC', fetch)
+        first = await first
+        self.assertEqual(calls, 1)
+        self.assertEqual((first.value, first.cached), (67000.0, False))
+        self.assertEqual((second.value, second.cached), (67000.0, True))
+        self.assertEqual(caches[1].stats()['shared_waits'], 1)
+
+        await caches[0].put_many('coingecko', {'bitcoin': 1.0, 'ethereum': 2.0})
+        found = await caches[1].get_many('coingecko', ['bitcoin', 'ethereum', 'solana'])
+        self.assertEqual({key: result.value for key, result in found.items()}, {'bitcoin': 1.0, 'ethereum': 2.0})
+        self.assertEqual(caches[1].stats()['shared_hits'], 2)
+
+    async def test_failed_fetch_releases_the_claim(self):
+        caches = [AsyncTTLCache({'binance': 10}, shared=SharedState(self.path, owner=owner)) for owner in 'ab']
+
+        fetching = asyncio.Event()
+
+        async def not_found():
+            fetching.set()
+            await asyncio.sleep(0.05)
+            return None
+
+        async def found():
+            return 1.5
+
+        first = asyncio.create_task(caches[0].get_or_fetch('binance', 'XUSDC', not_found))
+        await fetching.wait()
+        second = await caches[1].get_or_fetch('binance', 'XUSDC', found)
+        self.assertEqual([(await first).value, second.value], [None, 1.5])
+
+
+    async def test_shared_lookups_run_off_the_event_loop(self):
+        state = SharedState(self.path, owner='a')
+        cache = AsyncTTLCache({'binance': 10}, shared=state)
+        threads = []
+        get_prices = state.get_prices
+
+        def recording_get_prices(*args):
+            threads.append(threading.current_thread())
+            return get_prices(*args)
+
+        state.get_prices = recording_get_prices
+        await cache.get_many('binance', ['BTCUSDC'])
+        await cache.get_or_fetch('binance', 'ETHUSDC', lambda: asyncio.sleep(0, 2.0))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+
+class TestSharedStateSync(SharedStateTestCase):
+
+    async def test_progress_relay_and_single_leader(self):
+        a, b = self.worker('a'), self.worker('b')
+        relayed = {'a': [], 'b': []}
+        leadership = []
+
+        async def on_leadership(is_leader):
+            leadership.append(is_leader)
+
+        syncs = {
+            'a': SharedStateSync(a, relayed['a'].append, on_leadership),
+            'b': SharedStateSync(b, relayed['b'].append, on_leadership),
+        }
+        a.set_value(PROGRESS_KEY, {'status': 'running'})
+        await syncs['a'].sync()
+        await syncs['b'].sync()
+        self.assertEqual(relayed, {'a': [], 'b': [{'status': 'running'}]})
+        self.assertEqual((syncs['a'].is_leader, syncs['b'].is_leader), (True, False))
+
+        await syncs['a'].stop()
+        await syncs['b'].sync()
+        self.assertEqual(b.holder(LEADER_LEASE), 'b')
+        self.assertEqual(leadership, [True, False, True])
+
+    async def test_alert_wallets_and_alerts_shared(self):
+        a, b = self.worker('a'), self.worker('b')
+        schedulers = {owner: AlertScheduler(Broadcaster(), dict) for owner in 'ab'}
+        schedulers['a'].on_alert = lambda event: a.add_alert(event, keep=2)
+        subscription = schedulers['b'].broadcaster.subscribe([ALL_ALERTS_TOPIC], replay_latest=False)
+
+        async def on_leadership(is_leader):
+            pass
+
+        syncs = {
+            owner: SharedStateSync(state, lambda progress: None, on_leadership,
+                                   on_wallets=schedulers[owner].sync_wallets, on_alert=schedulers[owner].relay)
+            for owner, state in (('a', a), ('b', b))
+        }
+        # A wallet registered on the worker that is not the leader reaches the leader's scheduler.
+        self.assertEqual(b.add_wallets(['w1', 'w2']), ['w1', 'w2'])
+        self.assertEqual(a.add_wallets(['w2']), [])
+        await syncs['a'].sync()
+        self.assertEqual(sorted(schedulers['a'].wallets), ['w1', 'w2'])
+        self.assertTrue(a.remove_wallet('w2'))
+        await syncs['a'].sync()
+        await syncs['b'].sync()
+        self.assertEqual(list(schedulers['a'].wallets), ['w1'])
+        self.assertEqual(list(schedulers['b'].wallets), ['w1'])
+
+        # The leader's alerts are relayed once to the other worker's subscribers and recent alerts.
+        for previous, level in ((0, 1), (1, 2), (2, 1)):
+            schedulers['a']._emit('w1', 'w1:SOL/USDC', {}, previous, level, 1.1)
+        await syncs['a'].sync()
+        await syncs['b'].sync()
+        await syncs['b'].sync()
+        self.assertEqual([event['level'] for event in schedulers['b'].recent], ['critical', 'risky'])
+        self.assertEqual(subscription.queue.qsize(), 2)
+        self.assertEqual(len(schedulers['a'].recent), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
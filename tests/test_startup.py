@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.dataset import Dataset
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+COINS = [{'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'is_tradable_on_binance_vs_usdc': True}]
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_sdk_not_imported_at_startup(self):
+        code = "import sys, src.main; print('binance' in sys.modules, src.main.startup_report['import_seconds'] > 0)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), ['False', 'True'])
+
+
+class TestHealthEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = main.dataset_store.current
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.dataset_store.current = self.previous
+
+    def test_healthz(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ok')
+
+    def test_readyz_waits_for_startup_and_dataset(self):
+        main.dataset_store.current = None
+        self.assertEqual(self.client.get('/readyz').status_code, 503)
+
+        with patch.dict(main.startup_report, started=True):
+            # Started, but the initial refresh has not produced a dataset yet.
+            response = self.client.get('/readyz')
+            self.assertEqual((response.status_code, response.json()['status']), (503, 'starting'))
+            with patch('src.main.STARTUP_WARM', False):
+                self.assertEqual(self.client.get('/readyz').status_code, 200)
+
+            main.dataset_store.current = Dataset(COINS, version=4)
+            response = self.client.get('/readyz')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['dataset']['version'], 4)
+            self.assertIn('import_seconds', response.json())
+
+
+if __name__ == '__main__':
+    unittest.main()
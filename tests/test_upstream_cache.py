@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import data_updater
+from src.upstream_cache import CACHE, RECORD, REPLAY, CachingTransport, UpstreamCache
+from tests.stubs import BinanceRestStub, CoinGeckoStub, synthetic_market
+
+
+class UpstreamCacheTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.now = 1000.0
+        self.cache = UpstreamCache(self.directory.name, RECORD, ttl=30, max_stale=3600, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def client(self, url, upstream='binance'):
+        transport = CachingTransport(httpx.AsyncHTTPTransport(), upstream, self.cache)
+        return httpx.AsyncClient(base_url=url, transport=transport)
+
+
+class TestRecordAndReplay(UpstreamCacheTestCase):
+
+    async def test_replay_serves_recordings_without_upstream(self):
+        async with BinanceRestStub() as stub:
+            async with self.client(stub.url) as client:
+                recorded = await client.get('/api/v3/ticker/price', params={'symbol': 'BTCUSDC'})
+                await client.get('/api/v3/exchangeInfo')
+        self.assertEqual(recorded.headers.get('x-upstream-cache'), None)
+
+        # The stub is gone, and the host does not matter: only recordings are served.
+        self.cache.mode = REPLAY
+        self.now += 10 * 24 * 3600
+        async with self.client('http://127.0.0.1:9') as client:
+            replayed = await client.get('/api/v3/ticker/price', params={'symbol': 'BTCUSDC'})
+            missing = await client.get('/api/v3/ticker/price', params={'symbol': 'ETHUSDC'})
+        self.assertEqual(replayed.json(), recorded.json())
+        self.assertEqual(replayed.headers['x-upstream-cache'], 'replay')
+        self.assertEqual(missing.status_code, 504)
+        self.assertEqual(self.cache.status()['lookups'], {'miss': 3, 'replay': 1})
+
+        with patch('src.data_updater.upstream_cache', self.cache):
+            self.assertEqual(data_updater.fallback_binance_symbols(), set(stub.prices))
+
+    async def test_stale_response_on_failure(self):
+        async with BinanceRestStub() as stub:
+            async with self.client(stub.url) as client:
+                fresh = await client.get('/api/v3/ticker/price')
+                stub.error_rate = 1.0
+                self.now += 600
+                stale = await client.get('/api/v3/ticker/price')
+                self.assertEqual((stale.status_code, stale.headers['x-upstream-cache']), (200, 'stale'))
+                self.assertEqual(stale.json(), fresh.json())
+                self.assertEqual(stale.headers['age'], '600')
+                # Too old to be served: the failure goes through.
+                self.now += 3600
+                self.assertEqual((await client.get('/api/v3/ticker/price')).status_code, 503)
+        async with self.client('http://127.0.0.1:9') as client:
+            self.now -= 3600
+            stale = await client.get('/api/v3/ticker/price')
+            self.assertEqual(stale.headers['x-upstream-cache'], 'stale')
+
+    async def test_record_reads_bodies_only_when_the_upstream_fails(self):
+        read_body = self.cache.read_body
+        with patch.object(self.cache, 'read_body', side_effect=read_body) as reads:
+            async with BinanceRestStub() as stub:
+                async with self.client(stub.url) as client:
+                    await client.get('/api/v3/exchangeInfo')
+                    await client.get('/api/v3/exchangeInfo')
+                    self.assertEqual(reads.call_count, 0)
+                    stub.error_rate = 1.0
+                    stale = await client.get('/api/v3/exchangeInfo')
+            self.assertEqual(stale.headers['x-upstream-cache'], 'stale')
+            self.assertEqual(reads.call_count, 1)
+        with patch('src.data_updater.upstream_cache', self.cache):
+            self.assertEqual(data_updater.recorded_binance_symbols(), set(stub.prices))
+
+    async def test_stale_while_revalidate(self):
+        self.cache.mode = CACHE
+        async with BinanceRestStub() as stub:
+            async with self.client(stub.url) as client:
+                await client.get('/api/v3/ticker/price')
+                self.assertEqual((await client.get('/api/v3/ticker/price')).headers['x-upstream-cache'], 'hit')
+                self.assertEqual(stub.request_count, 1)
+
+                self.now += 60
+                stub.prices['BTCUSDC'] = 1.0
+                stale = await client.get('/api/v3/ticker/price')
+                self.assertEqual(stale.headers['x-upstream-cache'], 'stale')
+                self.assertNotIn({'symbol': 'BTCUSDC', 'price': '1.0'}, stale.json())
+                for _ in range(50):
+                    if stub.request_count == 2 and not client._transport._revalidating:
+                        break
+                    await asyncio.sleep(0.02)
+                revalidated = await client.get('/api/v3/ticker/price')
+                self.assertEqual(revalidated.headers['x-upstream-cache'], 'hit')
+                self.assertEqual(stub.request_count, 2)
+                self.assertIn('1.0', revalidated.text)
+
+
+class TestStorage(UpstreamCacheTestCase):
+
+    def test_content_addressed_and_bounded(self):
+        headers = [('content-type', 'application/json')]
+        self.cache.store('coingecko', 'GET', '/a?x=1&y=2', 200, headers, b'[1]' * 100)
+        # Same query in another order: same request. Same body under another request: stored once.
+        self.assertIsNotNone(self.cache.lookup('coingecko', 'GET', 'https://other.host/a?y=2&x=1'))
+        self.cache.store('coingecko', 'GET', '/b', 200, headers, b'[1]' * 100)
+        self.assertEqual(self.cache.status()['bytes'], 300)
+
+        self.cache.max_bytes = 1000
+        for i in range(5):
+            self.now += 1
+            self.cache.store('coingecko', 'GET', f'/page/{i}', 200, headers, bytes([i]) * 300)
+            self.cache.lookup('coingecko', 'GET', '/a?x=1&y=2')
+        self.assertLessEqual(self.cache.total_bytes, 1000)
+        # The least recently used responses went first; the one read after every store stayed.
+        self.assertIsNotNone(self.cache.lookup('coingecko', 'GET', '/a?x=1&y=2'))
+        self.assertIsNone(self.cache.lookup('coingecko', 'GET', '/page/0'))
+        self.assertIsNotNone(self.cache.lookup('coingecko', 'GET', '/page/4'))
+        stored = [name for _, _, names in os.walk(os.path.join(self.directory.name, 'bodies')) for name in names]
+        self.assertEqual(len(stored), self.cache.status()['bytes'] // 300)
+
+
+class TestUpdaterReplay(UpstreamCacheTestCase):
+
+    async def test_pages_replay_without_rate_limit(self):
+        market = synthetic_market(1000)
+        async with CoinGeckoStub(market) as stub:
+            async with self.client(stub.url, 'coingecko') as client:
+                with patch('src.data_updater.COINGECKO_CALLS_PER_MINUTE', 6000), patch('src.data_updater.COINGECKO_BURST', 10):
+                    await data_updater.fetch_coingecko_pages(4, {}, client=client)
+
+        self.cache.mode = REPLAY
+        with patch('src.data_updater.replaying', return_value=True), \
+                patch('src.data_updater.COINGECKO_CALLS_PER_MINUTE', 1):
+            async with self.client('http://127.0.0.1:9', 'coingecko') as client:
+                coins = await asyncio.wait_for(data_updater.fetch_coingecko_pages(4, {}, client=client), timeout=5)
+        self.assertEqual([coin['id'] for coin in coins], [coin['id'] for coin in market])
+
+
+if __name__ == '__main__':
+    unittest.main()
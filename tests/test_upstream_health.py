@@ -0,0 +1,172 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src.http_clients import InstrumentedTransport
+from src.price_cache import price_cache
+from src.upstream_health import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, UpstreamHealth, hedged, upstream_health
+from tests.stubs import BinanceRestStub
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        self.health = UpstreamHealth("test", failure_threshold=3, cooldown=30, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures_then_probes(self):
+        self.health.record_failure("HTTP 503")
+        self.health.record_success(0.1)
+        self.health.record_failure("HTTP 503")
+        self.health.record_failure("HTTP 503")
+        self.assertEqual(self.health.state, CLOSED)
+        self.health.record_failure("ReadTimeout")
+        self.assertEqual(self.health.state, OPEN)
+        self.assertFalse(self.health.available())
+        self.assertFalse(self.health.allow())
+
+        # After the cool-down, a single probe goes through; its failure opens the circuit again.
+        self.now += 30
+        self.assertTrue(self.health.available())
+        self.assertTrue(self.health.allow())
+        self.assertEqual(self.health.state, HALF_OPEN)
+        self.assertFalse(self.health.allow())
+        self.health.record_failure("HTTP 451")
+        self.assertEqual(self.health.state, OPEN)
+
+        self.now += 30
+        self.assertTrue(self.health.allow())
+        self.health.record_success(0.2)
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertEqual(self.health.status()["rejected"], 2)
+
+    def test_adaptive_timeout(self):
+        self.assertEqual(self.health.timeout(10), 10)
+        for _ in range(50):
+            self.health.record_success(0.5)
+        self.assertEqual(self.health.timeout(10), 2.0)
+        self.assertEqual(self.health.timeout(1.5), 1.5)
+        self.health.latencies.clear()
+        for _ in range(50):
+            self.health.record_success(0.01)
+        self.assertEqual(self.health.timeout(10), self.health.min_timeout)
+        self.assertEqual(self.health.hedge_delay(), 0.05)
+
+
+    def test_upstream_got_slower(self):
+        for _ in range(50):
+            self.health.record_success(0.01)
+        self.assertEqual(self.health.timeout(10), self.health.min_timeout)
+
+        # Timeouts count with the time they waited: the adaptive timeout grows with them.
+        self.health.record_failure("ReadTimeout", timed_out_after=1.0)
+        self.health.record_failure("ReadTimeout", timed_out_after=1.0)
+        self.assertEqual(self.health.timeout(10), 4.0)
+
+        # Opened, the circuit forgets the old latencies and probes with the configured timeout.
+        self.health.record_failure("ReadTimeout", timed_out_after=4.0)
+        self.assertEqual(self.health.state, OPEN)
+        self.now += 30
+        self.assertTrue(self.health.allow())
+        self.assertEqual(self.health.timeout(10), 10)
+        self.health.record_success(3.0)
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertEqual(self.health.timeout(10), 10)
+
+
+class TestHedged(unittest.IsolatedAsyncioTestCase):
+
+    async def answer(self, value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    async def test_first_usable_answer_wins(self):
+        self.assertEqual(await hedged(lambda: self.answer(1, 0), lambda: self.answer(2, 0), 0.05), (1, "primary"))
+        self.assertEqual(await hedged(lambda: self.answer(1, 0.5), lambda: self.answer(2, 0.01), 0.05), (2, "secondary"))
+        # An unusable primary answer starts the secondary without waiting for the budget.
+        started = asyncio.get_running_loop().time()
+        self.assertEqual(await hedged(lambda: self.answer(None, 0), lambda: self.answer(2, 0), 10), (2, "secondary"))
+        self.assertLess(asyncio.get_running_loop().time() - started, 1)
+        self.assertEqual(await hedged(lambda: self.answer(None, 0), lambda: self.answer(None, 0), 0.01), (None, "none"))
+
+
+class TestTransportBreaker(unittest.IsolatedAsyncioTestCase):
+
+    async def test_failing_upstream_is_short_circuited(self):
+        async with BinanceRestStub(error_rate=1.0) as stub:
+            transport = InstrumentedTransport("breaker-test")
+            transport.health.failure_threshold = 3
+            async with httpx.AsyncClient(base_url=stub.url, transport=transport) as client:
+                for _ in range(3):
+                    self.assertEqual((await client.get("/api/v3/ticker/price")).status_code, 503)
+                with self.assertRaises(CircuitOpenError):
+                    await client.get("/api/v3/ticker/price")
+            self.assertEqual(stub.request_count, 3)
+            self.assertEqual(transport.health.status()["last_error"], "HTTP 503")
+
+
+class TestPriceEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        price_cache.clear()
+        self.health = upstream_health("binance")
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        self.health.reset()
+        price_cache.clear()
+
+    @patch('src.main.get_price_from_coingecko', new_callable=AsyncMock)
+    @patch('src.main.get_price_from_binance', new_callable=AsyncMock)
+    def test_open_circuit_skips_binance(self, mock_binance, mock_coingecko):
+        mock_coingecko.return_value = 67000.0
+        for _ in range(self.health.failure_threshold):
+            self.health.record_failure("HTTP 451")
+
+        response = self.client.get('/api/price', params={'symbol': 'btc', 'coin_id': 'bitcoin', 'is_tradable': True})
+        self.assertEqual(response.json()['source'], 'Binance (fallback CoinGecko)')
+        mock_binance.assert_not_awaited()
+
+        status = self.client.get('/api/upstream-health').json()
+        self.assertEqual(status['upstreams']['binance']['state'], 'open')
+        self.assertEqual(status['upstreams']['coingecko']['state'], 'closed')
+
+    @patch('src.main.HEDGING_ENABLED', True)
+    @patch('src.main.get_price_from_coingecko', new_callable=AsyncMock)
+    @patch('src.main.get_price_from_binance', new_callable=AsyncMock)
+    def test_hedged_price(self, mock_binance, mock_coingecko):
+        async def slow_binance(symbol):
+            await asyncio.sleep(1)
+            return 67100.0
+        mock_binance.side_effect = slow_binance
+        mock_coingecko.return_value = 67000.0
+
+        with patch('src.upstream_health.HEDGE_DELAY', 0.05):
+            response = self.client.get('/api/price', params={'symbol': 'btc', 'coin_id': 'bitcoin', 'is_tradable': True})
+        self.assertEqual(response.json()['price'], 67000.0)
+        self.assertEqual(response.json()['source'], 'Binance (fallback CoinGecko)')
+
+    @patch('src.main.HEDGING_ENABLED', True)
+    @patch('src.main.get_price_from_coingecko', new_callable=AsyncMock)
+    @patch('src.main.get_price_from_binance', new_callable=AsyncMock)
+    def test_hedged_price_without_answer_asks_coingecko_once(self, mock_binance, mock_coingecko):
+        mock_binance.return_value = None
+        mock_coingecko.return_value = None
+
+        response = self.client.get('/api/price', params={'symbol': 'btc', 'coin_id': 'bitcoin', 'is_tradable': True})
+        self.assertEqual(response.status_code, 404)
+        mock_binance.assert_awaited_once()
+        mock_coingecko.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()